@@ -3,6 +3,8 @@ from __future__ import annotations
 from datetime import date, datetime
 from decimal import Decimal, ROUND_HALF_UP
 import re
+import threading
+import time
 from dataclasses import dataclass
 from zoneinfo import ZoneInfo
 
@@ -172,13 +174,6 @@ def list_supported_email_actions(owner=None) -> tuple[dict, ...]:
     )
 
 
-def _subject_matches_token(subject: str, token: str) -> bool:
-    if not subject or not token:
-        return False
-    pattern = re.compile(rf"\[\s*{re.escape(token)}\s*\]|#{re.escape(token)}\b", re.IGNORECASE)
-    return bool(pattern.search(subject))
-
-
 def list_action_choices(owner=None) -> tuple[tuple[str, str], ...]:
     rows = list_supported_email_actions(owner)
     output = []
@@ -282,7 +277,8 @@ def _extract_worked_minutes(text: str):
 
 
 def _resolve_local_now(inbound_message):
-    now = timezone.now()
+    # Ora di ricezione del messaggio: nel ciclo live coincide con adesso, nel replay resta quella originale.
+    now = getattr(inbound_message, "created_at", None) or timezone.now()
     tz_name = ""
     config_obj = getattr(inbound_message, "config", None) if inbound_message is not None else None
     if config_obj is not None:
@@ -411,42 +407,103 @@ def _handle_worklog_pm(*, owner, incoming, inbound_message):
     )
 
 
-def detect_action_from_subject(subject: str, owner=None) -> str:
-    text = (subject or "").strip()
-    if not text:
+FLAG_MATCHER_TTL_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class FlagRuleMatcher:
+    """
+    Regole flag attive di un owner compilate in un'unica regex ad alternanza: la subject si
+    scansiona una volta sola. A parita di match vince la regola con token minore (come prima).
+    """
+
+    pattern: re.Pattern | None
+    actions: dict[str, str]
+    priority: dict[str, int]
+    aliases: dict[str, str]
+
+    @classmethod
+    def from_rules(cls, rules) -> "FlagRuleMatcher":
+        actions = {}
+        aliases = {}
+        for token, action_key in rules:
+            token = (token or "").strip().upper()
+            if not token or token in actions:
+                continue
+            actions[token] = action_key
+            aliases[token.lower()] = action_key
+            aliases[action_key.lower()] = action_key
+        pattern = None
+        if actions:
+            alternation = "|".join(re.escape(token) for token in sorted(actions, key=len, reverse=True))
+            pattern = re.compile(
+                rf"\[\s*(?P<bracket>{alternation})\s*\]|#(?P<hash>{alternation})\b",
+                re.IGNORECASE,
+            )
+        priority = {token: index for index, token in enumerate(actions)}
+        return cls(pattern=pattern, actions=actions, priority=priority, aliases=aliases)
+
+    def match(self, subject: str) -> str:
+        text = (subject or "").strip()
+        if not text:
+            return ""
+        if self.pattern is not None:
+            best = None
+            for found in self.pattern.finditer(text):
+                token = (found.group("bracket") or found.group("hash")).upper()
+                if best is None or self.priority[token] < self.priority[best]:
+                    best = token
+            if best is not None:
+                return self.actions[best]
+
+        explicit_match = EXPLICIT_ACTION_PATTERN.search(text)
+        if explicit_match:
+            explicit_raw = (explicit_match.group(1) or "").strip().lower()
+            if not explicit_raw:
+                return ""
+            return self.aliases.get(explicit_raw, explicit_raw)
         return ""
 
+
+_DEFAULT_FLAG_MATCHER = FlagRuleMatcher.from_rules(
+    sorted((row["flag_token"], row["action_key"]) for row in DEFAULT_FLAG_RULES if row.get("is_active"))
+)
+_FLAG_MATCHER_CACHE = {}
+_FLAG_MATCHER_LOCK = threading.Lock()
+
+
+def flag_rule_matcher(owner=None) -> FlagRuleMatcher:
+    """
+    Matcher compilato per owner, in cache nel processo: invalidato dai signal su salvataggio o
+    cancellazione delle regole, con TTL per le modifiche fatte da altri processi (web vs worker).
+    """
     if owner is None:
-        active_rules = [row for row in DEFAULT_FLAG_RULES if row.get("is_active")]
-    else:
-        ensure_default_flag_rules(owner)
-        active_rules = list(
-            ArchibaldEmailFlagRule.objects.filter(owner=owner, is_active=True).order_by("flag_token")
-        )
+        return _DEFAULT_FLAG_MATCHER
+    now = time.monotonic()
+    with _FLAG_MATCHER_LOCK:
+        cached = _FLAG_MATCHER_CACHE.get(owner.pk)
+    if cached is not None and cached[0] > now:
+        return cached[1]
 
-    for row in active_rules:
-        token = row["flag_token"] if isinstance(row, dict) else row.flag_token
-        action_key = row["action_key"] if isinstance(row, dict) else row.action_key
-        if _subject_matches_token(text, token):
-            return action_key
+    ensure_default_flag_rules(owner)
+    rules = (
+        ArchibaldEmailFlagRule.objects.filter(owner=owner, is_active=True)
+        .order_by("flag_token")
+        .values_list("flag_token", "action_key")
+    )
+    matcher = FlagRuleMatcher.from_rules(rules)
+    with _FLAG_MATCHER_LOCK:
+        _FLAG_MATCHER_CACHE[owner.pk] = (now + FLAG_MATCHER_TTL_SECONDS, matcher)
+    return matcher
 
-    explicit_match = EXPLICIT_ACTION_PATTERN.search(text)
-    if explicit_match:
-        explicit_raw = (explicit_match.group(1) or "").strip().lower()
-        if not explicit_raw:
-            return ""
 
-        alias_map = {}
-        for row in active_rules:
-            token = row["flag_token"] if isinstance(row, dict) else row.flag_token
-            action_key = row["action_key"] if isinstance(row, dict) else row.action_key
-            alias_map[token.lower()] = action_key
-            alias_map[action_key.lower()] = action_key
-        if explicit_raw in alias_map:
-            return alias_map[explicit_raw]
-        return explicit_raw
-
-    return ""
+def invalidate_flag_rule_matcher(owner_id) -> None:
+    with _FLAG_MATCHER_LOCK:
+        _FLAG_MATCHER_CACHE.pop(owner_id, None)
+
+
+def detect_action_from_subject(subject: str, owner=None) -> str:
+    return flag_rule_matcher(owner).match(subject)
 
 
 def execute_action_from_email(*, owner, incoming, inbound_message) -> EmailActionOutcome:
@@ -5,6 +5,7 @@ from .models import (
     ArchibaldEmailMessage,
     ArchibaldInboundCategory,
     ArchibaldMailboxConfig,
+    ArchibaldOutboxEmail,
 )
 
 
@@ -71,3 +72,11 @@ class ArchibaldInboundCategoryAdmin(admin.ModelAdmin):
     list_display = ("owner", "label", "is_active", "updated_at")
     list_filter = ("is_active",)
     search_fields = ("owner__username", "label")
+
+
+@admin.register(ArchibaldOutboxEmail)
+class ArchibaldOutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "owner", "status", "recipient", "subject", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("owner__username", "recipient", "subject", "in_reply_to")
+    readonly_fields = ("created_at", "updated_at")
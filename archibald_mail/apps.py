@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ArchibaldMailConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "archibald_mail"
+
+    def ready(self):
+        from . import signals  # noqa: F401
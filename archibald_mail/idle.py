@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import logging
+import re
+import select
+import threading
+import time
+from collections.abc import Callable
+
+from .models import ArchibaldMailboxConfig
+from .services import ArchibaldMailError, close_imap_mailbox, open_imap_mailbox
+
+logger = logging.getLogger(__name__)
+
+# RFC 2177: i server possono chiudere IDLE dopo 30 minuti, lo rinnoviamo prima.
+IDLE_RENEW_SECONDS = 9 * 60
+IDLE_READ_TICK_SECONDS = 1.0
+IDLE_DONE_TIMEOUT_SECONDS = 30.0
+IDLE_RECONNECT_MIN_SECONDS = 5
+IDLE_RECONNECT_MAX_SECONDS = 300
+
+_EXISTS_PATTERN = re.compile(rb"^\* \d+ (EXISTS|RECENT)\b", re.IGNORECASE)
+
+
+def imap_supports_idle(mailbox) -> bool:
+    capabilities = getattr(mailbox, "capabilities", ()) or ()
+    return "IDLE" in {str(item).upper() for item in capabilities}
+
+
+class _SocketLineReader:
+    """
+    Legge righe direttamente dal socket durante IDLE: il file bufferizzato di imaplib
+    non supporta timeout (dopo un timeout diventa inutilizzabile).
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b""
+
+    def readline(self, timeout: float) -> bytes | None:
+        deadline = time.monotonic() + timeout
+        while b"\n" not in self.buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            pending = getattr(self.sock, "pending", None)
+            if not (pending and pending()):
+                readable, _writable, _errors = select.select([self.sock], [], [], remaining)
+                if not readable:
+                    return None
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ArchibaldMailError("Connessione IMAP chiusa dal server durante IDLE.")
+            self.buffer += chunk
+        line, _sep, self.buffer = self.buffer.partition(b"\n")
+        return line.rstrip(b"\r")
+
+
+def idle_wait(
+    mailbox,
+    *,
+    timeout: float = IDLE_RENEW_SECONDS,
+    stop_event: threading.Event | None = None,
+    tick: float = IDLE_READ_TICK_SECONDS,
+) -> bool:
+    """
+    Esegue un ciclo IDLE fino a EXISTS/RECENT, timeout o stop. Restituisce True se e'
+    arrivata nuova posta. Chiude sempre IDLE con DONE prima di restituire.
+    """
+    tag = mailbox._new_tag()
+    mailbox.send(tag + b" IDLE\r\n")
+    reader = _SocketLineReader(mailbox.sock)
+    continuation = reader.readline(IDLE_DONE_TIMEOUT_SECONDS)
+    if continuation is None or not continuation.startswith(b"+"):
+        raise ArchibaldMailError(f"IDLE rifiutato dal server: {continuation!r}")
+
+    changed = False
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not (stop_event and stop_event.is_set()):
+        line = reader.readline(tick)
+        if line is None:
+            continue
+        if line.upper().startswith(b"* BYE"):
+            raise ArchibaldMailError("Il server IMAP ha chiuso la sessione IDLE.")
+        if _EXISTS_PATTERN.match(line):
+            changed = True
+            break
+
+    mailbox.send(b"DONE\r\n")
+    while True:
+        line = reader.readline(IDLE_DONE_TIMEOUT_SECONDS)
+        if line is None:
+            raise ArchibaldMailError("Nessuna risposta del server IMAP alla chiusura di IDLE.")
+        if line.startswith(tag):
+            if not line[len(tag):].lstrip().upper().startswith(b"OK"):
+                raise ArchibaldMailError(f"Chiusura IDLE fallita: {line!r}")
+            return changed
+        if _EXISTS_PATTERN.match(line):
+            changed = True
+
+
+class MailboxIdleWatcher(threading.Thread):
+    """
+    Mantiene una connessione IMAP IDLE per una mailbox e chiama `notify(config_id)` a ogni
+    EXISTS e dopo ogni (ri)connessione, cosi la posta arrivata durante un'interruzione viene
+    recuperata. Non tocca il database: l'elaborazione resta al thread chiamante.
+    """
+
+    def __init__(
+        self,
+        config: ArchibaldMailboxConfig,
+        notify: Callable[[int], None],
+        stop_event: threading.Event,
+        *,
+        renew_seconds: float = IDLE_RENEW_SECONDS,
+    ):
+        super().__init__(name=f"archibald-idle-{config.pk}", daemon=True)
+        self.config = config
+        self.notify = notify
+        self.stop_event = stop_event
+        self.renew_seconds = renew_seconds
+        self.ready = threading.Event()
+        self.supported = None
+        self.last_error = ""
+
+    def run(self):
+        backoff = IDLE_RECONNECT_MIN_SECONDS
+        while not self.stop_event.is_set():
+            mailbox = None
+            try:
+                mailbox = open_imap_mailbox(self.config)
+                if not imap_supports_idle(mailbox):
+                    self.supported = False
+                    return
+                self.supported = True
+                self.ready.set()
+                self.notify(self.config.pk)
+                backoff = IDLE_RECONNECT_MIN_SECONDS
+                while not self.stop_event.is_set():
+                    if idle_wait(mailbox, timeout=self.renew_seconds, stop_event=self.stop_event):
+                        self.notify(self.config.pk)
+            except Exception as exc:
+                self.last_error = str(exc)
+                logger.warning("IMAP IDLE interrotto per config=%s: %s", self.config.pk, exc)
+            finally:
+                close_imap_mailbox(mailbox)
+                if self.supported is False:
+                    self.ready.set()
+            self.stop_event.wait(backoff)
+            backoff = min(backoff * 2, IDLE_RECONNECT_MAX_SECONDS)
@@ -0,0 +1,115 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from archibald_mail.models import ArchibaldEmailMessage
+from archibald_mail.replay import (
+    DEFAULT_REPLAY_BATCH_SIZE,
+    DEFAULT_REPLAY_CHUNK_SIZE,
+    replay_inbound_messages,
+    replay_queryset,
+)
+
+
+def _parse_date(value: str | None, option: str) -> date | None:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value.strip())
+    except ValueError:
+        raise CommandError(f"{option} deve essere una data ISO (YYYY-MM-DD).")
+
+
+class Command(BaseCommand):
+    help = (
+        "Riesegue le azioni da flag sulle email inbound archiviate (es. dopo aver aggiunto o "
+        "corretto una regola), in streaming e a blocchi transazionali. Non rimanda risposte email."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Username o email dell'utente (default: tutti).")
+        parser.add_argument("--since", help="Solo email ricevute da questa data (YYYY-MM-DD).")
+        parser.add_argument("--until", help="Solo email ricevute fino a questa data (YYYY-MM-DD).")
+        parser.add_argument(
+            "--status",
+            action="append",
+            choices=ArchibaldEmailMessage.Status.values,
+            default=[],
+            help="Filtra per stato (ripetibile), es. --status SKIPPED.",
+        )
+        parser.add_argument(
+            "--review-status",
+            action="append",
+            choices=ArchibaldEmailMessage.ReviewStatus.values,
+            default=[],
+            help="Filtra per stato review (ripetibile), es. --review-status PENDING.",
+        )
+        parser.add_argument(
+            "--include-applied",
+            action="store_true",
+            help="Include anche le email gia APPLIED (di default escluse: le azioni verrebbero ripetute).",
+        )
+        parser.add_argument("--limit", type=int, default=0, help="Numero massimo di email da rielaborare.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_REPLAY_BATCH_SIZE,
+            help=f"Email per transazione (default: {DEFAULT_REPLAY_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_REPLAY_CHUNK_SIZE,
+            help=f"Righe lette per fetch dal cursore (default: {DEFAULT_REPLAY_CHUNK_SIZE}).",
+        )
+        parser.add_argument("--workers", type=int, default=1, help="Thread paralleli sui blocchi (default: 1).")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Mostra quante email verrebbero gestite senza eseguire azioni.",
+        )
+
+    def handle(self, *args, **options):
+        for option in ("batch_size", "chunk_size", "workers"):
+            if options[option] < 1:
+                raise CommandError(f"--{option.replace('_', '-')} deve essere >= 1.")
+        if options["limit"] < 0:
+            raise CommandError("--limit deve essere >= 0.")
+
+        owner = None
+        if options.get("user"):
+            user_value = options["user"].strip()
+            User = get_user_model()
+            owner = User.objects.filter(username=user_value).first() or User.objects.filter(email=user_value).first()
+            if not owner:
+                raise CommandError(f"Utente non trovato: {user_value}")
+
+        queryset = replay_queryset(
+            owner=owner,
+            since=_parse_date(options.get("since"), "--since"),
+            until=_parse_date(options.get("until"), "--until"),
+            statuses=options["status"],
+            review_statuses=options["review_status"],
+            include_applied=options["include_applied"],
+        )
+        report = replay_inbound_messages(
+            queryset,
+            batch_size=options["batch_size"],
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            limit=options["limit"] or None,
+            dry_run=options["dry_run"],
+        )
+
+        prefix = "[dry-run] " if options["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}Replay inbound: scanned={report.scanned} handled={report.handled} "
+                f"unhandled={report.unhandled} skipped={report.skipped} failed={report.failed} "
+                f"batches={report.batches} elapsed={report.elapsed_seconds:.2f}s "
+                f"rate={report.rate:.1f} msg/s"
+            )
+        )
+        for error in report.errors:
+            self.stdout.write(self.style.WARNING(f"  {error}"))
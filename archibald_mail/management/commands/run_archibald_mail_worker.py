@@ -1,12 +1,21 @@
 import os
+import queue
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
 from django.utils import timezone
 
+from archibald_mail.idle import MailboxIdleWatcher
 from archibald_mail.models import ArchibaldMailboxConfig
-from archibald_mail.services import process_inbox_for_config
+from archibald_mail.services import MailConnectionPool, drain_outbox, process_inbox_for_config
+
+IDLE_READY_TIMEOUT_SECONDS = 30
+# In IDLE le mailbox si elaborano solo su notifica: i retry dell'outbox hanno un drain proprio.
+IDLE_OUTBOX_DRAIN_SECONDS = 30
 
 
 def _default_poll_seconds() -> int:
@@ -43,11 +52,48 @@ def _default_archi_fast_limit() -> int:
     return 3
 
 
+def _default_concurrency() -> int:
+    raw = (os.getenv("ARCHIBALD_MAIL_CONCURRENCY") or "").strip()
+    if raw.isdigit():
+        return max(1, int(raw))
+    return 1
+
+
+def _default_config_timeout_seconds() -> int:
+    raw = (os.getenv("ARCHIBALD_MAIL_CONFIG_TIMEOUT_SECONDS") or "").strip()
+    if raw.isdigit():
+        return max(10, int(raw))
+    return 120
+
+
+def _result_row(status: str, *, failed: int = 0, errors=None) -> dict:
+    return {
+        "status": status,
+        "fetched": 0,
+        "processed": 0,
+        "replied": 0,
+        "skipped": 0,
+        "failed": failed,
+        "errors": list(errors or []),
+    }
+
+
+def _default_idle_enabled() -> bool:
+    return _env_bool("ARCHIBALD_MAIL_IDLE_ENABLED", default=False)
+
+
 class Command(BaseCommand):
     help = (
         "Worker inbox Archibald: ciclo standard a intervallo costante "
         "(default 300s) + corsia veloce per subject ARCHI (default 5s)."
     )
+    pool: MailConnectionPool | None = None
+    executor: ThreadPoolExecutor | None = None
+    config_timeout_seconds: float = 120
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._inflight = set()
 
     def add_arguments(self, parser):
         parser.add_argument("--interval-seconds", type=int, default=_default_poll_seconds())
@@ -58,6 +104,24 @@ class Command(BaseCommand):
         parser.add_argument("--user", help="Username o email dell'utente (opzionale).")
         parser.add_argument("--force", action="store_true", help="Ignora flag is_enabled.")
         parser.add_argument("--run-once", action="store_true", help="Esegue un solo ciclo e termina.")
+        parser.add_argument(
+            "--idle",
+            action="store_true",
+            default=_default_idle_enabled(),
+            help="Push IMAP IDLE: una connessione per mailbox, polling solo per i server senza IDLE.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=_default_concurrency(),
+            help="Mailbox elaborate in parallelo (thread pool, default 1 = sequenziale).",
+        )
+        parser.add_argument(
+            "--config-timeout-seconds",
+            type=int,
+            default=_default_config_timeout_seconds(),
+            help="Tempo massimo per mailbox con --concurrency > 1: oltre, il ciclo prosegue senza attenderla.",
+        )
 
     def _resolve_user_config(self, user_value: str) -> ArchibaldMailboxConfig:
         User = get_user_model()
@@ -88,6 +152,7 @@ class Command(BaseCommand):
         force: bool,
         search_criteria: tuple[str, ...] | None = None,
         cycle_label: str = "full",
+        configs=None,
     ) -> tuple[int, int, int, int, int]:
         fetched_total = 0
         processed_total = 0
@@ -95,26 +160,13 @@ class Command(BaseCommand):
         skipped_total = 0
         failed_total = 0
 
-        rows = []
-        for config in self._iter_configs(user_value=user_value, force=force):
-            try:
-                result = process_inbox_for_config(
-                    config,
-                    limit=limit,
-                    force=force,
-                    search_criteria=search_criteria,
-                )
-            except Exception as exc:  # pragma: no cover - defensive logging path
-                result = {
-                    "status": "error",
-                    "fetched": 0,
-                    "processed": 0,
-                    "replied": 0,
-                    "skipped": 0,
-                    "failed": 1,
-                    "errors": [str(exc)],
-                }
-            rows.append((config, result))
+        if configs is None:
+            configs = self._iter_configs(user_value=user_value, force=force)
+        options = {"limit": limit, "force": force, "search_criteria": search_criteria}
+        if self.executor is None:
+            rows = [(config, self._process_config(config, **options)) for config in configs]
+        else:
+            rows = self._process_configs_concurrently(list(configs), **options)
 
         for config, result in rows:
             fetched_total += result.get("fetched", 0)
@@ -126,14 +178,185 @@ class Command(BaseCommand):
                 f"[{cycle_label}:{config.owner.username}] fetched={result.get('fetched')} "
                 f"processed={result.get('processed')} "
                 f"replied={result.get('replied')} skipped={result.get('skipped')} "
-                f"failed={result.get('failed')} status={result.get('status')}"
+                f"failed={result.get('failed')} queued={result.get('queued', 0)} status={result.get('status')}"
             )
 
-        if not rows:
+        if not rows and cycle_label != "idle":
             self.stdout.write(f"Nessuna configurazione Archibald Mail idonea trovata ({cycle_label}).")
 
         return fetched_total, processed_total, replied_total, skipped_total, failed_total
 
+    def _process_config(self, config: ArchibaldMailboxConfig, **options) -> dict:
+        try:
+            return process_inbox_for_config(config, pool=self.pool, **options)
+        except Exception as exc:  # pragma: no cover - defensive logging path
+            return _result_row("error", failed=1, errors=[str(exc)])
+
+    def _process_config_in_thread(self, config: ArchibaldMailboxConfig, started: dict, **options) -> dict:
+        # Ogni thread del pool ha le proprie connessioni DB: vanno chiuse a fine lavoro.
+        started[config.pk] = time.monotonic()
+        close_old_connections()
+        try:
+            return self._process_config(config, **options)
+        finally:
+            connections.close_all()
+
+    def _process_configs_concurrently(self, configs, **options) -> list[tuple[ArchibaldMailboxConfig, dict]]:
+        """
+        Elabora le mailbox sul thread pool: il ciclo dura quanto la mailbox piu lenta e una
+        mailbox oltre `config_timeout_seconds` viene lasciata indietro (il suo thread finisce da
+        solo al timeout del socket) senza bloccare le altre. Una mailbox ancora in corso dal
+        ciclo precedente viene saltata, cosi le sue sessioni del pool restano a un solo thread.
+        """
+        results = {}
+        started = {}
+        futures = {}
+        for config in configs:
+            if config.pk in self._inflight:
+                results[config.pk] = _result_row("busy")
+                continue
+            self._inflight.add(config.pk)
+            future = self.executor.submit(self._process_config_in_thread, config, started, **options)
+            future.add_done_callback(lambda _future, config_id=config.pk: self._inflight.discard(config_id))
+            futures[future] = config
+
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            deadlines = [
+                started[futures[future].pk] + self.config_timeout_seconds - now
+                for future in pending
+                if futures[future].pk in started
+            ]
+            wait_seconds = min([1.0, *deadlines])
+            done, pending = wait(pending, timeout=max(wait_seconds, 0.05), return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    results[futures[future].pk] = future.result()
+                except Exception as exc:  # pragma: no cover - _process_config gestisce gia gli errori
+                    results[futures[future].pk] = _result_row("error", failed=1, errors=[str(exc)])
+            now = time.monotonic()
+            for future in list(pending):
+                config = futures[future]
+                if config.pk in started and now - started[config.pk] >= self.config_timeout_seconds:
+                    pending.discard(future)
+                    results[config.pk] = _result_row(
+                        "timeout",
+                        failed=1,
+                        errors=[f"Mailbox oltre {self.config_timeout_seconds}s: ciclo proseguito senza attenderla."],
+                    )
+        return [(config, results[config.pk]) for config in configs]
+
+    def _write_cycle_summary(self, label: str, started_at, totals, *, always: bool = True):
+        fetched, processed, replied, skipped, failed = totals
+        if always or fetched or replied or failed:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"[cycle {label} {started_at.isoformat()}] "
+                    f"fetched={fetched} processed={processed} replied={replied} skipped={skipped} failed={failed}"
+                )
+            )
+
+    def _run_idle(
+        self,
+        *,
+        interval: int,
+        limit: int | None,
+        user_value: str,
+        force: bool,
+        archi_fast_enabled: bool,
+        archi_fast_seconds: int,
+        archi_fast_limit: int | None,
+        archi_fast_search: tuple[str, ...],
+        max_wakeups: int | None = None,
+    ) -> None:
+        """
+        Modalita IDLE: i thread watcher tengono aperta una sessione IMAP IDLE per mailbox e
+        accodano l'id config a ogni EXISTS; il thread principale (unico a usare il DB) elabora
+        subito la coda. Le mailbox senza IDLE restano sulla corsia veloce a polling e il ciclo
+        completo a intervallo resta come rete di sicurezza.
+        """
+        wakeups: queue.Queue[int] = queue.Queue()
+        stop_event = threading.Event()
+        watchers = [
+            MailboxIdleWatcher(config, wakeups.put, stop_event)
+            for config in self._iter_configs(user_value=user_value, force=force)
+        ]
+        for watcher in watchers:
+            watcher.start()
+        ready_deadline = time.monotonic() + IDLE_READY_TIMEOUT_SECONDS
+        for watcher in watchers:
+            watcher.ready.wait(max(0, ready_deadline - time.monotonic()))
+        for watcher in watchers:
+            mode = {True: "idle", False: "polling"}.get(watcher.supported, "in connessione")
+            self.stdout.write(f"[idle:{watcher.config.owner.username}] modalita={mode}")
+
+        next_full_cycle_at = time.monotonic() + interval
+        next_fast_at = time.monotonic()
+        next_outbox_at = time.monotonic() + IDLE_OUTBOX_DRAIN_SECONDS
+        try:
+            while max_wakeups is None or max_wakeups > 0:
+                now = time.monotonic()
+                if now >= next_outbox_at:
+                    report = drain_outbox()
+                    if report.sent or report.failed:
+                        self.stdout.write(
+                            self.style.SUCCESS(
+                                f"[outbox {timezone.now().isoformat()}] sent={report.sent} "
+                                f"retried={report.retried} failed={report.failed} pending={report.pending}"
+                            )
+                        )
+                    next_outbox_at = time.monotonic() + IDLE_OUTBOX_DRAIN_SECONDS
+                if now >= next_full_cycle_at:
+                    cycle_start = timezone.now()
+                    totals = self._run_cycle(limit=limit, user_value=user_value, force=force, cycle_label="full")
+                    self._write_cycle_summary("full", cycle_start, totals)
+                    next_full_cycle_at = time.monotonic() + interval
+
+                polling = [watcher.config for watcher in watchers if watcher.supported is not True]
+                if archi_fast_enabled and polling and now >= next_fast_at:
+                    fast_start = timezone.now()
+                    totals = self._run_cycle(
+                        limit=archi_fast_limit,
+                        user_value=user_value,
+                        force=force,
+                        search_criteria=archi_fast_search,
+                        cycle_label="archi-fast",
+                        configs=polling,
+                    )
+                    self._write_cycle_summary("archi-fast", fast_start, totals, always=False)
+                    next_fast_at = time.monotonic() + archi_fast_seconds
+
+                wake_at = min(next_full_cycle_at, next_outbox_at)
+                if archi_fast_enabled and polling:
+                    wake_at = min(wake_at, next_fast_at)
+                try:
+                    config_ids = {wakeups.get(timeout=max(0.0, wake_at - time.monotonic()))}
+                except queue.Empty:
+                    continue
+                # Raggruppa le notifiche arrivate nel frattempo: una sola elaborazione per mailbox.
+                while True:
+                    try:
+                        config_ids.add(wakeups.get_nowait())
+                    except queue.Empty:
+                        break
+                if max_wakeups is not None:
+                    max_wakeups -= 1
+                configs = list(
+                    ArchibaldMailboxConfig.objects.filter(pk__in=config_ids).select_related("owner").order_by("owner_id")
+                )
+                idle_start = timezone.now()
+                totals = self._run_cycle(
+                    limit=limit,
+                    user_value=user_value,
+                    force=force,
+                    cycle_label="idle",
+                    configs=configs,
+                )
+                self._write_cycle_summary("idle", idle_start, totals, always=False)
+        finally:
+            stop_event.set()
+
     def handle(self, *args, **options):
         interval = int(options.get("interval_seconds") or 300)
         if interval < 30:
@@ -148,32 +371,78 @@ class Command(BaseCommand):
         user_value = (options.get("user") or "").strip()
         force = bool(options.get("force"))
         run_once = bool(options.get("run_once"))
+        idle = bool(options.get("idle")) and not run_once
+        concurrency = int(options.get("concurrency") or 1)
+        config_timeout_seconds = int(options.get("config_timeout_seconds") or _default_config_timeout_seconds())
 
         if archi_fast_seconds < 5:
             raise CommandError("--archi-fast-seconds deve essere >= 5.")
+        if concurrency < 1:
+            raise CommandError("--concurrency deve essere >= 1.")
+        if config_timeout_seconds < 10:
+            raise CommandError("--config-timeout-seconds deve essere >= 10.")
 
         self.stdout.write(
             f"Archibald Mail worker avviato: interval={interval}s "
             f"limit={limit or 'default'} user={user_value or '-'} force={force} run_once={run_once} "
             f"archi_fast_enabled={archi_fast_enabled} "
-            f"archi_fast_seconds={archi_fast_seconds} archi_fast_limit={archi_fast_limit or 'default'}"
+            f"archi_fast_seconds={archi_fast_seconds} archi_fast_limit={archi_fast_limit or 'default'} idle={idle} "
+            f"concurrency={concurrency}"
         )
 
         archi_fast_search = ("UNSEEN", "SUBJECT", "ARCHI")
 
-        if run_once:
-            cycle_start = timezone.now()
-            fetched, processed, replied, skipped, failed = self._run_cycle(
+        # Sessioni IMAP/SMTP autenticate riusate tra i cicli (verificate con NOOP prima dell'uso).
+        self.pool = MailConnectionPool()
+        self.config_timeout_seconds = config_timeout_seconds
+        if concurrency > 1:
+            self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="archibald-mail")
+        try:
+            if run_once:
+                cycle_start = timezone.now()
+                totals = self._run_cycle(limit=limit, user_value=user_value, force=force, cycle_label="full")
+                self._write_cycle_summary("full", cycle_start, totals)
+                return
+
+            self._run_loop(
+                idle=idle,
+                interval=interval,
                 limit=limit,
                 user_value=user_value,
                 force=force,
-                cycle_label="full",
+                archi_fast_enabled=archi_fast_enabled,
+                archi_fast_seconds=archi_fast_seconds,
+                archi_fast_limit=archi_fast_limit,
+                archi_fast_search=archi_fast_search,
             )
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"[cycle full {cycle_start.isoformat()}] "
-                    f"fetched={fetched} processed={processed} replied={replied} skipped={skipped} failed={failed}"
-                )
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            self.pool.close_all()
+
+    def _run_loop(
+        self,
+        *,
+        idle: bool,
+        interval: int,
+        limit: int | None,
+        user_value: str,
+        force: bool,
+        archi_fast_enabled: bool,
+        archi_fast_seconds: int,
+        archi_fast_limit: int | None,
+        archi_fast_search: tuple[str, ...],
+    ) -> None:
+        if idle:
+            self._run_idle(
+                interval=interval,
+                limit=limit,
+                user_value=user_value,
+                force=force,
+                archi_fast_enabled=archi_fast_enabled,
+                archi_fast_seconds=archi_fast_seconds,
+                archi_fast_limit=archi_fast_limit,
+                archi_fast_search=archi_fast_search,
             )
             return
 
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-17 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archibald_mail', '0009_archibaldoutboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archibaldmailboxconfig',
+            name='imap_highest_processed_uid',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archibaldmailboxconfig',
+            name='imap_uidvalidity',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-17 08:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archibald_mail', '0010_archibaldmailboxconfig_imap_checkpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archibaldemailmessage',
+            index=models.Index(condition=models.Q(('message_id', ''), _negated=True), fields=['owner', 'direction', 'message_id'], name='archibald_mail_msg_dedup_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archibald_mail', '0011_archibaldemailmessage_dedup_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archibaldemailmessage',
+            name='attachments',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import html
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesFeedParser
+
+FEED_CHUNK_BYTES = 64 * 1024
+
+_SKIPPED_HTML_TAGS = frozenset({"script", "style", "head", "title"})
+_BLOCK_HTML_TAGS = frozenset(
+    "br p div li ul ol tr table h1 h2 h3 h4 h5 h6 blockquote pre hr section article header footer".split()
+)
+
+
+def _payload_size(payload: str, transfer_encoding: str) -> int:
+    if transfer_encoding == "base64":
+        return len(payload.replace("\r", "").replace("\n", "")) * 3 // 4
+    return len(payload)
+
+
+class _CappedEmailMessage(EmailMessage):
+    """
+    Parte MIME che non conserva i payload degli allegati e tronca le parti testuali oltre
+    `max_part_bytes`: il parser le consegna qui a fine parte e la memoria viene liberata subito.
+    """
+
+    max_part_bytes = 0
+
+    def set_payload(self, payload, charset=None):
+        if self.get_content_maintype() == "multipart" or not isinstance(payload, str):
+            return super().set_payload(payload, charset)
+        transfer_encoding = str(self.get("Content-Transfer-Encoding", "")).strip().lower()
+        self.archibald_size = _payload_size(payload, transfer_encoding)
+        self.archibald_truncated = False
+        if self.get_content_disposition() == "attachment" or self.get_filename():
+            payload = ""
+        elif self.max_part_bytes and len(payload) > self.max_part_bytes:
+            cut = self.max_part_bytes
+            if transfer_encoding == "base64":
+                # Taglio allineato ai blocchi base64: la decodifica del prefisso resta valida.
+                compact = payload.replace("\r", "").replace("\n", "")
+                payload, cut = compact, cut - cut % 4
+            payload = payload[:cut]
+            self.archibald_truncated = True
+        return super().set_payload(payload, charset)
+
+
+def parse_message_streaming(raw_bytes: bytes, *, max_part_bytes: int = 0) -> EmailMessage:
+    """Parsing incrementale (BytesFeedParser) a blocchi, senza trattenere i payload degli allegati."""
+    factory = type("CappedEmailMessage", (_CappedEmailMessage,), {"max_part_bytes": max_part_bytes})
+    parser = BytesFeedParser(_factory=factory, policy=policy.default)
+    view = memoryview(raw_bytes or b"")
+    for offset in range(0, len(view), FEED_CHUNK_BYTES):
+        parser.feed(view[offset : offset + FEED_CHUNK_BYTES].tobytes())
+    return parser.close()
+
+
+def html_to_text(value: str) -> str:
+    """Testo da HTML con una sola scansione lineare dei tag (niente regex con backtracking)."""
+    chunks = []
+    skipped_tag = ""
+    position = 0
+    length = len(value or "")
+    while position < length:
+        tag_start = value.find("<", position)
+        if tag_start < 0:
+            tag_start = length
+        if not skipped_tag and tag_start > position:
+            chunks.append(value[position:tag_start])
+        if tag_start >= length:
+            break
+        tag_end = value.find(">", tag_start + 1)
+        if tag_end < 0:
+            break
+        tag = value[tag_start + 1 : tag_end].strip()
+        closing = tag.startswith("/")
+        name = tag.lstrip("/!").split(None, 1)[0].rstrip("/").lower() if tag.lstrip("/!") else ""
+        if skipped_tag:
+            if closing and name == skipped_tag:
+                skipped_tag = ""
+        elif name in _SKIPPED_HTML_TAGS and not closing and not tag.endswith("/"):
+            skipped_tag = name
+        elif name in _BLOCK_HTML_TAGS:
+            chunks.append("\n")
+        else:
+            chunks.append(" ")
+        position = tag_end + 1
+
+    lines = []
+    for line in html.unescape("".join(chunks)).splitlines():
+        line = " ".join(line.split())
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def _decode_text_part(part) -> str:
+    payload = part.get_payload(decode=True) or b""
+    charset = part.get_content_charset() or "utf-8"
+    try:
+        return payload.decode(charset, errors="replace")
+    except LookupError:
+        return payload.decode("utf-8", errors="replace")
+
+
+def _is_attachment(part) -> bool:
+    return part.get_content_disposition() == "attachment" or bool(part.get_filename())
+
+
+def extract_text_body(message, *, max_chars: int = 0) -> tuple[str, bool]:
+    """Corpo testuale (text/plain, altrimenti HTML convertito) troncato a `max_chars`."""
+    plain_chunks = []
+    html_chunks = []
+    truncated = False
+    for part in message.walk():
+        if part.is_multipart() or _is_attachment(part):
+            continue
+        content_type = (part.get_content_type() or "").lower()
+        if content_type not in {"text/plain", "text/html"}:
+            continue
+        truncated = truncated or bool(getattr(part, "archibald_truncated", False))
+        text = _decode_text_part(part)
+        if content_type == "text/plain":
+            plain_chunks.append(text)
+        else:
+            html_chunks.append(text)
+
+    if plain_chunks:
+        body = "\n".join(chunk.strip() for chunk in plain_chunks if chunk.strip()).strip()
+    elif html_chunks:
+        body = html_to_text("\n".join(html_chunks))
+    else:
+        body = ""
+    if max_chars and len(body) > max_chars:
+        body = body[:max_chars].rstrip()
+        truncated = True
+    return body, truncated
+
+
+def attachment_manifest(message) -> list[dict]:
+    """Nome, tipo e dimensione stimata degli allegati: il contenuto non viene conservato."""
+    manifest = []
+    for part in message.walk():
+        if part.is_multipart() or not _is_attachment(part):
+            continue
+        manifest.append(
+            {
+                "filename": part.get_filename() or "",
+                "content_type": (part.get_content_type() or "").lower(),
+                "size": int(getattr(part, "archibald_size", 0)),
+            }
+        )
+    return manifest
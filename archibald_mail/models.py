@@ -4,6 +4,7 @@ import re
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 from common.models import OwnedModel, TimeStampedModel
 
@@ -46,6 +47,9 @@ class ArchibaldMailboxConfig(OwnedModel, TimeStampedModel):
     imap_username = models.CharField(max_length=180, blank=True)
     imap_password = models.CharField(max_length=255, blank=True)
     imap_mailbox = models.CharField(max_length=80, default="INBOX")
+    # Checkpoint IMAP: con UIDVALIDITY invariata il worker cerca solo `UID n+1:*`.
+    imap_uidvalidity = models.PositiveBigIntegerField(null=True, blank=True)
+    imap_highest_processed_uid = models.PositiveBigIntegerField(default=0)
 
     smtp_host = models.CharField(max_length=120, blank=True)
     smtp_port = models.PositiveIntegerField(default=587)
@@ -263,6 +267,8 @@ class ArchibaldEmailMessage(OwnedModel, TimeStampedModel):
     body_text = models.TextField(blank=True)
     ai_response_text = models.TextField(blank=True)
     raw_headers = models.TextField(blank=True)
+    # Solo manifest (filename, content_type, size): il contenuto degli allegati non viene salvato.
+    attachments = models.JSONField(default=list, blank=True)
     error_text = models.TextField(blank=True)
     classification_category = models.ForeignKey(
         "archibald_mail.ArchibaldInboundCategory",
@@ -290,7 +296,60 @@ class ArchibaldEmailMessage(OwnedModel, TimeStampedModel):
             models.Index(fields=["owner", "message_id"]),
             models.Index(fields=["owner", "status", "created_at"]),
             models.Index(fields=["owner", "direction", "review_status", "created_at"]),
+            # Dedup inbound per blocco (`message_id__in`): le righe senza Message-ID restano fuori.
+            models.Index(
+                fields=["owner", "direction", "message_id"],
+                condition=~models.Q(message_id=""),
+                name="archibald_mail_msg_dedup_idx",
+            ),
         ]
 
     def __str__(self):
         return f"{self.direction} {self.status} ({self.owner_id})"
+
+
+class ArchibaldOutboxEmail(OwnedModel, TimeStampedModel):
+    """
+    Risposta automatica accodata nella stessa transazione della cattura e inviata dopo,
+    fuori transazione, dal drain dell'outbox (retry con backoff esponenziale).
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        SENT = "SENT", "Sent"
+        FAILED = "FAILED", "Failed"
+
+    config = models.ForeignKey(
+        "archibald_mail.ArchibaldMailboxConfig",
+        on_delete=models.CASCADE,
+        related_name="outbox_items",
+    )
+    inbound_message = models.ForeignKey(
+        "archibald_mail.ArchibaldEmailMessage",
+        on_delete=models.SET_NULL,
+        related_name="outbox_items",
+        null=True,
+        blank=True,
+    )
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255, blank=True)
+    body_text = models.TextField(blank=True)
+    in_reply_to = models.CharField(max_length=255, blank=True)
+    references = models.CharField(max_length=255, blank=True)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["config", "status", "next_attempt_at"]),
+            models.Index(fields=["claim_token"]),
+        ]
+
+    def __str__(self):
+        return f"Outbox {self.status} -> {self.recipient} ({self.owner_id})"
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from django.db import close_old_connections, connection, connections, transaction
+from django.utils import timezone
+
+from .actions import detect_action_from_subject, execute_action_from_email
+from .models import ArchibaldEmailMessage
+from .services import ParsedInboundEmail, _sender_allowed
+
+DEFAULT_REPLAY_BATCH_SIZE = 200
+DEFAULT_REPLAY_CHUNK_SIZE = 500
+
+_REPLAY_DEFERRED_FIELDS = ("raw_headers", "ai_response_text", "attachments", "review_notes")
+
+
+@dataclass
+class ReplayReport:
+    scanned: int = 0
+    handled: int = 0
+    unhandled: int = 0
+    skipped: int = 0
+    failed: int = 0
+    batches: int = 0
+    elapsed_seconds: float = 0.0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def rate(self) -> float:
+        return self.scanned / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    def merge(self, other: "ReplayReport") -> None:
+        self.scanned += other.scanned
+        self.handled += other.handled
+        self.unhandled += other.unhandled
+        self.skipped += other.skipped
+        self.failed += other.failed
+        self.batches += other.batches
+        self.errors.extend(other.errors[: max(20 - len(self.errors), 0)])
+
+
+def replay_queryset(*, owner=None, since=None, until=None, statuses=(), review_statuses=(), include_applied=False):
+    """
+    Messaggi inbound da rielaborare, in ordine di id (stabile per lo streaming). Gli APPLIED sono
+    esclusi salvo `include_applied` o filtro esplicito: rieseguirli duplicherebbe note e worklog.
+    """
+    queryset = ArchibaldEmailMessage.objects.filter(direction=ArchibaldEmailMessage.Direction.INBOUND)
+    if not include_applied and ArchibaldEmailMessage.ReviewStatus.APPLIED not in review_statuses:
+        queryset = queryset.exclude(review_status=ArchibaldEmailMessage.ReviewStatus.APPLIED)
+    if owner is not None:
+        queryset = queryset.filter(owner=owner)
+    if since is not None:
+        queryset = queryset.filter(created_at__date__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__date__lte=until)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    if review_statuses:
+        queryset = queryset.filter(review_status__in=review_statuses)
+    # Header grezzi e testi di risposta non servono al replay: niente trasferimento inutile.
+    return queryset.select_related("owner", "config").defer(*_REPLAY_DEFERRED_FIELDS).order_by("id")
+
+
+def _incoming_from_message(message: ArchibaldEmailMessage) -> ParsedInboundEmail:
+    return ParsedInboundEmail(
+        message_id=message.message_id,
+        in_reply_to=message.in_reply_to,
+        sender=message.sender,
+        recipient=message.recipient,
+        subject=message.subject,
+        body_text=message.body_text,
+        raw_headers="",
+    )
+
+
+def _replay_message(message: ArchibaldEmailMessage, report: ReplayReport, dry_run: bool) -> None:
+    if not _sender_allowed(message.config, message.sender):
+        report.skipped += 1
+        return
+    if dry_run:
+        if detect_action_from_subject(message.subject, owner=message.owner):
+            report.handled += 1
+        else:
+            report.unhandled += 1
+        return
+
+    try:
+        # Savepoint per messaggio: un'azione che fallisce non annulla il resto del blocco.
+        with transaction.atomic():
+            outcome = execute_action_from_email(
+                owner=message.owner,
+                incoming=_incoming_from_message(message),
+                inbound_message=message,
+            )
+            if not outcome.handled:
+                report.unhandled += 1
+                return
+            now = timezone.now()
+            update_fields = [
+                "selected_action_key",
+                "classification_label",
+                "review_status",
+                "reviewed_at",
+                "processed_at",
+                "updated_at",
+            ]
+            if message.status in {ArchibaldEmailMessage.Status.SKIPPED, ArchibaldEmailMessage.Status.FAILED}:
+                message.status = ArchibaldEmailMessage.Status.RECEIVED
+                message.error_text = ""
+                update_fields += ["status", "error_text"]
+            message.selected_action_key = outcome.action_key
+            message.classification_label = outcome.action_key[:80]
+            message.review_status = ArchibaldEmailMessage.ReviewStatus.APPLIED
+            message.reviewed_at = now
+            message.processed_at = now
+            message.save(update_fields=update_fields)
+            report.handled += 1
+    except Exception as exc:
+        report.failed += 1
+        if len(report.errors) < 20:
+            report.errors.append(f"id={message.pk}: {str(exc)[:240]}")
+
+
+def replay_batch(messages: list[ArchibaldEmailMessage], *, dry_run: bool = False) -> ReplayReport:
+    """Rielabora un blocco in un'unica transazione (una sola COMMIT per blocco)."""
+    report = ReplayReport(batches=1)
+    with transaction.atomic():
+        for message in messages:
+            report.scanned += 1
+            _replay_message(message, report, dry_run)
+    return report
+
+
+def _replay_batch_in_thread(messages: list[ArchibaldEmailMessage], dry_run: bool) -> ReplayReport:
+    close_old_connections()
+    try:
+        return replay_batch(messages, dry_run=dry_run)
+    finally:
+        connections.close_all()
+
+
+def _batched(queryset, batch_size: int, chunk_size: int):
+    batch = []
+    for message in queryset.iterator(chunk_size=chunk_size):
+        batch.append(message)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def replay_inbound_messages(
+    queryset,
+    *,
+    batch_size: int = DEFAULT_REPLAY_BATCH_SIZE,
+    chunk_size: int = DEFAULT_REPLAY_CHUNK_SIZE,
+    workers: int = 1,
+    limit: int | None = None,
+    dry_run: bool = False,
+) -> ReplayReport:
+    """
+    Riesegue `execute_action_from_email` sui messaggi del queryset, letto in streaming con
+    `iterator(chunk_size)`. Con `workers > 1` i blocchi sono elaborati da un thread pool (ognuno
+    con la propria connessione DB); al massimo `2 * workers` blocchi restano in memoria.
+    Le risposte email non vengono rimandate: si aggiornano solo azioni e stato di review.
+    """
+    batch_size = max(int(batch_size), 1)
+    chunk_size = max(int(chunk_size), 1)
+    workers = max(int(workers), 1)
+    if connection.vendor == "sqlite":
+        # SQLite (solo test) ammette un writer alla volta: i thread si bloccherebbero a vicenda.
+        workers = 1
+    if limit:
+        queryset = queryset[:limit]
+
+    report = ReplayReport()
+    started_at = time.monotonic()
+    if workers == 1:
+        for batch in _batched(queryset, batch_size, chunk_size):
+            report.merge(replay_batch(batch, dry_run=dry_run))
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="archibald-replay") as executor:
+            pending = set()
+            for batch in _batched(queryset, batch_size, chunk_size):
+                pending.add(executor.submit(_replay_batch_in_thread, batch, dry_run))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        report.merge(future.result())
+            for future in pending:
+                report.merge(future.result())
+    report.elapsed_seconds = time.monotonic() - started_at
+    return report
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import hashlib
 import imaplib
 import os
 import re
 import smtplib
-from dataclasses import dataclass
+import threading
+import uuid
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from email import policy
 from email.header import decode_header, make_header
@@ -24,7 +27,8 @@ from finance_hub.models import SubscriptionOccurrence
 from todos.models import TodoItem
 
 from .actions import WORKLOG_TOKEN_AM, WORKLOG_TOKEN_PM, execute_action_from_email
-from .models import ArchibaldEmailMessage, ArchibaldMailboxConfig
+from .mime import attachment_manifest, extract_text_body, parse_message_streaming
+from .models import ArchibaldEmailMessage, ArchibaldMailboxConfig, ArchibaldOutboxEmail
 
 
 class ArchibaldMailError(RuntimeError):
@@ -40,6 +44,8 @@ class ParsedInboundEmail:
     subject: str
     body_text: str
     raw_headers: str
+    attachments: list[dict] = field(default_factory=list)
+    body_truncated: bool = False
 
 
 WORKLOG_PROMPT_PHASES = (
@@ -79,54 +85,36 @@ def _safe_header(value: str) -> str:
         return value
 
 
-def _extract_body(message) -> str:
-    if message.is_multipart():
-        plain_chunks = []
-        html_chunks = []
-        for part in message.walk():
-            if part.get_content_maintype() == "multipart":
-                continue
-            if part.get_filename():
-                continue
+def _env_int(name: str, default: int) -> int:
+    raw = (os.getenv(name) or "").strip()
+    return int(raw) if raw.isdigit() else default
 
-            content_type = (part.get_content_type() or "").lower()
-            payload = part.get_payload(decode=True) or b""
-            charset = part.get_content_charset() or "utf-8"
-            try:
-                text = payload.decode(charset, errors="replace")
-            except LookupError:
-                text = payload.decode("utf-8", errors="replace")
-
-            if content_type == "text/plain":
-                plain_chunks.append(text)
-            elif content_type == "text/html":
-                html_chunks.append(text)
-
-        if plain_chunks:
-            return "\n".join(chunk.strip() for chunk in plain_chunks if chunk.strip()).strip()
-        if html_chunks:
-            html = "\n".join(html_chunks)
-            cleaned = re.sub(r"<[^>]+>", " ", html)
-            cleaned = re.sub(r"\s+", " ", cleaned)
-            return cleaned.strip()
-        return ""
 
-    payload = message.get_payload(decode=True) or b""
-    charset = message.get_content_charset() or "utf-8"
-    try:
-        return payload.decode(charset, errors="replace").strip()
-    except LookupError:
-        return payload.decode("utf-8", errors="replace").strip()
+def inbound_max_raw_bytes() -> int:
+    """Byte scaricati per messaggio (`BODY.PEEK[]<0.N>`): oltre, il resto non arriva nemmeno in RAM."""
+    return max(_env_int("ARCHIBALD_MAIL_MAX_RAW_BYTES", 10 * 1024 * 1024), 64 * 1024)
+
+
+def inbound_max_part_bytes() -> int:
+    return max(_env_int("ARCHIBALD_MAIL_MAX_PART_BYTES", 1024 * 1024), 1024)
+
+
+def inbound_max_body_chars() -> int:
+    return max(_env_int("ARCHIBALD_MAIL_MAX_BODY_CHARS", 20000), 500)
 
 
 def parse_inbound_email(raw_bytes: bytes) -> ParsedInboundEmail:
-    parsed = BytesParser(policy=policy.default).parsebytes(raw_bytes)
+    """
+    Parsing in streaming con limiti: gli allegati finiscono solo nel manifest (nome, tipo,
+    dimensione) e il corpo testuale viene troncato a ARCHIBALD_MAIL_MAX_BODY_CHARS.
+    """
+    parsed = parse_message_streaming(raw_bytes, max_part_bytes=inbound_max_part_bytes())
     sender = (parseaddr(parsed.get("From", ""))[1] or "").strip().lower()
     recipient = (parseaddr(parsed.get("To", ""))[1] or "").strip().lower()
     subject = _safe_header(parsed.get("Subject", "")).strip()
     message_id = (parsed.get("Message-ID") or "").strip()
     in_reply_to = (parsed.get("In-Reply-To") or "").strip()
-    body = _extract_body(parsed)
+    body, body_truncated = extract_text_body(parsed, max_chars=inbound_max_body_chars())
 
     header_lines = []
     for key in ("Date", "From", "To", "Cc", "Subject", "Message-ID", "In-Reply-To"):
@@ -142,6 +130,8 @@ def parse_inbound_email(raw_bytes: bytes) -> ParsedInboundEmail:
         subject=subject,
         body_text=body,
         raw_headers="\n".join(header_lines),
+        attachments=attachment_manifest(parsed),
+        body_truncated=body_truncated,
     )
 
 
@@ -271,7 +261,9 @@ def send_email_via_smtp(
     body: str,
     in_reply_to: str = "",
     references: str = "",
+    pool: MailConnectionPool | None = None,
 ) -> None:
+    """Con `pool` riusa la sessione SMTP gia autenticata della config invece di aprirne una nuova."""
     recipient = (recipient or "").strip()
     if not recipient:
         raise ArchibaldMailError("Destinatario email mancante.")
@@ -290,10 +282,28 @@ def send_email_via_smtp(
         message["References"] = references
     message.set_content((body or "").strip() or "Messaggio vuoto.")
 
-    password = config.resolved_smtp_password()
+    if pool is not None:
+        try:
+            pool.smtp(config).send_message(message)
+        except Exception as exc:  # pragma: no cover - depends on SMTP network
+            pool.discard_smtp(config)
+            raise ArchibaldMailError(f"Invio SMTP fallito: {exc}") from exc
+        return
+
+    client = None
+    try:
+        client = open_smtp_client(config)
+        client.send_message(message)
+    except Exception as exc:  # pragma: no cover - depends on SMTP network
+        raise ArchibaldMailError(f"Invio SMTP fallito: {exc}") from exc
+    finally:
+        close_smtp_client(client)
+
+
+def open_smtp_client(config: ArchibaldMailboxConfig):
+    """Sessione SMTP autenticata (EHLO, eventuale STARTTLS, LOGIN)."""
     smtp_host = config.resolved_smtp_host()
     smtp_port = config.resolved_smtp_port()
-    smtp_username = config.resolved_smtp_username()
     if config.smtp_use_ssl:
         client = smtplib.SMTP_SSL(smtp_host, smtp_port, timeout=20)
     else:
@@ -303,31 +313,604 @@ def send_email_via_smtp(
         if not config.smtp_use_ssl and config.smtp_use_tls:
             client.starttls()
             client.ehlo()
-        client.login(smtp_username, password)
-        client.send_message(message)
-    except Exception as exc:  # pragma: no cover - depends on SMTP network
-        raise ArchibaldMailError(f"Invio SMTP fallito: {exc}") from exc
-    finally:
-        try:
-            client.quit()
-        except Exception:
-            pass
+        client.login(config.resolved_smtp_username(), config.resolved_smtp_password())
+    except Exception:
+        close_smtp_client(client)
+        raise
+    return client
 
 
-def _mark_seen(mailbox, uid: bytes) -> None:
+def close_smtp_client(client) -> None:
+    if client is None:
+        return
     try:
-        mailbox.store(uid, "+FLAGS", "\\Seen")
+        client.quit()
     except Exception:
         pass
 
 
+# Un server IMAP bloccato non deve trattenere il thread del worker oltre questo limite.
+IMAP_SOCKET_TIMEOUT_SECONDS = 60
+
+
+def open_imap_mailbox(config: ArchibaldMailboxConfig):
+    """Connessione IMAP autenticata con la mailbox configurata gia selezionata."""
+    imap_host = config.resolved_imap_host()
+    imap_port = config.resolved_imap_port()
+    if config.imap_use_ssl:
+        mailbox = imaplib.IMAP4_SSL(imap_host, imap_port, timeout=IMAP_SOCKET_TIMEOUT_SECONDS)
+    else:
+        mailbox = imaplib.IMAP4(imap_host, imap_port, timeout=IMAP_SOCKET_TIMEOUT_SECONDS)
+    try:
+        mailbox.login(config.resolved_imap_username(), config.resolved_imap_password())
+        select_status, _ = mailbox.select(config.imap_mailbox or "INBOX")
+        if select_status != "OK":
+            raise ArchibaldMailError("Selezione mailbox IMAP fallita.")
+        # UIDVALIDITY arriva come risposta non taggata della SELECT: la si conserva sulla
+        # sessione perche imaplib la consuma alla prima lettura (le sessioni del pool durano).
+        mailbox.archibald_uidvalidity = _selected_uidvalidity(mailbox)
+    except Exception:
+        close_imap_mailbox(mailbox)
+        raise
+    return mailbox
+
+
+def _selected_uidvalidity(mailbox) -> int | None:
+    try:
+        _code, values = mailbox.response("UIDVALIDITY")
+    except Exception:
+        return None
+    for value in values or ():
+        raw = value.decode(errors="ignore") if isinstance(value, bytes) else str(value or "")
+        if raw.strip().isdigit():
+            return int(raw.strip())
+    return None
+
+
+def close_imap_mailbox(mailbox) -> None:
+    if mailbox is None:
+        return
+    try:
+        mailbox.close()
+    except Exception:
+        pass
+    try:
+        mailbox.logout()
+    except Exception:
+        pass
+
+
+def _connection_fingerprint(*parts) -> str:
+    return hashlib.sha256("\x00".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def _imap_fingerprint(config: ArchibaldMailboxConfig) -> str:
+    return _connection_fingerprint(
+        config.resolved_imap_host(),
+        config.resolved_imap_port(),
+        config.imap_use_ssl,
+        config.resolved_imap_username(),
+        config.resolved_imap_password(),
+        config.imap_mailbox or "INBOX",
+    )
+
+
+def _smtp_fingerprint(config: ArchibaldMailboxConfig) -> str:
+    return _connection_fingerprint(
+        config.resolved_smtp_host(),
+        config.resolved_smtp_port(),
+        config.smtp_use_ssl,
+        config.smtp_use_tls,
+        config.resolved_smtp_username(),
+        config.resolved_smtp_password(),
+    )
+
+
+def _imap_alive(mailbox) -> bool:
+    try:
+        status, _ = mailbox.noop()
+    except Exception:
+        return False
+    return status == "OK"
+
+
+def _smtp_alive(client) -> bool:
+    try:
+        code, _ = client.noop()
+    except Exception:
+        return False
+    return code == 250
+
+
+class MailConnectionPool:
+    """
+    Sessioni IMAP/SMTP autenticate per config, riusate tra un ciclo e l'altro del worker.
+    Prima del riuso ogni sessione viene verificata con NOOP e riaperta se caduta o se
+    host/credenziali della config sono cambiati. Una config va usata da un thread alla volta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._imap = {}
+        self._smtp = {}
+
+    def _checkout(self, connections: dict, config, fingerprint: str, alive, opener, closer):
+        with self._lock:
+            cached = connections.pop(config.pk, None)
+        if cached is not None:
+            cached_fingerprint, connection = cached
+            if cached_fingerprint == fingerprint and alive(connection):
+                with self._lock:
+                    connections[config.pk] = cached
+                return connection
+            closer(connection)
+        connection = opener(config)
+        with self._lock:
+            connections[config.pk] = (fingerprint, connection)
+        return connection
+
+    def _discard(self, connections: dict, config, closer) -> None:
+        with self._lock:
+            cached = connections.pop(config.pk, None)
+        if cached is not None:
+            closer(cached[1])
+
+    def imap(self, config: ArchibaldMailboxConfig):
+        return self._checkout(
+            self._imap, config, _imap_fingerprint(config), _imap_alive, open_imap_mailbox, close_imap_mailbox
+        )
+
+    def smtp(self, config: ArchibaldMailboxConfig):
+        return self._checkout(
+            self._smtp, config, _smtp_fingerprint(config), _smtp_alive, open_smtp_client, close_smtp_client
+        )
+
+    def discard_imap(self, config: ArchibaldMailboxConfig) -> None:
+        self._discard(self._imap, config, close_imap_mailbox)
+
+    def discard_smtp(self, config: ArchibaldMailboxConfig) -> None:
+        self._discard(self._smtp, config, close_smtp_client)
+
+    def close_all(self) -> None:
+        with self._lock:
+            imap_connections = [connection for _fingerprint, connection in self._imap.values()]
+            smtp_connections = [connection for _fingerprint, connection in self._smtp.values()]
+            self._imap.clear()
+            self._smtp.clear()
+        for mailbox in imap_connections:
+            close_imap_mailbox(mailbox)
+        for client in smtp_connections:
+            close_smtp_client(client)
+
+
+_IMAP_UID_PATTERN = re.compile(rb"\bUID (\d+)")
+IMAP_FETCH_BATCH_SIZE = 50
+
+
+def _imap_uid_set(uids) -> str:
+    """Compatta gli UID in un set IMAP con intervalli (es. `1:4,9,12:13`)."""
+    values = sorted({int(uid) for uid in uids})
+    chunks = []
+    index = 0
+    while index < len(values):
+        first = last = values[index]
+        while index + 1 < len(values) and values[index + 1] == last + 1:
+            index += 1
+            last = values[index]
+        chunks.append(str(first) if first == last else f"{first}:{last}")
+        index += 1
+    return ",".join(chunks)
+
+
+def _parse_uid_fetch(payload) -> dict[bytes, bytes]:
+    """Mappa UID -> raw message da una risposta `UID FETCH ... (BODY.PEEK[])`."""
+    messages = {}
+    pending = None
+    for row in payload or []:
+        if isinstance(row, tuple) and len(row) >= 2:
+            match = _IMAP_UID_PATTERN.search(row[0] or b"")
+            if match:
+                messages[match.group(1)] = row[1] or b""
+                pending = None
+            else:
+                # Alcuni server riportano UID dopo il literal, nella riga successiva.
+                pending = row[1] or b""
+        elif isinstance(row, bytes) and pending is not None:
+            match = _IMAP_UID_PATTERN.search(row)
+            if match:
+                messages[match.group(1)] = pending
+            pending = None
+    return messages
+
+
+def _uid_fetch_batch(mailbox, uids, items: str = "") -> dict[bytes, bytes] | None:
+    """Un solo round trip per blocco; None se il server rifiuta la FETCH."""
+    items = items or f"(BODY.PEEK[]<0.{inbound_max_raw_bytes()}> FLAGS)"
+    fetch_status, payload = mailbox.uid("FETCH", _imap_uid_set(uids), items)
+    if fetch_status != "OK":
+        return None
+    return _parse_uid_fetch(payload)
+
+
+IMAP_MESSAGE_ID_FETCH_ITEMS = "(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])"
+
+
+def _header_message_id(raw_bytes: bytes) -> str:
+    """Message-ID normalizzato come in parse_inbound_email, leggendo solo gli header."""
+    if not raw_bytes:
+        return ""
+    parsed = BytesParser(policy=policy.default).parsebytes(raw_bytes, headersonly=True)
+    return (parsed.get("Message-ID") or "").strip()
+
+
+def _known_inbound_message_ids(config: ArchibaldMailboxConfig, message_ids) -> set[str]:
+    """Message-ID gia registrati per l'owner: una sola query `message_id__in` per blocco."""
+    message_ids = {message_id for message_id in message_ids if message_id}
+    if not message_ids:
+        return set()
+    return set(
+        ArchibaldEmailMessage.objects.filter(
+            owner=config.owner,
+            direction=ArchibaldEmailMessage.Direction.INBOUND,
+            message_id__in=message_ids,
+        ).values_list("message_id", flat=True)
+    )
+
+
+def _imap_uid_ref(uid: bytes, uidvalidity: int | None) -> str:
+    """
+    `external_ref` di un messaggio IMAP: con UIDVALIDITY nota vale `<uidvalidity>:<uid>`, cosi
+    dopo un reset della mailbox gli UID riassegnati non collidono con quelli dell'epoca precedente.
+    """
+    value = uid.decode(errors="ignore")
+    return f"{uidvalidity}:{value}" if uidvalidity is not None else value
+
+
+def _known_inbound_uids(config: ArchibaldMailboxConfig, uids, uidvalidity: int | None) -> set[bytes]:
+    """UID del blocco gia registrati per la config nella stessa UIDVALIDITY, con una sola query."""
+    refs = {_imap_uid_ref(uid, uidvalidity): uid for uid in uids}
+    if not refs:
+        return set()
+    rows = ArchibaldEmailMessage.objects.filter(
+        config=config,
+        direction=ArchibaldEmailMessage.Direction.INBOUND,
+        external_ref__in=refs,
+    ).values_list("external_ref", flat=True)
+    return {refs[ref] for ref in rows}
+
+
+def _mark_seen_bulk(mailbox, uids) -> None:
+    if not uids:
+        return
+    try:
+        mailbox.uid("STORE", _imap_uid_set(uids), "+FLAGS", "(\\Seen)")
+    except Exception:
+        pass
+
+
+def _imap_checkpoint(config: ArchibaldMailboxConfig, uidvalidity: int | None) -> int | None:
+    """UID massimo gia elaborato, o None se serve un resync (nessun checkpoint o UIDVALIDITY cambiata)."""
+    if uidvalidity is None or config.imap_uidvalidity != uidvalidity or not config.imap_highest_processed_uid:
+        return None
+    return config.imap_highest_processed_uid
+
+
+def _imap_highest_uid(mailbox) -> int:
+    status, data = mailbox.uid("SEARCH", "ALL")
+    if status != "OK":
+        raise ArchibaldMailError("Ricerca messaggi IMAP fallita.")
+    uids = data[0].split() if data and data[0] else []
+    return max((int(uid) for uid in uids), default=0)
+
+
+def _save_imap_checkpoint(config: ArchibaldMailboxConfig, uidvalidity: int, highest_uid: int) -> None:
+    config.imap_uidvalidity = uidvalidity
+    config.imap_highest_processed_uid = highest_uid
+    ArchibaldMailboxConfig.objects.filter(pk=config.pk).update(
+        imap_uidvalidity=uidvalidity,
+        imap_highest_processed_uid=highest_uid,
+    )
+
+
+def _process_inbound_message(
+    config: ArchibaldMailboxConfig,
+    external_ref: str,
+    raw_bytes: bytes,
+    result: dict,
+    known_message_ids: set[str],
+) -> None:
+    incoming = parse_inbound_email(raw_bytes)
+
+    if incoming.message_id and incoming.message_id in known_message_ids:
+        result["skipped"] += 1
+        return
+    if incoming.message_id:
+        # Duplicati nello stesso blocco: il secondo viene saltato senza altre query.
+        known_message_ids.add(incoming.message_id)
+
+    with transaction.atomic():
+        inbound = ArchibaldEmailMessage.objects.create(
+            owner=config.owner,
+            config=config,
+            direction=ArchibaldEmailMessage.Direction.INBOUND,
+            status=ArchibaldEmailMessage.Status.RECEIVED,
+            message_id=incoming.message_id,
+            in_reply_to=incoming.in_reply_to,
+            external_ref=external_ref,
+            sender=incoming.sender,
+            recipient=incoming.recipient,
+            subject=incoming.subject,
+            body_text=incoming.body_text,
+            raw_headers=incoming.raw_headers,
+            attachments=incoming.attachments,
+        )
+
+        if not _sender_allowed(config, incoming.sender):
+            inbound.status = ArchibaldEmailMessage.Status.SKIPPED
+            inbound.processed_at = timezone.now()
+            inbound.error_text = "Mittente non autorizzato o non valido."
+            inbound.save(update_fields=["status", "processed_at", "error_text", "updated_at"])
+            result["processed"] += 1
+            result["skipped"] += 1
+            return
+
+        try:
+            action_outcome = execute_action_from_email(
+                owner=config.owner,
+                incoming=incoming,
+                inbound_message=inbound,
+            )
+
+            if action_outcome.handled:
+                reply_body = action_outcome.reply_text.strip() or "Azione completata."
+            else:
+                inbound.status = ArchibaldEmailMessage.Status.SKIPPED
+                inbound.processed_at = timezone.now()
+                inbound.error_text = "Nessun flag azione riconosciuto: email lasciata da gestire manualmente."
+                inbound.save(update_fields=["status", "processed_at", "error_text", "updated_at"])
+                result["processed"] += 1
+                result["skipped"] += 1
+                return
+
+            reply_body = _append_signature(reply_body, config.auto_reply_signature)
+            reply_subject = _reply_subject(config, incoming.subject)
+
+            # La risposta parte dopo il commit, dal drain dell'outbox: la latenza SMTP non
+            # tiene aperta la transazione e un invio fallito non annulla la cattura.
+            ArchibaldOutboxEmail.objects.create(
+                owner=config.owner,
+                config=config,
+                inbound_message=inbound,
+                recipient=incoming.sender,
+                subject=reply_subject,
+                body_text=reply_body,
+                in_reply_to=incoming.message_id,
+                references=incoming.message_id,
+            )
+
+            inbound.processed_at = timezone.now()
+            inbound.ai_response_text = reply_body
+            inbound.selected_action_key = action_outcome.action_key
+            inbound.classification_label = action_outcome.action_key
+            inbound.review_status = ArchibaldEmailMessage.ReviewStatus.APPLIED
+            inbound.reviewed_at = timezone.now()
+            inbound.save(
+                update_fields=[
+                    "processed_at",
+                    "ai_response_text",
+                    "selected_action_key",
+                    "classification_label",
+                    "review_status",
+                    "reviewed_at",
+                    "updated_at",
+                ]
+            )
+            result["processed"] += 1
+            result["queued"] += 1
+        except Exception as exc:
+            error_message = str(exc)
+            inbound.status = ArchibaldEmailMessage.Status.FAILED
+            inbound.processed_at = timezone.now()
+            inbound.error_text = error_message[:3000]
+            inbound.save(update_fields=["status", "processed_at", "error_text", "updated_at"])
+
+            ArchibaldEmailMessage.objects.create(
+                owner=config.owner,
+                config=config,
+                related_message=inbound,
+                direction=ArchibaldEmailMessage.Direction.OUTBOUND,
+                status=ArchibaldEmailMessage.Status.FAILED,
+                in_reply_to=incoming.message_id,
+                sender=config.smtp_sender(),
+                recipient=incoming.sender,
+                subject=_reply_subject(config, incoming.subject),
+                error_text=error_message[:3000],
+                processed_at=timezone.now(),
+            )
+            result["processed"] += 1
+            result["failed"] += 1
+            result["errors"].append(error_message[:240])
+
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_BASE_SECONDS = 60
+OUTBOX_RETRY_MAX_SECONDS = 3600
+# Se il processo muore a meta invio, le righe reclamate tornano disponibili dopo il lease.
+OUTBOX_CLAIM_LEASE_SECONDS = 300
+
+
+@dataclass
+class OutboxDrainReport:
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+    pending: int = 0
+    errors: list[str] = field(default_factory=list)
+
+
+def outbox_retry_delay(attempts: int) -> timedelta:
+    seconds = OUTBOX_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(seconds, OUTBOX_RETRY_MAX_SECONDS))
+
+
+def _claim_outbox_batch(*, config, now, batch_size: int) -> list[ArchibaldOutboxEmail]:
+    """Reclama un blocco di righe scadute con un token: due drain concorrenti non inviano due volte."""
+    due = ArchibaldOutboxEmail.objects.filter(status=ArchibaldOutboxEmail.Status.PENDING, next_attempt_at__lte=now)
+    if config is not None:
+        due = due.filter(config=config)
+    ids = list(due.order_by("next_attempt_at", "id").values_list("id", flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    due.filter(id__in=ids).update(
+        claim_token=token,
+        next_attempt_at=now + timedelta(seconds=OUTBOX_CLAIM_LEASE_SECONDS),
+    )
+    return list(
+        ArchibaldOutboxEmail.objects.filter(claim_token=token)
+        .select_related("config", "config__owner", "inbound_message")
+        .order_by("config_id", "id")
+    )
+
+
+def _outbox_sent(item: ArchibaldOutboxEmail, now) -> None:
+    with transaction.atomic():
+        item.status = ArchibaldOutboxEmail.Status.SENT
+        item.attempts += 1
+        item.sent_at = now
+        item.last_error = ""
+        item.save(update_fields=["status", "attempts", "sent_at", "last_error", "updated_at"])
+        ArchibaldEmailMessage.objects.create(
+            owner_id=item.owner_id,
+            config=item.config,
+            related_message=item.inbound_message,
+            direction=ArchibaldEmailMessage.Direction.OUTBOUND,
+            status=ArchibaldEmailMessage.Status.SENT,
+            in_reply_to=item.in_reply_to,
+            sender=item.config.smtp_sender(),
+            recipient=item.recipient,
+            subject=item.subject,
+            body_text=item.body_text,
+            sent_at=now,
+            processed_at=now,
+        )
+        if item.inbound_message_id:
+            ArchibaldEmailMessage.objects.filter(pk=item.inbound_message_id).update(
+                status=ArchibaldEmailMessage.Status.REPLIED,
+                updated_at=now,
+            )
+
+
+def _outbox_failed(item: ArchibaldOutboxEmail, now, error_message: str) -> bool:
+    """Registra il tentativo fallito; True se la risposta e' stata abbandonata."""
+    item.attempts += 1
+    item.last_error = error_message[:3000]
+    if item.attempts < OUTBOX_MAX_ATTEMPTS:
+        item.next_attempt_at = now + outbox_retry_delay(item.attempts)
+        item.save(update_fields=["attempts", "last_error", "next_attempt_at", "updated_at"])
+        return False
+    with transaction.atomic():
+        item.status = ArchibaldOutboxEmail.Status.FAILED
+        item.save(update_fields=["status", "attempts", "last_error", "updated_at"])
+        ArchibaldEmailMessage.objects.create(
+            owner_id=item.owner_id,
+            config=item.config,
+            related_message=item.inbound_message,
+            direction=ArchibaldEmailMessage.Direction.OUTBOUND,
+            status=ArchibaldEmailMessage.Status.FAILED,
+            in_reply_to=item.in_reply_to,
+            sender=item.config.smtp_sender(),
+            recipient=item.recipient,
+            subject=item.subject,
+            error_text=item.last_error,
+            processed_at=now,
+        )
+        if item.inbound_message_id:
+            ArchibaldEmailMessage.objects.filter(pk=item.inbound_message_id).update(
+                error_text=f"Risposta non inviata dopo {item.attempts} tentativi: {item.last_error}"[:3000],
+                updated_at=now,
+            )
+    return True
+
+
+def drain_outbox(
+    *,
+    config: ArchibaldMailboxConfig | None = None,
+    pool: MailConnectionPool | None = None,
+    batch_size: int = OUTBOX_BATCH_SIZE,
+    now=None,
+) -> OutboxDrainReport:
+    """
+    Invia le risposte in coda scadute (di una config o di tutte), a blocchi e su una sola
+    sessione SMTP per config. Gli errori pianificano un nuovo tentativo con backoff esponenziale
+    fino a OUTBOX_MAX_ATTEMPTS, poi la riga passa a FAILED.
+    """
+    report = OutboxDrainReport()
+    owns_pool = pool is None
+    if owns_pool:
+        pool = MailConnectionPool()
+    try:
+        while True:
+            now_value = now or timezone.now()
+            items = _claim_outbox_batch(config=config, now=now_value, batch_size=batch_size)
+            if not items:
+                break
+            broken_configs = set()
+            for item in items:
+                if item.config_id in broken_configs:
+                    # SMTP della config gia fallito in questo blocco: si rimanda senza consumare tentativi.
+                    ArchibaldOutboxEmail.objects.filter(pk=item.pk).update(
+                        next_attempt_at=now_value + outbox_retry_delay(1),
+                        updated_at=now_value,
+                    )
+                    report.retried += 1
+                    continue
+                try:
+                    send_email_via_smtp(
+                        item.config,
+                        recipient=item.recipient,
+                        subject=item.subject,
+                        body=item.body_text,
+                        in_reply_to=item.in_reply_to,
+                        references=item.references,
+                        pool=pool,
+                    )
+                except Exception as exc:
+                    broken_configs.add(item.config_id)
+                    error_message = str(exc)
+                    if _outbox_failed(item, now_value, error_message):
+                        report.failed += 1
+                    else:
+                        report.retried += 1
+                    report.errors.append(error_message[:240])
+                    continue
+                _outbox_sent(item, now_value)
+                report.sent += 1
+    finally:
+        if owns_pool:
+            pool.close_all()
+
+    pending = ArchibaldOutboxEmail.objects.filter(status=ArchibaldOutboxEmail.Status.PENDING)
+    if config is not None:
+        pending = pending.filter(config=config)
+    report.pending = pending.count()
+    return report
+
+
 def process_inbox_for_config(
     config: ArchibaldMailboxConfig,
     *,
     limit: int | None = None,
     force: bool = False,
     search_criteria: tuple[str, ...] | None = None,
+    pool: MailConnectionPool | None = None,
 ) -> dict:
+    """
+    Con `pool` (worker) le sessioni IMAP/SMTP restano aperte per il ciclo successivo; senza,
+    se ne usa uno temporaneo chiuso a fine run. In entrambi i casi tutte le risposte del run
+    passano per un'unica sessione SMTP.
+    """
     if not config.is_enabled and not force:
         return {"status": "disabled", "fetched": 0, "processed": 0, "replied": 0, "skipped": 0, "failed": 0}
     if not config.is_imap_configured():
@@ -343,202 +926,103 @@ def process_inbox_for_config(
         "replied": 0,
         "skipped": 0,
         "failed": 0,
+        "queued": 0,
         "errors": [],
     }
 
-    imap_host = config.resolved_imap_host()
-    imap_port = config.resolved_imap_port()
-    imap_username = config.resolved_imap_username()
-    password = config.resolved_imap_password()
-    mailbox = None
+    owns_pool = pool is None
+    if owns_pool:
+        pool = MailConnectionPool()
     try:
-        if config.imap_use_ssl:
-            mailbox = imaplib.IMAP4_SSL(imap_host, imap_port)
-        else:
-            mailbox = imaplib.IMAP4(imap_host, imap_port)
+        mailbox = pool.imap(config)
 
-        mailbox.login(imap_username, password)
-        select_status, _ = mailbox.select(config.imap_mailbox or "INBOX")
-        if select_status != "OK":
-            raise ArchibaldMailError("Selezione mailbox IMAP fallita.")
+        uidvalidity = getattr(mailbox, "archibald_uidvalidity", None)
+        checkpoint = _imap_checkpoint(config, uidvalidity)
+        # Il checkpoint avanza solo nel ciclo completo: la corsia ARCHI vede un sottoinsieme.
+        tracks_checkpoint = not search_criteria and uidvalidity is not None
+        resync_highest_uid = None
+        if checkpoint is None and tracks_checkpoint:
+            resync_highest_uid = _imap_highest_uid(mailbox)
 
         criteria = tuple(search_criteria or ("UNSEEN",))
-        search_status, data = mailbox.search(None, *criteria)
+        if checkpoint is not None:
+            criteria = ("UID", f"{checkpoint + 1}:*", *(search_criteria or ()))
+        search_status, data = mailbox.uid("SEARCH", *criteria)
         if search_status != "OK":
             raise ArchibaldMailError("Ricerca messaggi IMAP fallita.")
 
         all_ids = data[0].split() if data and data[0] else []
-        selected_ids = all_ids[-max_items:]
+        if checkpoint is not None:
+            # `n+1:*` restituisce sempre almeno l'ultimo messaggio, anche se gia elaborato;
+            # si procede dal piu vecchio cosi il checkpoint avanza senza buchi.
+            all_ids = sorted((uid for uid in all_ids if int(uid) > checkpoint), key=int)
+            selected_ids = all_ids[:max_items]
+        else:
+            selected_ids = all_ids[-max_items:]
 
         result["fetched"] = len(selected_ids)
 
-        for uid in selected_ids:
-            fetch_status, payload = mailbox.fetch(uid, "(RFC822)")
-            if fetch_status != "OK" or not payload:
-                result["failed"] += 1
-                result["errors"].append("Fetch IMAP fallita per un messaggio.")
-                _mark_seen(mailbox, uid)
-                continue
-
-            raw_bytes = b""
-            for row in payload:
-                if isinstance(row, tuple) and len(row) >= 2:
-                    raw_bytes = row[1] or b""
-                    break
-
-            if not raw_bytes:
-                result["failed"] += 1
-                result["errors"].append("Messaggio IMAP privo di body raw.")
-                _mark_seen(mailbox, uid)
-                continue
-
-            incoming = parse_inbound_email(raw_bytes)
-
-            already_exists = False
-            if incoming.message_id:
-                already_exists = ArchibaldEmailMessage.objects.filter(
-                    owner=config.owner,
-                    direction=ArchibaldEmailMessage.Direction.INBOUND,
-                    message_id=incoming.message_id,
-                ).exists()
-            if already_exists:
-                result["skipped"] += 1
-                _mark_seen(mailbox, uid)
-                continue
-
-            with transaction.atomic():
-                inbound = ArchibaldEmailMessage.objects.create(
-                    owner=config.owner,
-                    config=config,
-                    direction=ArchibaldEmailMessage.Direction.INBOUND,
-                    status=ArchibaldEmailMessage.Status.RECEIVED,
-                    message_id=incoming.message_id,
-                    in_reply_to=incoming.in_reply_to,
-                    external_ref=uid.decode(errors="ignore"),
-                    sender=incoming.sender,
-                    recipient=incoming.recipient,
-                    subject=incoming.subject,
-                    body_text=incoming.body_text,
-                    raw_headers=incoming.raw_headers,
-                )
-
-                if not _sender_allowed(config, incoming.sender):
-                    inbound.status = ArchibaldEmailMessage.Status.SKIPPED
-                    inbound.processed_at = timezone.now()
-                    inbound.error_text = "Mittente non autorizzato o non valido."
-                    inbound.save(update_fields=["status", "processed_at", "error_text", "updated_at"])
-                    result["processed"] += 1
-                    result["skipped"] += 1
-                    _mark_seen(mailbox, uid)
-                    continue
-
-                try:
-                    action_outcome = execute_action_from_email(
-                        owner=config.owner,
-                        incoming=incoming,
-                        inbound_message=inbound,
-                    )
-
-                    if action_outcome.handled:
-                        reply_body = action_outcome.reply_text.strip() or "Azione completata."
-                    else:
-                        inbound.status = ArchibaldEmailMessage.Status.SKIPPED
-                        inbound.processed_at = timezone.now()
-                        inbound.error_text = "Nessun flag azione riconosciuto: email lasciata da gestire manualmente."
-                        inbound.save(update_fields=["status", "processed_at", "error_text", "updated_at"])
-                        result["processed"] += 1
+        for offset in range(0, len(selected_ids), IMAP_FETCH_BATCH_SIZE):
+            batch = selected_ids[offset : offset + IMAP_FETCH_BATCH_SIZE]
+            # Prima solo il Message-ID di tutto il blocco: i duplicati non scaricano il body.
+            headers = _uid_fetch_batch(mailbox, batch, IMAP_MESSAGE_ID_FETCH_ITEMS)
+            header_ids = {uid: _header_message_id(raw) for uid, raw in (headers or {}).items()}
+            known_ids = _known_inbound_message_ids(config, header_ids.values())
+            # Con il checkpoint `UID n+1:*` torna anche la posta gia presa dalla corsia ARCHI:
+            # chi non ha Message-ID si riconosce dall'UID (con la sua UIDVALIDITY) in `external_ref`.
+            known_uids = _known_inbound_uids(config, batch, uidvalidity) if checkpoint is not None else set()
+            duplicate_uids = {uid for uid in batch if header_ids.get(uid) in known_ids or uid in known_uids}
+            to_download = [uid for uid in batch if uid not in duplicate_uids]
+            messages = _uid_fetch_batch(mailbox, to_download) if to_download else {}
+            if headers is None and messages:
+                body_ids = (_header_message_id(raw) for raw in messages.values())
+                known_ids = _known_inbound_message_ids(config, body_ids)
+            seen_uids = []
+            try:
+                for uid in batch:
+                    if uid in duplicate_uids:
                         result["skipped"] += 1
-                        _mark_seen(mailbox, uid)
-                        continue
-
-                    reply_body = _append_signature(reply_body, config.auto_reply_signature)
-                    reply_subject = _reply_subject(config, incoming.subject)
-
-                    send_email_via_smtp(
-                        config,
-                        recipient=incoming.sender,
-                        subject=reply_subject,
-                        body=reply_body,
-                        in_reply_to=incoming.message_id,
-                        references=incoming.message_id,
-                    )
-
-                    ArchibaldEmailMessage.objects.create(
-                        owner=config.owner,
-                        config=config,
-                        related_message=inbound,
-                        direction=ArchibaldEmailMessage.Direction.OUTBOUND,
-                        status=ArchibaldEmailMessage.Status.SENT,
-                        in_reply_to=incoming.message_id,
-                        sender=config.smtp_sender(),
-                        recipient=incoming.sender,
-                        subject=reply_subject,
-                        body_text=reply_body,
-                        sent_at=timezone.now(),
-                        processed_at=timezone.now(),
-                    )
-
-                    inbound.status = ArchibaldEmailMessage.Status.REPLIED
-                    inbound.processed_at = timezone.now()
-                    inbound.ai_response_text = reply_body
-                    if action_outcome.handled:
-                        inbound.selected_action_key = action_outcome.action_key
-                        inbound.classification_label = action_outcome.action_key
-                        inbound.review_status = ArchibaldEmailMessage.ReviewStatus.APPLIED
-                        inbound.reviewed_at = timezone.now()
-                    inbound.save(
-                        update_fields=[
-                            "status",
-                            "processed_at",
-                            "ai_response_text",
-                            "selected_action_key",
-                            "classification_label",
-                            "review_status",
-                            "reviewed_at",
-                            "updated_at",
-                        ]
-                    )
-                    result["processed"] += 1
-                    result["replied"] += 1
-                except Exception as exc:
-                    error_message = str(exc)
-                    inbound.status = ArchibaldEmailMessage.Status.FAILED
-                    inbound.processed_at = timezone.now()
-                    inbound.error_text = error_message[:3000]
-                    inbound.save(update_fields=["status", "processed_at", "error_text", "updated_at"])
-
-                    ArchibaldEmailMessage.objects.create(
-                        owner=config.owner,
-                        config=config,
-                        related_message=inbound,
-                        direction=ArchibaldEmailMessage.Direction.OUTBOUND,
-                        status=ArchibaldEmailMessage.Status.FAILED,
-                        in_reply_to=incoming.message_id,
-                        sender=config.smtp_sender(),
-                        recipient=incoming.sender,
-                        subject=_reply_subject(config, incoming.subject),
-                        error_text=error_message[:3000],
-                        processed_at=timezone.now(),
-                    )
-                    result["processed"] += 1
-                    result["failed"] += 1
-                    result["errors"].append(error_message[:240])
-
-            _mark_seen(mailbox, uid)
-
+                    elif messages is None:
+                        result["failed"] += 1
+                        result["errors"].append("Fetch IMAP fallita per un messaggio.")
+                    elif not messages.get(uid):
+                        result["failed"] += 1
+                        result["errors"].append("Messaggio IMAP privo di body raw.")
+                    else:
+                        _process_inbound_message(
+                            config, _imap_uid_ref(uid, uidvalidity), messages[uid], result, known_ids
+                        )
+                    # Solo dopo la gestione: se l'elaborazione solleva, il messaggio resta UNSEEN
+                    # e viene ritentato al ciclo successivo.
+                    seen_uids.append(uid)
+            finally:
+                # Un solo UID STORE per blocco, anche se l'elaborazione si interrompe a meta.
+                _mark_seen_bulk(mailbox, seen_uids)
+                if tracks_checkpoint and checkpoint is not None and seen_uids:
+                    # `seen_uids` e il prefisso gestito del blocco (ordinato per UID): dopo un errore
+                    # il checkpoint si ferma all'ultimo UID prima del messaggio fallito.
+                    checkpoint = max(checkpoint, *(int(uid) for uid in seen_uids))
+                    _save_imap_checkpoint(config, uidvalidity, checkpoint)
+
+        if resync_highest_uid is not None and len(selected_ids) == len(all_ids):
+            # Resync completato (tutti gli UNSEEN elaborati): da qui in poi solo `UID n+1:*`.
+            highest = max([resync_highest_uid, *(int(uid) for uid in selected_ids)])
+            _save_imap_checkpoint(config, uidvalidity, highest)
+
+        drained = drain_outbox(config=config, pool=pool)
+        result["replied"] += drained.sent
+        result["queued"] = drained.pending
+        result["errors"].extend(drained.errors)
+    except Exception:
+        # Sessione in stato incerto: il prossimo ciclo riparte da una connessione nuova.
+        pool.discard_imap(config)
+        raise
     finally:
-        if mailbox is not None:
-            try:
-                mailbox.close()
-            except Exception:
-                pass
-            try:
-                mailbox.logout()
-            except Exception:
-                pass
+        if owns_pool:
+            pool.close_all()
 
     config.latest_poll_at = timezone.now()
-    if result["failed"] and result["replied"] == 0 and result["processed"] > 0:
+    if result["failed"] and result["replied"] == 0 and result["queued"] == 0 and result["processed"] > 0:
         config.latest_poll_status = "error"
     elif result["failed"]:
         config.latest_poll_status = "partial"
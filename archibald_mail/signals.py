@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .actions import invalidate_flag_rule_matcher
+from .models import ArchibaldEmailFlagRule
+
+
+@receiver(post_save, sender=ArchibaldEmailFlagRule)
+@receiver(post_delete, sender=ArchibaldEmailFlagRule)
+def invalidate_flag_matcher_on_rule_change(sender, instance, **kwargs):
+    invalidate_flag_rule_matcher(instance.owner_id)
+
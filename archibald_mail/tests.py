@@ -1,21 +1,38 @@
 from unittest.mock import patch
 from types import SimpleNamespace
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.db import DatabaseError
 from django.test import TestCase
+from django.utils import timezone
 from zoneinfo import ZoneInfo
 
 from agenda.models import WorkLog
 from memory_stock.models import MemoryStockItem
 from todos.models import TodoList, TodoItem
-from .actions import EmailActionOutcome, detect_action_from_subject, execute_action_from_email, execute_action_manually
+from .actions import (
+    _FLAG_MATCHER_CACHE,
+    EmailActionOutcome,
+    detect_action_from_subject,
+    execute_action_from_email,
+    execute_action_manually,
+)
 from .forms import ArchibaldEmailFlagRuleForm, ArchibaldMailboxConfigForm
-from .models import ArchibaldEmailFlagRule, ArchibaldEmailMessage, ArchibaldInboundCategory, ArchibaldMailboxConfig
+from .models import (
+    ArchibaldEmailFlagRule,
+    ArchibaldEmailMessage,
+    ArchibaldInboundCategory,
+    ArchibaldMailboxConfig,
+    ArchibaldOutboxEmail,
+)
 from .services import (
+    ArchibaldMailError,
+    MailConnectionPool,
     ParsedInboundEmail,
     _sender_allowed,
+    drain_outbox,
     parse_inbound_email,
     process_inbox_for_config,
     send_due_worklog_prompts_for_config,
@@ -23,8 +40,77 @@ from .services import (
 )
 
 
+def _expand_uid_set(value: str) -> list[bytes]:
+    uids = []
+    for chunk in value.split(","):
+        first, _sep, last = chunk.partition(":")
+        uids.extend(str(uid).encode() for uid in range(int(first), int(last or first) + 1))
+    return uids
+
+
+class FakeImapMailbox:
+    """IMAP finto: risponde a UID SEARCH/FETCH/STORE con i messaggi indicati (uid -> raw)."""
+
+    def __init__(self, messages=None):
+        self.messages = dict(messages or {})
+        self.commands = []
+        self.searched_criteria = None
+        self.seen = set()
+        self.noop_status = "OK"
+        self.uidvalidity = 1
+
+    def noop(self):
+        return self.noop_status, [b""]
+
+    def login(self, *_args, **_kwargs):
+        return "OK", [b""]
+
+    def select(self, *_args, **_kwargs):
+        return "OK", [str(len(self.messages)).encode()]
+
+    def response(self, code):
+        return code, [str(self.uidvalidity).encode()]
+
+    def uid(self, command, *args):
+        self.commands.append((command, *args))
+        if command == "SEARCH":
+            self.searched_criteria = args
+            uids = sorted(self.messages, key=int)
+            if args[:1] == ("UID",):
+                # Come i server reali, `n:*` include sempre l'ultimo UID.
+                first = int(args[1].split(":")[0])
+                uids = [uid for uid in uids if int(uid) >= first] or uids[-1:]
+            elif "UNSEEN" in args:
+                uids = [uid for uid in uids if uid not in self.seen]
+            return "OK", [b" ".join(uids)]
+        if command == "FETCH":
+            rows = []
+            for uid in _expand_uid_set(args[0]):
+                if uid in self.messages:
+                    raw = self.messages[uid]
+                    if "HEADER.FIELDS" in args[1]:
+                        headers = raw.split(b"\r\n\r\n", 1)[0].split(b"\r\n")
+                        raw = b"".join(line + b"\r\n" for line in headers if line.lower().startswith(b"message-id:"))
+                        raw += b"\r\n"
+                    rows.append((b"%s (UID %s FLAGS () BODY[] {%d}" % (uid, uid, len(raw)), raw))
+                    rows.append(b")")
+            return "OK", rows
+        if command == "STORE":
+            self.seen.update(_expand_uid_set(args[0]))
+            return "OK", [b""]
+        return "NO", [b""]
+
+    def close(self):
+        return "OK", [b""]
+
+    def logout(self):
+        return "BYE", [b""]
+
+
 class ArchibaldMailFormTests(TestCase):
     def setUp(self):
+        # Gli id utente si ripetono tra un test e l'altro: niente matcher ereditati.
+        _FLAG_MATCHER_CACHE.clear()
         self.user = get_user_model().objects.create_user(
             username="mail_user",
             password="pwd12345",
@@ -114,6 +200,7 @@ class ArchibaldMailFormTests(TestCase):
 
 class ArchibaldMailServicesTests(TestCase):
     def setUp(self):
+        _FLAG_MATCHER_CACHE.clear()
         self.user = get_user_model().objects.create_user(
             username="service_user",
             password="pwd12345",
@@ -148,27 +235,7 @@ class ArchibaldMailServicesTests(TestCase):
 
     @patch("archibald_mail.services.imaplib.IMAP4_SSL")
     def test_process_inbox_uses_custom_search_criteria(self, mock_imap_cls):
-        class FakeMailbox:
-            def __init__(self):
-                self.searched_criteria = None
-
-            def login(self, *_args, **_kwargs):
-                return "OK", [b""]
-
-            def select(self, *_args, **_kwargs):
-                return "OK", [b"0"]
-
-            def search(self, _charset, *criteria):
-                self.searched_criteria = criteria
-                return "OK", [b""]
-
-            def close(self):
-                return "OK", [b""]
-
-            def logout(self):
-                return "BYE", [b""]
-
-        fake_mailbox = FakeMailbox()
+        fake_mailbox = FakeImapMailbox()
         mock_imap_cls.return_value = fake_mailbox
         self.config.is_enabled = True
         self.config.save(update_fields=["is_enabled", "updated_at"])
@@ -209,29 +276,7 @@ class ArchibaldMailServicesTests(TestCase):
         mock_execute_action,
         mock_smtp,
     ):
-        class FakeMailbox:
-            def login(self, *_args, **_kwargs):
-                return "OK", [b""]
-
-            def select(self, *_args, **_kwargs):
-                return "OK", [b"1"]
-
-            def search(self, *_args, **_kwargs):
-                return "OK", [b"1"]
-
-            def fetch(self, *_args, **_kwargs):
-                return "OK", [(b"1", b"raw")]
-
-            def store(self, *_args, **_kwargs):
-                return "OK", [b""]
-
-            def close(self):
-                return "OK", [b""]
-
-            def logout(self):
-                return "BYE", [b""]
-
-        mock_imap_cls.return_value = FakeMailbox()
+        mock_imap_cls.return_value = FakeImapMailbox({b"1": b"raw"})
         mock_parse.return_value = ParsedInboundEmail(
             message_id="<msg-whitelist-1@example.com>",
             in_reply_to="",
@@ -277,29 +322,7 @@ class ArchibaldMailServicesTests(TestCase):
         mock_execute_action,
         mock_smtp,
     ):
-        class FakeMailbox:
-            def login(self, *_args, **_kwargs):
-                return "OK", [b""]
-
-            def select(self, *_args, **_kwargs):
-                return "OK", [b"1"]
-
-            def search(self, *_args, **_kwargs):
-                return "OK", [b"1"]
-
-            def fetch(self, *_args, **_kwargs):
-                return "OK", [(b"1", b"raw")]
-
-            def store(self, *_args, **_kwargs):
-                return "OK", [b""]
-
-            def close(self):
-                return "OK", [b""]
-
-            def logout(self):
-                return "BYE", [b""]
-
-        mock_imap_cls.return_value = FakeMailbox()
+        mock_imap_cls.return_value = FakeImapMailbox({b"1": b"raw"})
         mock_parse.return_value = ParsedInboundEmail(
             message_id="<msg-no-flag-1@example.com>",
             in_reply_to="",
@@ -345,29 +368,7 @@ class ArchibaldMailServicesTests(TestCase):
         mock_execute_action,
         mock_smtp,
     ):
-        class FakeMailbox:
-            def login(self, *_args, **_kwargs):
-                return "OK", [b""]
-
-            def select(self, *_args, **_kwargs):
-                return "OK", [b"1"]
-
-            def search(self, *_args, **_kwargs):
-                return "OK", [b"1"]
-
-            def fetch(self, *_args, **_kwargs):
-                return "OK", [(b"1", b"raw")]
-
-            def store(self, *_args, **_kwargs):
-                return "OK", [b""]
-
-            def close(self):
-                return "OK", [b""]
-
-            def logout(self):
-                return "BYE", [b""]
-
-        mock_imap_cls.return_value = FakeMailbox()
+        mock_imap_cls.return_value = FakeImapMailbox({b"1": b"raw"})
         mock_parse.return_value = ParsedInboundEmail(
             message_id="<msg-1@example.com>",
             in_reply_to="",
@@ -404,6 +405,67 @@ class ArchibaldMailServicesTests(TestCase):
         self.assertIsNotNone(inbound)
         self.assertEqual(inbound.status, ArchibaldEmailMessage.Status.REPLIED)
 
+    @patch("archibald_mail.services.execute_action_from_email")
+    @patch("archibald_mail.services.imaplib.IMAP4_SSL")
+    def test_process_inbox_fetches_and_marks_seen_in_one_round_trip(self, mock_imap_cls, mock_execute_action):
+        def raw_email(index):
+            return (
+                f"From: sender{index}@example.com\r\nTo: archibald@miorganizzo.ovh\r\n"
+                f"Subject: Nota {index}\r\nMessage-ID: <batch-{index}@example.com>\r\n\r\nCorpo {index}\r\n"
+            ).encode()
+
+        fake_mailbox = FakeImapMailbox({b"5": raw_email(5), b"6": raw_email(6), b"9": raw_email(9)})
+        mock_imap_cls.return_value = fake_mailbox
+        mock_execute_action.return_value = EmailActionOutcome(handled=False, action_key="")
+        self.config.is_enabled = True
+        self.config.save(update_fields=["is_enabled", "updated_at"])
+
+        result = process_inbox_for_config(self.config)
+
+        self.assertEqual(result["fetched"], 3)
+        self.assertEqual(result["processed"], 3)
+        self.assertEqual(
+            [command[:2] for command in fake_mailbox.commands],
+            [("SEARCH", "ALL"), ("SEARCH", "UNSEEN"), ("FETCH", "5:6,9"), ("FETCH", "5:6,9"), ("STORE", "5:6,9")],
+        )
+        self.assertEqual(fake_mailbox.seen, {b"5", b"6", b"9"})
+        self.assertEqual(
+            set(
+                ArchibaldEmailMessage.objects.filter(
+                    owner=self.user,
+                    direction=ArchibaldEmailMessage.Direction.INBOUND,
+                ).values_list("external_ref", flat=True)
+            ),
+            {"1:5", "1:6", "1:9"},
+        )
+
+    @patch("archibald_mail.services.execute_action_from_email")
+    @patch("archibald_mail.services.imaplib.IMAP4_SSL")
+    def test_process_inbox_leaves_crashed_message_unseen(self, mock_imap_cls, mock_execute_action):
+        def raw_email(index):
+            return (
+                f"From: sender{index}@example.com\r\nTo: archibald@miorganizzo.ovh\r\n"
+                f"Subject: Nota {index}\r\nMessage-ID: <crash-{index}@example.com>\r\n\r\nCorpo {index}\r\n"
+            ).encode()
+
+        fake_mailbox = FakeImapMailbox({b"5": raw_email(5), b"6": raw_email(6), b"7": raw_email(7)})
+        mock_imap_cls.return_value = fake_mailbox
+        mock_execute_action.return_value = EmailActionOutcome(handled=False, action_key="")
+        self.config.is_enabled = True
+        self.config.save(update_fields=["is_enabled", "updated_at"])
+        original_create = ArchibaldEmailMessage.objects.create
+
+        def create_or_fail(**kwargs):
+            if kwargs.get("external_ref") == "1:6":
+                raise DatabaseError("insert fallita")
+            return original_create(**kwargs)
+
+        with patch.object(ArchibaldEmailMessage.objects, "create", side_effect=create_or_fail):
+            with self.assertRaises(DatabaseError):
+                process_inbox_for_config(self.config)
+
+        self.assertEqual(fake_mailbox.seen, {b"5"})
+
     @patch("archibald_mail.services.send_email_via_smtp")
     def test_send_notification_force_creates_log(self, mock_smtp):
         self.config.notification_recipient = "digest@example.com"
@@ -477,6 +539,34 @@ class ArchibaldMailServicesTests(TestCase):
         self.assertEqual(parsed.subject, "Test rapido")
         self.assertIn("Ciao Archibald", parsed.body_text)
 
+    @patch.dict("os.environ", {"ARCHIBALD_MAIL_MAX_BODY_CHARS": "600"}, clear=False)
+    def test_parse_inbound_email_keeps_attachment_manifest_and_caps_html_body(self):
+        import base64
+
+        attachment = base64.encodebytes(b"x" * 300_000).decode("ascii")
+        html_body = "<html><head><style>p {color: red}</style></head><body>" + "<p>Riga &amp; testo</p>" * 200
+        raw = (
+            "From: mario@example.com\r\nTo: archibald@miorganizzo.ovh\r\nSubject: Report\r\n"
+            "Message-ID: <mime-1@example.com>\r\nMIME-Version: 1.0\r\n"
+            'Content-Type: multipart/mixed; boundary="XYZ"\r\n\r\n'
+            "--XYZ\r\nContent-Type: text/html; charset=utf-8\r\n\r\n"
+            f"{html_body}</body></html>\r\n"
+            "--XYZ\r\nContent-Type: application/pdf\r\nContent-Transfer-Encoding: base64\r\n"
+            'Content-Disposition: attachment; filename="report.pdf"\r\n\r\n'
+            f"{attachment}\r\n--XYZ--\r\n"
+        ).encode("utf-8")
+
+        parsed = parse_inbound_email(raw)
+
+        self.assertTrue(parsed.body_text.startswith("Riga & testo\nRiga & testo"))
+        self.assertNotIn("color", parsed.body_text)
+        self.assertLessEqual(len(parsed.body_text), 600)
+        self.assertTrue(parsed.body_truncated)
+        self.assertEqual(len(parsed.attachments), 1)
+        self.assertEqual(parsed.attachments[0]["filename"], "report.pdf")
+        self.assertEqual(parsed.attachments[0]["content_type"], "application/pdf")
+        self.assertAlmostEqual(parsed.attachments[0]["size"], 300_000, delta=10)
+
     @patch.dict(
         "os.environ",
         {
@@ -527,9 +617,269 @@ class ArchibaldMailServicesTests(TestCase):
         self.assertEqual(self.config.smtp_sender(), "archibald-env@example.com")
         self.assertTrue(self.config.is_smtp_configured())
 
+    @patch("archibald_mail.services.execute_action_from_email")
+    @patch("archibald_mail.services.imaplib.IMAP4_SSL")
+    def test_process_inbox_downloads_bodies_only_for_new_message_ids(self, mock_imap_cls, mock_execute_action):
+        def raw_email(message_id):
+            return (
+                "From: sender@example.com\r\nTo: archibald@miorganizzo.ovh\r\n"
+                f"Subject: Nota\r\nMessage-ID: {message_id}\r\n\r\nCorpo\r\n"
+            ).encode()
+
+        ArchibaldEmailMessage.objects.create(
+            owner=self.user,
+            config=self.config,
+            direction=ArchibaldEmailMessage.Direction.INBOUND,
+            status=ArchibaldEmailMessage.Status.RECEIVED,
+            message_id="<dup@example.com>",
+        )
+        fake_mailbox = FakeImapMailbox(
+            {b"1": raw_email("<dup@example.com>"), b"2": raw_email("<new@example.com>"), b"3": raw_email("<new@example.com>")}
+        )
+        mock_imap_cls.return_value = fake_mailbox
+        mock_execute_action.return_value = EmailActionOutcome(handled=False, action_key="")
+        self.config.is_enabled = True
+        self.config.save(update_fields=["is_enabled", "updated_at"])
+
+        result = process_inbox_for_config(self.config)
+
+        fetches = [command for command in fake_mailbox.commands if command[0] == "FETCH"]
+        self.assertEqual([command[1] for command in fetches], ["1:3", "2:3"])
+        self.assertIn("HEADER.FIELDS (MESSAGE-ID)", fetches[0][2])
+        self.assertEqual((result["fetched"], result["processed"], result["skipped"]), (3, 1, 3))
+        self.assertEqual(
+            ArchibaldEmailMessage.objects.filter(owner=self.user, message_id="<new@example.com>").count(),
+            1,
+        )
+
+    @patch("archibald_mail.services.execute_action_from_email")
+    @patch("archibald_mail.services.imaplib.IMAP4_SSL")
+    def test_process_inbox_fetches_only_uids_after_checkpoint(self, mock_imap_cls, mock_execute_action):
+        def raw_email(index):
+            return (
+                f"From: sender{index}@example.com\r\nTo: archibald@miorganizzo.ovh\r\n"
+                f"Subject: Nota {index}\r\nMessage-ID: <uid-{index}@example.com>\r\n\r\nCorpo\r\n"
+            ).encode()
+
+        fake_mailbox = FakeImapMailbox({b"3": raw_email(3), b"4": raw_email(4)})
+        fake_mailbox.uidvalidity = 77
+        # Letta da una persona prima del worker: con il checkpoint viene comunque elaborata.
+        fake_mailbox.seen.add(b"3")
+        mock_imap_cls.return_value = fake_mailbox
+        mock_execute_action.return_value = EmailActionOutcome(handled=False, action_key="")
+        self.config.is_enabled = True
+        self.config.imap_uidvalidity = 77
+        self.config.imap_highest_processed_uid = 2
+        self.config.save()
+
+        result = process_inbox_for_config(self.config)
+
+        self.assertEqual(result["fetched"], 2)
+        self.assertEqual(fake_mailbox.commands[0], ("SEARCH", "UID", "3:*"))
+        self.config.refresh_from_db()
+        self.assertEqual((self.config.imap_uidvalidity, self.config.imap_highest_processed_uid), (77, 4))
+
+        result = process_inbox_for_config(self.config)
+        self.assertEqual(result["fetched"], 0)
+        self.assertEqual(fake_mailbox.searched_criteria, ("UID", "5:*"))
+
+        # UIDVALIDITY cambiata: resync sugli UNSEEN e nuovo checkpoint sull'UID piu alto.
+        fake_mailbox.uidvalidity = 78
+        mock_imap_cls.return_value = FakeImapMailbox(fake_mailbox.messages)
+        mock_imap_cls.return_value.uidvalidity = 78
+        result = process_inbox_for_config(self.config, pool=MailConnectionPool())
+        self.assertEqual(result["fetched"], 2)
+        self.assertEqual(result["skipped"], 2)
+        self.config.refresh_from_db()
+        self.assertEqual((self.config.imap_uidvalidity, self.config.imap_highest_processed_uid), (78, 4))
+
+    @patch("archibald_mail.services.execute_action_from_email")
+    @patch("archibald_mail.services.imaplib.IMAP4_SSL")
+    def test_checkpoint_stops_before_failed_uid_and_skips_known_uids(self, mock_imap_cls, mock_execute_action):
+        def raw_email(index, with_message_id=True):
+            message_id = f"Message-ID: <ckpt-{index}@example.com>\r\n" if with_message_id else ""
+            return (
+                f"From: sender{index}@example.com\r\nTo: archibald@miorganizzo.ovh\r\n"
+                f"Subject: Nota {index}\r\n{message_id}\r\nCorpo\r\n"
+            ).encode()
+
+        fake_mailbox = FakeImapMailbox(
+            {b"3": raw_email(3), b"4": raw_email(4), b"5": raw_email(5), b"6": raw_email(6, with_message_id=False)}
+        )
+        fake_mailbox.uidvalidity = 77
+        mock_imap_cls.return_value = fake_mailbox
+        mock_execute_action.return_value = EmailActionOutcome(handled=False, action_key="")
+        self.config.is_enabled = True
+        self.config.imap_uidvalidity = 77
+        self.config.imap_highest_processed_uid = 2
+        self.config.save()
+        # UID 6 (senza Message-ID) gia elaborato dalla corsia ARCHI.
+        ArchibaldEmailMessage.objects.create(
+            owner=self.user,
+            config=self.config,
+            direction=ArchibaldEmailMessage.Direction.INBOUND,
+            status=ArchibaldEmailMessage.Status.RECEIVED,
+            external_ref="77:6",
+        )
+        original_create = ArchibaldEmailMessage.objects.create
+
+        def create_or_fail(**kwargs):
+            if kwargs.get("external_ref") == "77:4":
+                raise DatabaseError("insert fallita")
+            return original_create(**kwargs)
+
+        with patch.object(ArchibaldEmailMessage.objects, "create", side_effect=create_or_fail):
+            with self.assertRaises(DatabaseError):
+                process_inbox_for_config(self.config)
+
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.imap_highest_processed_uid, 3)
+        self.assertEqual(fake_mailbox.seen, {b"3"})
+
+        result = process_inbox_for_config(self.config)
+
+        self.assertEqual(fake_mailbox.searched_criteria, ("UID", "4:*"))
+        self.assertEqual((result["fetched"], result["processed"], result["skipped"]), (3, 2, 3))
+        self.assertEqual(ArchibaldEmailMessage.objects.filter(config=self.config, external_ref="77:6").count(), 1)
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.imap_highest_processed_uid, 6)
+
+    @patch("archibald_mail.services.execute_action_from_email")
+    @patch("archibald_mail.services.imaplib.IMAP4_SSL")
+    def test_uid_dedup_ignores_refs_from_previous_uidvalidity(self, mock_imap_cls, mock_execute_action):
+        raw = (
+            "From: sender@example.com\r\nTo: archibald@miorganizzo.ovh\r\n"
+            "Subject: Nota senza id\r\n\r\nCorpo\r\n"
+        ).encode()
+        fake_mailbox = FakeImapMailbox({b"3": raw})
+        fake_mailbox.uidvalidity = 78
+        mock_imap_cls.return_value = fake_mailbox
+        mock_execute_action.return_value = EmailActionOutcome(handled=False, action_key="")
+        # Reset della mailbox gia visto (checkpoint nella nuova epoca): l'UID 3 e' stato riassegnato.
+        self.config.is_enabled = True
+        self.config.imap_uidvalidity = 78
+        self.config.imap_highest_processed_uid = 2
+        self.config.save()
+        ArchibaldEmailMessage.objects.create(
+            owner=self.user,
+            config=self.config,
+            direction=ArchibaldEmailMessage.Direction.INBOUND,
+            status=ArchibaldEmailMessage.Status.RECEIVED,
+            external_ref="77:3",
+        )
+
+        result = process_inbox_for_config(self.config)
+
+        self.assertEqual((result["fetched"], result["processed"], result["skipped"]), (1, 1, 1))
+        self.assertTrue(ArchibaldEmailMessage.objects.filter(config=self.config, external_ref="78:3").exists())
+        self.assertEqual(fake_mailbox.seen, {b"3"})
+
+    @patch("archibald_mail.services.execute_action_from_email")
+    @patch("archibald_mail.services.imaplib.IMAP4_SSL")
+    def test_connection_pool_reuses_imap_session_and_reconnects_after_failed_noop(
+        self, mock_imap_cls, mock_execute_action
+    ):
+        first_mailbox = FakeImapMailbox()
+        second_mailbox = FakeImapMailbox()
+        mock_imap_cls.side_effect = [first_mailbox, second_mailbox]
+        self.config.is_enabled = True
+        self.config.save(update_fields=["is_enabled", "updated_at"])
+        pool = MailConnectionPool()
+        self.addCleanup(pool.close_all)
+
+        process_inbox_for_config(self.config, pool=pool)
+        process_inbox_for_config(self.config, pool=pool)
+        self.assertEqual(mock_imap_cls.call_count, 1)
+        self.assertEqual(first_mailbox.commands.count(("SEARCH", "UNSEEN")), 2)
+
+        first_mailbox.noop_status = "NO"
+        process_inbox_for_config(self.config, pool=pool)
+        self.assertEqual(mock_imap_cls.call_count, 2)
+        self.assertEqual(second_mailbox.commands.count(("SEARCH", "UNSEEN")), 1)
+
+    @patch("archibald_mail.services.execute_action_from_email")
+    @patch("archibald_mail.services.smtplib.SMTP")
+    @patch("archibald_mail.services.imaplib.IMAP4_SSL")
+    def test_process_inbox_sends_all_replies_over_one_smtp_session(
+        self, mock_imap_cls, mock_smtp_cls, mock_execute_action
+    ):
+        def raw_email(index):
+            return (
+                f"From: sender{index}@example.com\r\nTo: archibald@miorganizzo.ovh\r\n"
+                f"Subject: [MEMORY] Nota {index}\r\nMessage-ID: <smtp-{index}@example.com>\r\n\r\nCorpo\r\n"
+            ).encode()
+
+        mock_imap_cls.return_value = FakeImapMailbox({b"1": raw_email(1), b"2": raw_email(2), b"3": raw_email(3)})
+        smtp_client = mock_smtp_cls.return_value
+        smtp_client.noop.return_value = (250, b"OK")
+        mock_execute_action.return_value = EmailActionOutcome(
+            handled=True,
+            action_key="memory_stock.save",
+            reply_text="Memoria salvata.",
+        )
+        self.config.is_enabled = True
+        self.config.save(update_fields=["is_enabled", "updated_at"])
+
+        result = process_inbox_for_config(self.config)
+
+        self.assertEqual(result["replied"], 3)
+        self.assertEqual(mock_smtp_cls.call_count, 1)
+        self.assertEqual(smtp_client.login.call_count, 1)
+        self.assertEqual(smtp_client.send_message.call_count, 3)
+        self.assertEqual(smtp_client.quit.call_count, 1)
+
+    @patch("archibald_mail.services.send_email_via_smtp")
+    @patch("archibald_mail.services.execute_action_from_email")
+    @patch("archibald_mail.services.imaplib.IMAP4_SSL")
+    def test_failed_reply_stays_in_outbox_and_is_retried_with_backoff(
+        self, mock_imap_cls, mock_execute_action, mock_smtp
+    ):
+        raw = (
+            "From: sender@example.com\r\nTo: archibald@miorganizzo.ovh\r\n"
+            "Subject: [MEMORY] Link\r\nMessage-ID: <outbox-1@example.com>\r\n\r\nhttps://example.com\r\n"
+        ).encode()
+        mock_imap_cls.return_value = FakeImapMailbox({b"1": raw})
+        mock_execute_action.return_value = EmailActionOutcome(
+            handled=True,
+            action_key="memory_stock.save",
+            reply_text="Memoria salvata.",
+        )
+        mock_smtp.side_effect = ArchibaldMailError("SMTP giu")
+        self.config.is_enabled = True
+        self.config.save(update_fields=["is_enabled", "updated_at"])
+
+        result = process_inbox_for_config(self.config)
+
+        # La cattura resta valida: solo la risposta attende un nuovo tentativo.
+        self.assertEqual((result["processed"], result["replied"], result["failed"], result["queued"]), (1, 0, 0, 1))
+        inbound = ArchibaldEmailMessage.objects.get(owner=self.user, direction=ArchibaldEmailMessage.Direction.INBOUND)
+        self.assertEqual(inbound.status, ArchibaldEmailMessage.Status.RECEIVED)
+        self.assertEqual(inbound.review_status, ArchibaldEmailMessage.ReviewStatus.APPLIED)
+        item = ArchibaldOutboxEmail.objects.get(inbound_message=inbound)
+        self.assertEqual((item.status, item.attempts), (ArchibaldOutboxEmail.Status.PENDING, 1))
+        self.assertGreater(item.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        self.assertEqual(drain_outbox().sent, 0)
+        mock_smtp.side_effect = None
+        report = drain_outbox(now=item.next_attempt_at + timedelta(seconds=1))
+
+        self.assertEqual((report.sent, report.pending), (1, 0))
+        item.refresh_from_db()
+        inbound.refresh_from_db()
+        self.assertEqual((item.status, item.attempts), (ArchibaldOutboxEmail.Status.SENT, 2))
+        self.assertEqual(inbound.status, ArchibaldEmailMessage.Status.REPLIED)
+        self.assertTrue(
+            ArchibaldEmailMessage.objects.filter(
+                related_message=inbound,
+                direction=ArchibaldEmailMessage.Direction.OUTBOUND,
+                status=ArchibaldEmailMessage.Status.SENT,
+            ).exists()
+        )
+
 
 class ArchibaldMailActionsTests(TestCase):
     def setUp(self):
+        _FLAG_MATCHER_CACHE.clear()
         self.user = get_user_model().objects.create_user(
             username="mail_action_user",
             password="pwd12345",
@@ -562,6 +912,19 @@ class ArchibaldMailActionsTests(TestCase):
         )
         self.assertEqual(detect_action_from_subject("[IDEA] Link", owner=self.user), "memory_stock.save")
 
+    def test_flag_rule_matcher_is_cached_and_invalidated_on_rule_change(self):
+        self.assertEqual(detect_action_from_subject("[TODO] primo", owner=self.user), "todo.capture")
+        with self.assertNumQueries(0):
+            self.assertEqual(detect_action_from_subject("#todo secondo", owner=self.user), "todo.capture")
+
+        rule = ArchibaldEmailFlagRule.objects.get(owner=self.user, flag_token="TODO")
+        rule.action_key = ArchibaldEmailFlagRule.ActionKey.MEMORY_STOCK_SAVE
+        rule.save()
+        self.assertEqual(detect_action_from_subject("[TODO] terzo", owner=self.user), "memory_stock.save")
+
+        rule.delete()
+        self.assertEqual(detect_action_from_subject("[TODO] quarto", owner=self.user), "todo.capture")
+
     def test_execute_action_saves_memory_stock_item(self):
         incoming = SimpleNamespace(
             sender="mario@example.com",
@@ -700,6 +1063,7 @@ class ArchibaldMailActionsTests(TestCase):
 
 class ArchibaldMailFlagCrudViewsTests(TestCase):
     def setUp(self):
+        _FLAG_MATCHER_CACHE.clear()
         self.user = get_user_model().objects.create_superuser(
             username="mail_flag_user",
             password="pwd12345",
@@ -750,6 +1114,7 @@ class ArchibaldMailFlagCrudViewsTests(TestCase):
 
 class ArchibaldMailInboundQueueViewsTests(TestCase):
     def setUp(self):
+        _FLAG_MATCHER_CACHE.clear()
         self.user = get_user_model().objects.create_superuser(
             username="mail_inbox_user",
             password="pwd12345",
@@ -823,6 +1188,7 @@ class ArchibaldMailInboundQueueViewsTests(TestCase):
 
 class ArchibaldMailPermissionsTests(TestCase):
     def setUp(self):
+        _FLAG_MATCHER_CACHE.clear()
         self.user = get_user_model().objects.create_user(
             username="mail_limited_user",
             password="pwd12345",
@@ -867,6 +1233,7 @@ class ArchibaldMailPermissionsTests(TestCase):
 
 class ArchibaldMailDigestTests(TestCase):
     def setUp(self):
+        _FLAG_MATCHER_CACHE.clear()
         self.user = get_user_model().objects.create_user(
             username="mail_digest_user",
             password="pwd12345",
@@ -900,3 +1267,208 @@ class ArchibaldMailDigestTests(TestCase):
         self.assertTrue(has_items)
         self.assertIn("Reminder da gestire", digest)
         self.assertIn("Scadenza bolletta acqua", digest)
+
+
+class ArchibaldMailIdleTests(TestCase):
+    def setUp(self):
+        _FLAG_MATCHER_CACHE.clear()
+        self.user = get_user_model().objects.create_user(username="idle_user", password="pwd12345")
+        self.config = ArchibaldMailboxConfig.objects.create(owner=self.user, is_enabled=True)
+
+    def test_idle_wait_returns_on_exists_and_closes_with_done(self):
+        import socket
+
+        from .idle import idle_wait
+
+        client, server = socket.socketpair()
+        self.addCleanup(client.close)
+        self.addCleanup(server.close)
+        server.sendall(b"+ idling\r\n* 4 EXISTS\r\nA001 OK IDLE terminated\r\n")
+        mailbox = SimpleNamespace(sock=client, _new_tag=lambda: b"A001", send=client.sendall)
+
+        self.assertTrue(idle_wait(mailbox, timeout=5))
+        self.assertEqual(server.recv(1024), b"A001 IDLE\r\nDONE\r\n")
+
+    @patch("archibald_mail.idle.open_imap_mailbox")
+    def test_idle_watcher_falls_back_to_polling_without_idle_capability(self, mock_open):
+        import threading
+
+        from .idle import MailboxIdleWatcher
+
+        fake_mailbox = FakeImapMailbox()
+        fake_mailbox.capabilities = ("IMAP4REV1",)
+        mock_open.return_value = fake_mailbox
+        notified = []
+
+        watcher = MailboxIdleWatcher(self.config, notified.append, threading.Event())
+        watcher.run()
+
+        self.assertFalse(watcher.supported)
+        self.assertTrue(watcher.ready.is_set())
+        self.assertEqual(notified, [])
+
+    @patch("archibald_mail.management.commands.run_archibald_mail_worker.process_inbox_for_config")
+    def test_worker_idle_mode_processes_notified_mailbox(self, mock_process):
+        import threading
+
+        from .management.commands.run_archibald_mail_worker import Command
+
+        class ImmediateWatcher:
+            def __init__(self, config, notify, stop_event, **_kwargs):
+                self.config = config
+                self.notify = notify
+                self.ready = threading.Event()
+                self.supported = True
+
+            def start(self):
+                self.ready.set()
+                self.notify(self.config.pk)
+
+        mock_process.return_value = {"status": "ok", "fetched": 1, "processed": 1, "replied": 0, "skipped": 0, "failed": 0}
+        command = Command()
+        with patch("archibald_mail.management.commands.run_archibald_mail_worker.MailboxIdleWatcher", ImmediateWatcher):
+            command._run_idle(
+                interval=300,
+                limit=None,
+                user_value="",
+                force=False,
+                archi_fast_enabled=True,
+                archi_fast_seconds=5,
+                archi_fast_limit=3,
+                archi_fast_search=("UNSEEN", "SUBJECT", "ARCHI"),
+                max_wakeups=1,
+            )
+
+        # Nessun polling ARCHI per le mailbox in IDLE: una sola elaborazione, su notifica.
+        mock_process.assert_called_once()
+        self.assertEqual(mock_process.call_args.args[0].pk, self.config.pk)
+        self.assertIsNone(mock_process.call_args.kwargs["search_criteria"])
+
+
+class ArchibaldMailWorkerTests(TestCase):
+    def setUp(self):
+        _FLAG_MATCHER_CACHE.clear()
+        User = get_user_model()
+        self.slow_config = ArchibaldMailboxConfig.objects.create(
+            owner=User.objects.create_user(username="worker_slow", password="pwd12345"),
+            is_enabled=True,
+        )
+        self.fast_config = ArchibaldMailboxConfig.objects.create(
+            owner=User.objects.create_user(username="worker_fast", password="pwd12345"),
+            is_enabled=True,
+        )
+
+    @patch("archibald_mail.management.commands.run_archibald_mail_worker.process_inbox_for_config")
+    def test_concurrent_cycle_does_not_wait_for_hung_mailbox(self, mock_process):
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        from .management.commands.run_archibald_mail_worker import Command
+
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def process(config, **_kwargs):
+            if config.pk == self.slow_config.pk:
+                release.wait(10)
+            return {"status": "ok", "fetched": 1, "processed": 1, "replied": 1, "skipped": 0, "failed": 0}
+
+        mock_process.side_effect = process
+        command = Command()
+        command.config_timeout_seconds = 0.3
+        command.executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(command.executor.shutdown, wait=False)
+
+        started_at = time.monotonic()
+        totals = command._run_cycle(limit=None, user_value="", force=False)
+
+        self.assertLess(time.monotonic() - started_at, 5)
+        fetched, processed, replied, skipped, failed = totals
+        self.assertEqual((fetched, replied, failed), (1, 1, 1))
+        # Mailbox ancora bloccata: il ciclo successivo la salta invece di aprire una seconda sessione.
+        command._run_cycle(limit=None, user_value="", force=False)
+        slow_calls = [call for call in mock_process.call_args_list if call.args[0].pk == self.slow_config.pk]
+        self.assertEqual(len(slow_calls), 1)
+
+
+class ArchibaldMailReplayTests(TestCase):
+    def setUp(self):
+        _FLAG_MATCHER_CACHE.clear()
+        self.user = get_user_model().objects.create_user(username="replay_user", password="pwd12345")
+        self.config = ArchibaldMailboxConfig.objects.create(owner=self.user, is_enabled=True)
+        self.flagged = self._inbound("<replay-1@example.com>", "[MEMORY] Articolo https://example.com/post/9")
+        self.plain = self._inbound("<replay-2@example.com>", "Nessuna azione qui")
+
+    def _inbound(self, message_id, subject):
+        return ArchibaldEmailMessage.objects.create(
+            owner=self.user,
+            config=self.config,
+            direction=ArchibaldEmailMessage.Direction.INBOUND,
+            status=ArchibaldEmailMessage.Status.SKIPPED,
+            message_id=message_id,
+            sender="mario@example.com",
+            subject=subject,
+            body_text="Da rivedere",
+            error_text="Nessun flag azione riconosciuto: email lasciata da gestire manualmente.",
+        )
+
+    def test_replay_dry_run_counts_without_applying_actions(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("replay_archibald_inbox", "--dry-run", "--user", "replay_user", stdout=out)
+
+        self.assertIn("[dry-run] Replay inbound: scanned=2 handled=1 unhandled=1", out.getvalue())
+        self.assertEqual(MemoryStockItem.objects.filter(owner=self.user).count(), 0)
+        self.flagged.refresh_from_db()
+        self.assertEqual(self.flagged.status, ArchibaldEmailMessage.Status.SKIPPED)
+
+    def test_replay_applies_actions_in_batches_without_sending_replies(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("replay_archibald_inbox", "--status", "SKIPPED", "--batch-size", "1", stdout=out)
+
+        self.assertIn("scanned=2 handled=1 unhandled=1 skipped=0 failed=0 batches=2", out.getvalue())
+        self.assertIn("msg/s", out.getvalue())
+        self.flagged.refresh_from_db()
+        self.assertEqual(self.flagged.status, ArchibaldEmailMessage.Status.RECEIVED)
+        self.assertEqual(self.flagged.review_status, ArchibaldEmailMessage.ReviewStatus.APPLIED)
+        self.assertEqual(self.flagged.selected_action_key, "memory_stock.save")
+        self.assertEqual(self.flagged.error_text, "")
+        self.assertEqual(MemoryStockItem.objects.filter(owner=self.user).count(), 1)
+        self.assertFalse(ArchibaldOutboxEmail.objects.exists())
+
+        # Le email gia APPLIED sono escluse di default: la voce Memory Stock non viene duplicata.
+        call_command("replay_archibald_inbox", stdout=StringIO())
+        self.assertEqual(MemoryStockItem.objects.filter(owner=self.user).count(), 1)
+
+    def test_replay_skips_applied_by_default_and_uses_original_received_time(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        worklog = self._inbound("<replay-3@example.com>", "[WORKLOG_AM]")
+        received_at = datetime(2026, 3, 10, 10, 0, tzinfo=ZoneInfo("UTC"))
+        ArchibaldEmailMessage.objects.filter(pk=worklog.pk).update(body_text="09:00-12:30", created_at=received_at)
+
+        call_command("replay_archibald_inbox", "--status", "SKIPPED", stdout=StringIO())
+
+        row = WorkLog.objects.get(owner=self.user)
+        self.assertEqual(row.work_date.isoformat(), "2026-03-10")
+        self.assertEqual(row.note.count("Archibald mattina"), 1)
+
+        out = StringIO()
+        call_command("replay_archibald_inbox", stdout=out)
+        self.assertIn("scanned=1 handled=0 unhandled=1", out.getvalue())
+        row.refresh_from_db()
+        self.assertEqual(row.note.count("Archibald mattina"), 1)
+
+        out = StringIO()
+        call_command("replay_archibald_inbox", "--include-applied", "--dry-run", stdout=out)
+        self.assertIn("scanned=3 handled=2", out.getvalue())
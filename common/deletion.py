@@ -0,0 +1,15 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Model, QuerySet
+
+
+def deleted_with_owner(owner_id, origin) -> bool:
+    """
+    True se la cancellazione (`origin` dei signal post_delete) e' partita dall'utente owner:
+    nella cascata non vanno create righe legate a lui, il controllo FK fallirebbe al commit.
+    """
+    user_model = get_user_model()
+    if isinstance(origin, QuerySet):
+        return origin.model is user_model
+    if isinstance(origin, Model):
+        return isinstance(origin, user_model) and origin.pk == owner_id
+    return False
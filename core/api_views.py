@@ -13,9 +13,15 @@ from core.helpers import (
     _todos_item_create_for_user,
     _todos_item_update_for_user,
     _todos_item_delete_for_user,
+    _todos_batch_for_user,
     _projects_response_for_user,
+    _projects_export_for_user,
     _agenda_response_for_user,
+    _agenda_range,
+    _api_conditional_response,
+    _mobile_week_start_for,
 )
+from core.resource_versions import RESOURCE_AGENDA, RESOURCE_PROJECTS, RESOURCE_TODOS
 
 
 @require_http_methods(["GET"])
@@ -23,7 +29,15 @@ def api_todos(request):
     session, error = _api_authenticate_request(request)
     if error:
         return error
-    return _todos_response_for_user(session.user, request.GET.get("week"))
+    week_value = request.GET.get("week")
+    since_value = request.GET.get("since")
+    return _api_conditional_response(
+        request,
+        session.user,
+        RESOURCE_TODOS,
+        f"{_mobile_week_start_for(week_value).isoformat()}:{since_value or ''}",
+        lambda: _todos_response_for_user(session.user, week_value, since_value),
+    )
 
 
 @csrf_exempt
@@ -74,12 +88,47 @@ def api_todos_item_delete(request):
     return _todos_item_delete_for_user(session.user, payload)
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_todos_batch(request):
+    payload = _mobile_parse_json(request)
+    if payload is None:
+        return _mobile_json_error("invalid_json", status=400)
+    session, error = _api_authenticate_request(request)
+    if error:
+        return error
+    return _todos_batch_for_user(session.user, payload)
+
+
 @require_http_methods(["GET"])
 def api_projects(request):
     session, error = _api_authenticate_request(request)
     if error:
         return error
-    return _projects_response_for_user(session.user)
+    since_value = request.GET.get("since")
+    limit_value = request.GET.get("limit")
+    after_value = request.GET.get("after")
+    return _api_conditional_response(
+        request,
+        session.user,
+        RESOURCE_PROJECTS,
+        f"{since_value or ''}:{limit_value or ''}:{after_value or ''}",
+        lambda: _projects_response_for_user(session.user, since_value, limit_value, after_value),
+    )
+
+
+@require_http_methods(["GET"])
+def api_projects_export(request):
+    session, error = _api_authenticate_request(request)
+    if error:
+        return error
+    return _api_conditional_response(
+        request,
+        session.user,
+        RESOURCE_PROJECTS,
+        "export",
+        lambda: _projects_export_for_user(session.user),
+    )
 
 
 @require_http_methods(["GET"])
@@ -87,8 +136,25 @@ def api_agenda(request):
     session, error = _api_authenticate_request(request)
     if error:
         return error
-    return _agenda_response_for_user(
+    start_value = request.GET.get("start")
+    duration_value = request.GET.get("duration")
+    end_value = request.GET.get("end")
+    since_value = request.GET.get("since")
+    limit_value = request.GET.get("limit")
+    after_value = request.GET.get("after")
+    start_date, end_date = _agenda_range(start_value, duration_value, end_value)
+    return _api_conditional_response(
+        request,
         session.user,
-        request.GET.get("start"),
-        request.GET.get("duration"),
+        RESOURCE_AGENDA,
+        f"{start_date.isoformat()}:{end_date.isoformat()}:{since_value or ''}:{limit_value or ''}:{after_value or ''}",
+        lambda: _agenda_response_for_user(
+            session.user,
+            start_value,
+            duration_value,
+            since_value,
+            end_value=end_value,
+            limit_value=limit_value,
+            after_value=after_value,
+        ),
     )
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from agenda.models import AgendaItem, WorkLog
+from finance_hub.models import SubscriptionOccurrence
+from planner.models import PlannerItem
+from todos.models import TodoItem
+from transactions.models import Transaction
+
+from .models import CalendarDayCount
+
+Kind = CalendarDayCount.Kind
+KIND_ORDER = {kind: index for index, kind in enumerate(Kind.values)}
+
+
+@dataclass(frozen=True)
+class RollupSource:
+    day_field: str
+    fields: tuple[str, ...]
+    kind_for: Callable[[dict], str | None]
+
+
+def _task_kind(values: dict) -> str | None:
+    return Kind.TASK if values["status"] != TodoItem.Status.DONE else None
+
+
+def _agenda_kind(values: dict) -> str | None:
+    if values["status"] != AgendaItem.Status.PLANNED:
+        return None
+    if values["item_type"] == AgendaItem.ItemType.ACTIVITY:
+        return Kind.AGENDA_ACTIVITY
+    if values["item_type"] == AgendaItem.ItemType.REMINDER:
+        return Kind.AGENDA_REMINDER
+    return None
+
+
+def _planner_kind(values: dict) -> str | None:
+    return Kind.PLANNER if values["status"] == PlannerItem.Status.PLANNED else None
+
+
+def _worklog_kind(values: dict) -> str | None:
+    return Kind.WORKLOG if values["hours"] else None
+
+
+ROLLUP_SOURCES = {
+    TodoItem: RollupSource("due_date", ("status",), _task_kind),
+    AgendaItem: RollupSource("due_date", ("status", "item_type"), _agenda_kind),
+    PlannerItem: RollupSource("due_date", ("status",), _planner_kind),
+    SubscriptionOccurrence: RollupSource("due_date", (), lambda values: Kind.SUBSCRIPTION),
+    Transaction: RollupSource("date", (), lambda values: Kind.TRANSACTION),
+    WorkLog: RollupSource("work_date", ("hours",), _worklog_kind),
+}
+
+# Stessi criteri di ROLLUP_SOURCES espressi come filtri ORM, usati dal rebuild completo.
+REBUILD_QUERIES = [
+    (Kind.TASK, TodoItem, "due_date", ~Q(status=TodoItem.Status.DONE)),
+    (
+        Kind.AGENDA_ACTIVITY,
+        AgendaItem,
+        "due_date",
+        Q(item_type=AgendaItem.ItemType.ACTIVITY, status=AgendaItem.Status.PLANNED),
+    ),
+    (
+        Kind.AGENDA_REMINDER,
+        AgendaItem,
+        "due_date",
+        Q(item_type=AgendaItem.ItemType.REMINDER, status=AgendaItem.Status.PLANNED),
+    ),
+    (Kind.PLANNER, PlannerItem, "due_date", Q(status=PlannerItem.Status.PLANNED)),
+    (Kind.SUBSCRIPTION, SubscriptionOccurrence, "due_date", Q()),
+    (Kind.TRANSACTION, Transaction, "date", Q()),
+    (Kind.WORKLOG, WorkLog, "work_date", ~Q(hours=0)),
+]
+
+
+def _rollup_key(model, owner_id, values: dict):
+    source = ROLLUP_SOURCES[model]
+    meta = model._meta
+    normalized = {name: meta.get_field(name).to_python(value) for name, value in values.items()}
+    day = normalized.get(source.day_field)
+    if not owner_id or not day:
+        return None
+    kind = source.kind_for(normalized)
+    if not kind:
+        return None
+    return owner_id, day, kind
+
+
+def _instance_key(instance):
+    source = ROLLUP_SOURCES[type(instance)]
+    values = {name: getattr(instance, name) for name in (source.day_field, *source.fields)}
+    return _rollup_key(type(instance), instance.owner_id, values)
+
+
+def _bump(key, delta: int) -> None:
+    if key is None:
+        return
+    owner_id, day, kind = key
+    rows = CalendarDayCount.objects.filter(owner_id=owner_id, day=day, kind=kind)
+    if rows.update(count=F("count") + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            CalendarDayCount.objects.create(owner_id=owner_id, day=day, kind=kind, count=delta)
+    except IntegrityError:
+        rows.update(count=F("count") + delta)
+
+
+def track_previous_rollup_key(sender, instance, raw=False, **kwargs):
+    instance._calendar_rollup_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    source = ROLLUP_SOURCES[sender]
+    previous = (
+        sender.objects.filter(pk=instance.pk)
+        .values("owner_id", source.day_field, *source.fields)
+        .first()
+    )
+    if previous:
+        owner_id = previous.pop("owner_id")
+        instance._calendar_rollup_previous = _rollup_key(sender, owner_id, previous)
+
+
+def apply_rollup_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_calendar_rollup_previous", None)
+    current = _instance_key(instance)
+    if previous != current:
+        _bump(previous, -1)
+        _bump(current, 1)
+
+
+def apply_rollup_on_delete(sender, instance, **kwargs):
+    _bump(_instance_key(instance), -1)
+
+
+def rebuild_calendar_rollup(*, owner_ids=None) -> int:
+    """Ricalcola da zero i contatori (tutti o per gli owner indicati). Restituisce le righe scritte."""
+    rows = []
+    with transaction.atomic():
+        existing = CalendarDayCount.objects.all()
+        if owner_ids is not None:
+            existing = existing.filter(owner_id__in=owner_ids)
+        existing.delete()
+
+        for kind, model, day_field, condition in REBUILD_QUERIES:
+            qs = model.objects.filter(condition, **{f"{day_field}__isnull": False})
+            if owner_ids is not None:
+                qs = qs.filter(owner_id__in=owner_ids)
+            for row in qs.values("owner_id", day_field).annotate(total=Count("id")).order_by():
+                rows.append(
+                    CalendarDayCount(owner_id=row["owner_id"], day=row[day_field], kind=kind, count=row["total"])
+                )
+        CalendarDayCount.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def calendar_day_counts(user, start: date, end: date):
+    """Una sola scansione indicizzata su (owner, day): righe (giorno, kind, label, count) ordinate."""
+    rows = CalendarDayCount.objects.filter(owner=user, day__range=(start, end), count__gt=0).values_list(
+        "day", "kind", "count"
+    )
+    labels = dict(Kind.choices)
+    for day, kind, count in sorted(rows, key=lambda row: (row[0], KIND_ORDER.get(row[1], len(KIND_ORDER)))):
+        yield day, kind, labels.get(kind, kind), count
+
+
+def weekday_occurrences(start: date, end: date, weekday: int):
+    cursor = start + timedelta(days=(weekday - start.weekday()) % 7)
+    while cursor <= end:
+        yield cursor
+        cursor += timedelta(days=7)
@@ -1,16 +1,22 @@
 from __future__ import annotations
 
+import atexit
 import fcntl
+import hashlib
+import hmac
 import json
 import logging
 import os
 import re
 import secrets
 import stat
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
 from django.conf import settings
-from django.db import transaction
+from django.db import connections, transaction
 from django.utils import timezone
 from passlib.context import CryptContext
 
@@ -22,6 +28,8 @@ _DAV_COLLECTION_SANITIZER = re.compile(r"[^a-z0-9._-]+")
 _HASH_CONTEXT = CryptContext(schemes=["bcrypt"], deprecated="auto")
 _LEGACY_HASH_PREFIXES = ("{SSHA}", "{SHA}")
 _UNSUPPORTED_HASH_PREFIXES = ("$5$", "$6$", "$1$", "$apr1$")
+# Attesa massima di un rebuild rinviato, anche se le modifiche continuano ad arrivare.
+RADICALE_SYNC_MAX_DELAY_SECONDS = 30
 logger = logging.getLogger(__name__)
 
 
@@ -98,6 +106,8 @@ def _build_external_base_username(owner, raw_hint: str) -> str:
 
 
 def _username_exists(candidate: str, *, exclude_user_id: int | None = None, exclude_external_id: int | None = None) -> bool:
+    if candidate and candidate == _service_account_username():
+        return True
     internal_qs = DavAccount.objects.filter(dav_username=candidate)
     if exclude_user_id is not None:
         internal_qs = internal_qs.exclude(user_id=exclude_user_id)
@@ -110,6 +120,18 @@ def _username_exists(candidate: str, *, exclude_user_id: int | None = None, excl
     return external_qs.exists()
 
 
+def _ensure_not_service_username(username: str) -> None:
+    """
+    Controllo sincrono (prima del commit) del conflitto con l'account di servizio: con il debounce
+    il rebuild gira dopo il commit e un errore di `_build_users_payload` non annullerebbe piu la modifica.
+    """
+    svc_username = _service_account_username()
+    if svc_username and _service_account_password() and username == svc_username:
+        raise DavProvisioningError(
+            f"Conflitto account DAV: username '{svc_username}' riservato all'account di servizio."
+        )
+
+
 def _next_available_username(
     base_username: str,
     *,
@@ -151,6 +173,49 @@ def _hash_or_keep(raw_value: str) -> str:
     return _hash_password(raw_value)
 
 
+# Fingerprint HMAC del segreto -> hash bcrypt derivato: la password in chiaro non fa da chiave.
+_service_hash_cache: dict[str, str] = {}
+
+
+def _secret_fingerprint(raw_value: str) -> str:
+    return hmac.new(settings.SECRET_KEY.encode("utf-8"), raw_value.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _users_file_entry(username: str) -> str:
+    try:
+        content = _users_file_path().read_text(encoding="utf-8")
+    except (DavProvisioningError, OSError):
+        return ""
+    prefix = f"{username}:"
+    for line in content.splitlines():
+        if line.startswith(prefix):
+            return line[len(prefix):].strip()
+    return ""
+
+
+def _service_account_hash(raw_password: str) -> str:
+    """
+    Hash bcrypt della password di servizio, calcolato una volta per segreto: un hash nuovo
+    (sale diverso) a ogni sync costa ~250ms e cambierebbe il file utenti a ogni rebuild.
+    Se il file contiene gia un hash valido per lo stesso segreto (riavvio, altro worker) si riusa.
+    """
+    if _is_supported_hash(raw_password) or raw_password.startswith(_LEGACY_HASH_PREFIXES + _UNSUPPORTED_HASH_PREFIXES):
+        return _hash_or_keep(raw_password)
+
+    fingerprint = _secret_fingerprint(raw_password)
+    cached = _service_hash_cache.get(fingerprint)
+    if cached:
+        return cached
+
+    existing = _users_file_entry(_service_account_username())
+    if existing and _is_supported_hash(existing) and _HASH_CONTEXT.verify(raw_password, existing):
+        derived = existing
+    else:
+        derived = _hash_password(raw_password)
+    _service_hash_cache[fingerprint] = derived
+    return derived
+
+
 def _users_file_path() -> Path:
     configured = (getattr(settings, "RADICALE_USERS_FILE", "") or "").strip()
     if not configured:
@@ -276,7 +341,7 @@ def _build_users_payload() -> dict[str, str]:
     svc_username = _service_account_username()
     svc_password = _service_account_password()
     if svc_username and svc_password:
-        svc_hash = _hash_or_keep(svc_password)
+        svc_hash = _service_account_hash(svc_password)
         if svc_username in entries and entries[svc_username] != svc_hash:
             raise DavProvisioningError(
                 f"Conflitto account DAV: username '{svc_username}' gia assegnato a un account applicativo/esterno."
@@ -299,15 +364,51 @@ def _rights_permissions_for_grant(access_level: str) -> str:
     return "RWrw" if access_level == DavCalendarGrant.ACCESS_READWRITE else "Rr"
 
 
-def _build_rights_payload() -> str:
-    """Build rights file with strict account isolation.
-    
-    Each user can only see/discover their own collections.
-    External accounts can only see collections explicitly shared via DavCalendarGrant.
+# Regole "proprio principal" uniche per tutti gli account: Radicale 3 sostituisce `{user}`
+# con il login (escapato) dell'utente, quindi il numero di sezioni non cresce con gli account.
+_OWN_PRINCIPAL_RIGHTS = (
+    ("allow-own-root", r"^{user}/?$", "R"),
+    ("allow-own-principal", r"^{user}/[^/]+/?$", "RW"),
+    ("allow-own-calendars", r"^{user}/[^/]+/[^/]+(?:/.*)?$", "RWrw"),
+)
+
+
+def _group_grant_rows(grant_rows) -> tuple[dict[str, set[str]], dict[tuple[str, str], set[str]]]:
     """
-    lines: list[str] = []
+    Da righe (username, principal, slug, access_level) a due mappe raggruppate:
+    principal condiviso -> utenti (discovery) e (calendario, permessi) -> utenti.
+    Lo stesso calendario concesso in ro e rw allo stesso utente vale rw.
+    """
+    access_by_user_path: dict[tuple[str, str], str] = {}
+    principal_users: dict[str, set[str]] = {}
+    for username, principal, slug, access_level in grant_rows:
+        username_value = (username or "").strip()
+        if not username_value:
+            continue
+        principal_value = _normalize_dav_principal(principal)
+        path = f"{principal_value}/{_normalize_dav_collection_slug(slug)}"
+        key = (username_value, path)
+        if access_level == DavCalendarGrant.ACCESS_READWRITE or access_by_user_path.get(key) == DavCalendarGrant.ACCESS_READWRITE:
+            access_by_user_path[key] = DavCalendarGrant.ACCESS_READWRITE
+        else:
+            access_by_user_path[key] = DavCalendarGrant.ACCESS_READONLY
+        principal_users.setdefault(principal_value, set()).add(username_value)
 
-    svc_username = _service_account_username()
+    calendar_users: dict[tuple[str, str], set[str]] = {}
+    for (username, path), access_level in access_by_user_path.items():
+        permissions = _rights_permissions_for_grant(access_level)
+        calendar_users.setdefault((path, permissions), set()).add(username)
+    return principal_users, calendar_users
+
+
+def _render_rights_payload(svc_username: str, grant_rows) -> str:
+    """
+    Rights compatti: account di servizio, tre regole "proprio principal" valide per tutti
+    gli utenti autenticati (solo account attivi sono nel file utenti) e una regola per
+    principal/calendario condiviso con l'alternanza degli utenti autorizzati.
+    Tutto il resto e negato (nessuna regola corrispondente).
+    """
+    lines: list[str] = []
     if svc_username:
         lines.extend(
             [
@@ -319,63 +420,35 @@ def _build_rights_payload() -> str:
             ]
         )
 
-    # Get all app users and their principal names
-    app_accounts = list(
-        DavAccount.objects.filter(is_active=True).order_by("dav_username").values_list("dav_username", flat=True)
-    )
-    
-    # Each app user can only access their OWN principal and calendars
-    for idx, username in enumerate(app_accounts, start=1):
-        # Can only see own principal in root (not others)
+    for section, collection, permissions in _OWN_PRINCIPAL_RIGHTS:
+        lines.extend([f"[{section}]", "user: .+", f"collection: {collection}", f"permissions: {permissions}", ""])
+
+    principal_users, calendar_users = _group_grant_rows(grant_rows)
+    for idx, principal in enumerate(sorted(principal_users), start=1):
         lines.extend(
             [
-                f"[allow-app-root-{idx}]",
-                f"user: ^{re.escape(username)}$",
-                f"collection: ^{re.escape(username)}/?$",
+                f"[allow-shared-principal-{idx}]",
+                f"user: {_join_username_regex(list(principal_users[principal]))}",
+                f"collection: ^{re.escape(principal)}/?$",
                 "permissions: R",
                 "",
-                f"[allow-app-principal-{idx}]",
-                f"user: ^{re.escape(username)}$",
-                f"collection: ^{re.escape(username)}/[^/]+/?$",
-                "permissions: RW",
-                "",
-                f"[allow-app-calendars-{idx}]",
-                f"user: ^{re.escape(username)}$",
-                f"collection: ^{re.escape(username)}/[^/]+/[^/]+(?:/.*)?$",
-                "permissions: RWrw",
-                "",
             ]
         )
-
-    # External accounts - can only access their own collections AND explicitly shared ones
-    external_accounts = list(
-        DavExternalAccount.objects.filter(is_active=True).order_by("dav_username").values_list("dav_username", flat=True)
-    )
-    
-    for idx, username in enumerate(external_accounts, start=1):
-        # Can only see own principal in root
+    for idx, (path, permissions) in enumerate(sorted(calendar_users), start=1):
         lines.extend(
             [
-                f"[allow-ext-root-{idx}]",
-                f"user: ^{re.escape(username)}$",
-                f"collection: ^{re.escape(username)}/?$",
-                "permissions: R",
-                "",
-                f"[allow-ext-principal-{idx}]",
-                f"user: ^{re.escape(username)}$",
-                f"collection: ^{re.escape(username)}/[^/]+/?$",
-                "permissions: RW",
-                "",
-                f"[allow-ext-calendars-{idx}]",
-                f"user: ^{re.escape(username)}$",
-                f"collection: ^{re.escape(username)}/[^/]+/[^/]+(?:/.*)?$",
-                "permissions: RWrw",
+                f"[allow-shared-calendar-{idx}]",
+                f"user: {_join_username_regex(list(calendar_users[(path, permissions)]))}",
+                f"collection: ^{re.escape(path)}(?:/.*)?$",
+                f"permissions: {permissions}",
                 "",
             ]
         )
+    return "\n".join(lines).strip() + "\n"
 
-    # Grants for external accounts - can only access explicitly shared collections
-    grants_rows = DavCalendarGrant.objects.filter(
+
+def _build_rights_payload() -> str:
+    grant_rows = DavCalendarGrant.objects.filter(
         is_active=True,
         external_account__is_active=True,
         calendar__is_active=True,
@@ -385,50 +458,7 @@ def _build_rights_payload() -> str:
         "calendar__calendar_slug",
         "access_level",
     )
-
-    grants_map: dict[tuple[str, str], str] = {}
-    principals_per_user: dict[str, set[str]] = {}
-    for username, principal, slug, access_level in grants_rows:
-        username_value = (username or "").strip()
-        principal_value = _normalize_dav_principal(principal)
-        slug_value = _normalize_dav_collection_slug(slug)
-        if not username_value:
-            continue
-        path = f"{principal_value}/{slug_value}"
-        current_access = grants_map.get((username_value, path), DavCalendarGrant.ACCESS_READONLY)
-        if access_level == DavCalendarGrant.ACCESS_READWRITE or current_access == DavCalendarGrant.ACCESS_READWRITE:
-            grants_map[(username_value, path)] = DavCalendarGrant.ACCESS_READWRITE
-        else:
-            grants_map[(username_value, path)] = DavCalendarGrant.ACCESS_READONLY
-        principals_per_user.setdefault(username_value, set()).add(principal_value)
-
-    # Add permissions for external accounts to access shared principals (for discovery)
-    for idx, (username, principals) in enumerate(sorted(principals_per_user.items()), start=1):
-        for principal in sorted(principals):
-            lines.extend(
-                [
-                    f"[allow-ext-shared-principal-{idx}-{re.sub(r'[^a-z0-9]+', '-', principal)}]",
-                    f"user: ^{re.escape(username)}$",
-                    f"collection: ^{re.escape(principal)}/?$",
-                    "permissions: R",
-                    "",
-                ]
-            )
-
-    # Add permissions for external accounts to access shared calendars
-    for idx, ((username, path), access_level) in enumerate(sorted(grants_map.items()), start=1):
-        lines.extend(
-            [
-                f"[allow-ext-shared-calendar-{idx}]",
-                f"user: ^{re.escape(username)}$",
-                f"collection: ^{re.escape(path)}(?:/.*)?$",
-                f"permissions: {_rights_permissions_for_grant(access_level)}",
-                "",
-            ]
-        )
-
-    # Deny all other access by default (implicit deny)
-    return "\n".join(lines).strip() + "\n"
+    return _render_rights_payload(_service_account_username(), grant_rows)
 
 
 def _copy_owner_and_mode(tmp_path: Path, *, existing_path: Path, fallback_owner_path: Path | None = None) -> None:
@@ -466,12 +496,59 @@ def _copy_owner_and_mode(tmp_path: Path, *, existing_path: Path, fallback_owner_
             pass
 
 
-def sync_radicale_users_file() -> None:
+def _payload_digest(payload: bytes) -> str:
+    return hashlib.sha256(payload).hexdigest()
+
+
+# path -> (digest, mtime_ns, size) dell'ultimo contenuto scritto o letto da questo processo.
+_written_digests: dict[str, tuple[str, int, int]] = {}
+
+
+def _current_file_digest(path: Path) -> str | None:
+    try:
+        file_stat = path.stat()
+    except FileNotFoundError:
+        return None
+    cached = _written_digests.get(str(path))
+    if cached and cached[1:] == (file_stat.st_mtime_ns, file_stat.st_size):
+        return cached[0]
+    digest = _payload_digest(path.read_bytes())
+    _written_digests[str(path)] = (digest, file_stat.st_mtime_ns, file_stat.st_size)
+    return digest
+
+
+def _replace_file_if_changed(path: Path, payload: bytes, *, fallback_owner_path: Path | None = None) -> bool:
+    """
+    Scrittura atomica (tmp + rename) solo se il contenuto cambia: un rename a vuoto fa
+    ricaricare a Radicale utenti e permessi senza motivo.
+    """
+    digest = _payload_digest(payload)
+    if _current_file_digest(path) == digest:
+        return False
+
+    existed = path.exists()
+    tmp_path = Path(f"{path}.tmp")
+    tmp_path.write_bytes(payload)
+    _copy_owner_and_mode(tmp_path, existing_path=path, fallback_owner_path=fallback_owner_path)
+    os.replace(tmp_path, path)
+    if not existed:
+        try:
+            os.chmod(path, 0o600)
+        except PermissionError:
+            pass
+    file_stat = path.stat()
+    _written_digests[str(path)] = (digest, file_stat.st_mtime_ns, file_stat.st_size)
+    return True
+
+
+def sync_radicale_users_file() -> bool:
+    """Rigenera subito users e rights; restituisce True se almeno un file e stato riscritto."""
     users_path = _users_file_path()
     rights_path = _rights_file_path(users_path)
     lock_path = _users_lock_path(users_path)
     users_payload = _build_users_payload()
-    rights_payload = _build_rights_payload()
+    users_bytes = "".join(f"{username}:{users_payload[username]}\n" for username in sorted(users_payload)).encode("utf-8")
+    rights_bytes = _build_rights_payload().encode("utf-8")
 
     users_path.parent.mkdir(parents=True, exist_ok=True)
     rights_path.parent.mkdir(parents=True, exist_ok=True)
@@ -479,31 +556,118 @@ def sync_radicale_users_file() -> None:
 
     with lock_path.open("a+", encoding="utf-8") as lock_handle:
         fcntl.flock(lock_handle.fileno(), fcntl.LOCK_EX)
+        users_changed = _replace_file_if_changed(users_path, users_bytes)
+        rights_changed = _replace_file_if_changed(rights_path, rights_bytes, fallback_owner_path=users_path)
+    return users_changed or rights_changed
 
-        users_existed = users_path.exists()
-        users_tmp = Path(f"{users_path}.tmp")
-        with users_tmp.open("w", encoding="utf-8") as users_handle:
-            for username in sorted(users_payload):
-                users_handle.write(f"{username}:{users_payload[username]}\n")
-        _copy_owner_and_mode(users_tmp, existing_path=users_path)
-        os.replace(users_tmp, users_path)
-        if not users_existed:
-            try:
-                os.chmod(users_path, 0o600)
-            except PermissionError:
-                pass
-
-        rights_existed = rights_path.exists()
-        rights_tmp = Path(f"{rights_path}.tmp")
-        with rights_tmp.open("w", encoding="utf-8") as rights_handle:
-            rights_handle.write(rights_payload)
-        _copy_owner_and_mode(rights_tmp, existing_path=rights_path, fallback_owner_path=users_path)
-        os.replace(rights_tmp, rights_path)
-        if not rights_existed:
+
+class _RadicaleSyncDebouncer:
+    """
+    Debounce "trailing edge": le richieste ravvicinate avviano un solo rebuild dopo
+    `delay` secondi senza nuove richieste (al massimo dopo RADICALE_SYNC_MAX_DELAY_SECONDS).
+    Il rebuild gira su un thread a parte e legge dal DB lo stato gia committato.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        self._first_request = 0.0
+        self._last_request = 0.0
+        self._delay = 0.0
+
+    def request(self, delay: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._last_request = now
+            self._delay = delay
+            if self._timer is None:
+                self._first_request = now
+                self._schedule(delay)
+
+    def _schedule(self, delay: float) -> None:
+        self._timer = threading.Timer(delay, self._fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _fire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            quiet_for = now - self._last_request
+            waited = now - self._first_request
+            if quiet_for < self._delay and waited < RADICALE_SYNC_MAX_DELAY_SECONDS:
+                self._schedule(min(self._delay - quiet_for, RADICALE_SYNC_MAX_DELAY_SECONDS - waited))
+                return
+            self._timer = None
+        self._run()
+
+    def flush(self) -> None:
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+            self._run()
+
+    def _run(self) -> None:
+        try:
+            sync_radicale_users_file()
+        except Exception:
+            logger.exception("Sync Radicale rinviato fallito.")
+        finally:
+            connections.close_all()
+
+
+_radicale_debouncer = _RadicaleSyncDebouncer()
+_radicale_batch_state = threading.local()
+atexit.register(_radicale_debouncer.flush)
+
+
+def _radicale_sync_debounce_seconds() -> float:
+    return max(float(getattr(settings, "RADICALE_SYNC_DEBOUNCE_SECONDS", 0) or 0), 0.0)
+
+
+def request_radicale_sync() -> None:
+    """
+    Punto d'ingresso per le modifiche DAV: dentro `radicale_sync_batch()` segna solo il bisogno
+    di un rebuild; altrimenti rigenera subito (default) o accorpa con il debounce configurato.
+    """
+    if getattr(_radicale_batch_state, "depth", 0):
+        _radicale_batch_state.dirty = True
+        return
+    delay = _radicale_sync_debounce_seconds()
+    if delay > 0:
+        # Dopo il commit: il rebuild sul thread del debouncer deve vedere la modifica.
+        transaction.on_commit(lambda: _radicale_debouncer.request(delay))
+        return
+    sync_radicale_users_file()
+
+
+def _leave_radicale_batch() -> bool:
+    _radicale_batch_state.depth -= 1
+    if not _radicale_batch_state.depth and getattr(_radicale_batch_state, "dirty", False):
+        _radicale_batch_state.dirty = False
+        return True
+    return False
+
+
+@contextmanager
+def radicale_sync_batch():
+    """
+    Accorpa le sync del thread corrente (es. onboarding massivo) in un solo rebuild finale.
+    Gli errori del rebuild finale escono dal `with`: il chiamante li gestisce come quelli del blocco.
+    """
+    _radicale_batch_state.depth = getattr(_radicale_batch_state, "depth", 0) + 1
+    try:
+        yield
+    except BaseException:
+        # Le modifiche gia committate nel blocco vanno comunque pubblicate, senza coprire l'errore originale.
+        if _leave_radicale_batch():
             try:
-                os.chmod(rights_path, 0o600)
-            except PermissionError:
-                pass
+                request_radicale_sync()
+            except Exception:
+                logger.exception("Sync Radicale di fine batch fallito.")
+        raise
+    if _leave_radicale_batch():
+        request_radicale_sync()
 
 
 def ensure_user_dav_access(
@@ -539,8 +703,9 @@ def ensure_user_dav_access(
             account.password_hash = _hash_password(issued_password)
             account.password_rotated_at = timezone.now()
         account.is_active = True
+        _ensure_not_service_username(account.dav_username)
         account.save()
-        sync_radicale_users_file()
+        request_radicale_sync()
         _calendar_dir, _props_path, moved_legacy = ensure_user_default_collection(principal=account.dav_username)
         if moved_legacy:
             logger.info(
@@ -572,7 +737,7 @@ def create_external_dav_account(*, owner, label: str = "", username_hint: str =
             password_rotated_at=timezone.now(),
         )
         account.save()
-        sync_radicale_users_file()
+        request_radicale_sync()
     return account, issued_password
 
 
@@ -591,8 +756,9 @@ def rotate_external_dav_password(*, owner, external_account: DavExternalAccount,
         locked.password_hash = _hash_password(issued_password)
         locked.password_rotated_at = timezone.now()
         locked.is_active = True
+        _ensure_not_service_username(locked.dav_username)
         locked.save(update_fields=["password_hash", "password_rotated_at", "is_active", "updated_at"])
-        sync_radicale_users_file()
+        request_radicale_sync()
     return issued_password
 
 
@@ -602,9 +768,11 @@ def set_external_dav_account_active(*, owner, external_account: DavExternalAccou
     if external_account.owner_id != owner.id:
         raise DavProvisioningError("Account DAV esterno non appartenente all'owner.")
 
+    if is_active:
+        _ensure_not_service_username(external_account.dav_username)
     external_account.is_active = bool(is_active)
     external_account.save(update_fields=["is_active", "updated_at"])
-    sync_radicale_users_file()
+    request_radicale_sync()
 
 
 def create_managed_calendar(*, owner, principal: str, calendar_slug: str, display_name: str = "") -> DavManagedCalendar:
@@ -632,7 +800,7 @@ def create_managed_calendar(*, owner, principal: str, calendar_slug: str, displa
             "is_active": True,
         },
     )
-    sync_radicale_users_file()
+    request_radicale_sync()
     return calendar
 
 
@@ -641,7 +809,7 @@ def set_managed_calendar_active(*, owner, calendar: DavManagedCalendar, is_activ
         raise DavProvisioningError("Calendario DAV non appartenente all'owner.")
     calendar.is_active = bool(is_active)
     calendar.save(update_fields=["is_active", "updated_at"])
-    sync_radicale_users_file()
+    request_radicale_sync()
 
 
 def grant_external_access_to_calendar(
@@ -667,7 +835,7 @@ def grant_external_access_to_calendar(
             "is_active": True,
         },
     )
-    sync_radicale_users_file()
+    request_radicale_sync()
     return grant
 
 
@@ -676,4 +844,4 @@ def set_calendar_grant_active(*, owner, grant: DavCalendarGrant, is_active: bool
         raise DavProvisioningError("Grant DAV non appartenente all'owner.")
     grant.is_active = bool(is_active)
     grant.save(update_fields=["is_active", "updated_at"])
-    sync_radicale_users_file()
+    request_radicale_sync()
@@ -1,6 +1,5 @@
 # core/helpers.py
-from datetime import date, timedelta
-from decimal import Decimal
+from datetime import date, time, timedelta
 import hashlib
 import json
 import logging
@@ -8,23 +7,27 @@ import mimetypes
 import posixpath
 import re
 import secrets
+import threading
 from types import SimpleNamespace
 from urllib.parse import quote, urljoin
 
 from django.conf import settings
 from django.contrib import messages as django_messages
-from django.db.models import Count, Sum
+from django.db import transaction
+from django.db.models import Count, Q, TimeField, Value
 from django.db.models.functions import Coalesce
-from django.http import FileResponse, Http404, JsonResponse
+from django.http import FileResponse, Http404, HttpResponseNotModified, JsonResponse
 from django.shortcuts import redirect
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_time
+from django.utils.http import parse_etags, quote_etag
 
-from agenda.models import AgendaItem, WorkLog
+from agenda.models import AgendaItem
 from contacts.models import Contact
-from planner.models import PlannerItem
 from projects.models import Project, SubProject, ProjectNote
 from todos.models import TodoList, TodoCategory, TodoRecurrence, TodoItem
-from finance_hub.models import SubscriptionOccurrence, Account
+from finance_hub.models import Account
 from todos.models import TodoItem
 from transactions.models import Transaction
 
@@ -41,6 +44,7 @@ from .dav import (
     set_managed_calendar_active,
 )
 from .models import (
+    CalendarDayCount,
     DavAccount,
     DavCalendarGrant,
     DavExternalAccount,
@@ -49,6 +53,27 @@ from .models import (
     MobileApiSession,
     UserNavConfig,
 )
+from .calendar_rollup import calendar_day_counts, weekday_occurrences
+from .mobile_sessions import revoke_excess_sessions
+from .pagination import (
+    PaginationError,
+    decode_keyset_cursor,
+    encode_keyset_cursor,
+    keyset_after,
+    parse_page_limit,
+    stream_json_response,
+)
+from .resource_versions import RESOURCE_AGENDA, RESOURCE_PROJECTS, RESOURCE_TODOS, resource_version
+from .snapshots import dashboard_snapshot_context
+from .sync import (
+    RESOURCE_SUBPROJECTS,
+    SyncCursorError,
+    decode_sync_cursor,
+    deleted_ids_since,
+    deleted_parent_ids_since,
+    next_sync_cursor,
+)
+from .todo_stats import todo_week_stats
 from todos.services import (
     TodoListCrudError,
     create_todo_item,
@@ -61,6 +86,9 @@ from todos.services import (
 
 logger = logging.getLogger(__name__)
 
+# Incrementare quando cambia la forma dei payload API, per invalidare gli ETag gia emessi.
+API_PAYLOAD_FORMAT = 1
+
 _DAV_TEAM_SLUG_SANITIZER = re.compile(r"[^a-z0-9._-]+")
 
 DEFAULT_DASHBOARD_WIDGETS = [
@@ -250,78 +278,7 @@ def _normalize_dashboard_preferences(raw_config):
 
 
 def _dashboard_snapshot_context(user):
-    today = date.today()
-    week_end = today + timedelta(days=7)
-    month_start = today.replace(day=1)
-    month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-
-    open_tasks_qs = TodoItem.objects.filter(owner=user).exclude(status=TodoItem.Status.DONE)
-    planned_planner_qs = PlannerItem.objects.filter(owner=user, status=PlannerItem.Status.PLANNED)
-    due_subs_qs = SubscriptionOccurrence.objects.filter(
-        owner=user,
-        due_date__range=(today, week_end),
-        state=SubscriptionOccurrence.State.PLANNED,
-    )
-
-    month_tx_qs = Transaction.objects.filter(owner=user, date__range=(month_start, month_end))
-    month_income = month_tx_qs.filter(tx_type=Transaction.Type.INCOME).aggregate(
-        total=Coalesce(Sum("amount"), Decimal("0.00"))
-    )["total"]
-    month_expense = month_tx_qs.filter(tx_type=Transaction.Type.EXPENSE).aggregate(
-        total=Coalesce(Sum("amount"), Decimal("0.00"))
-    )["total"]
-
-    focus_rows = []
-
-    for task in open_tasks_qs.filter(due_date__isnull=False).order_by("due_date", "title")[:4]:
-        focus_rows.append(
-            {
-                "kind": "Task",
-                "title": task.title,
-                "due_date": task.due_date,
-                "url": "/todo/",
-            }
-        )
-
-    for item in planned_planner_qs.filter(due_date__isnull=False).order_by("due_date", "title")[:4]:
-        focus_rows.append(
-            {
-                "kind": "Planner",
-                "title": item.title,
-                "due_date": item.due_date,
-                "url": "/planner/",
-            }
-        )
-
-    for occ in due_subs_qs.select_related("subscription").order_by("due_date", "subscription__name")[:4]:
-        focus_rows.append(
-            {
-                "kind": "Abbonamento",
-                "title": occ.subscription.name,
-                "due_date": occ.due_date,
-                "url": "/subs/",
-            }
-        )
-
-    focus_rows.sort(key=lambda row: (row["due_date"] is None, row["due_date"] or today, row["kind"], row["title"]))
-    focus_rows = focus_rows[:8]
-
-    return {
-        "snapshot": {
-            "open_tasks": open_tasks_qs.count(),
-            "tasks_today": open_tasks_qs.filter(due_date=today).count(),
-            "overdue_tasks": open_tasks_qs.filter(due_date__lt=today).count(),
-            "planner_planned": planned_planner_qs.count(),
-            "planner_today": planned_planner_qs.filter(due_date=today).count(),
-            "due_subscriptions_week": due_subs_qs.count(),
-            "month_income": month_income,
-            "month_expense": month_expense,
-            "month_balance": month_income - month_expense,
-            "month_transactions": month_tx_qs.count(),
-        },
-        "focus_rows": focus_rows,
-        "generated_on": today,
-    }
+    return dashboard_snapshot_context(user)
 
 
 def _calendar_events_for_range(user, start: date, end: date):
@@ -334,87 +291,19 @@ def _calendar_events_for_range(user, start: date, end: date):
             payload["count"] = count
         events.setdefault(key, []).append(payload)
 
-    tasks = (
-        TodoItem.objects.filter(owner=user, due_date__range=(start, end))
-        .exclude(status=TodoItem.Status.DONE)
-        .values("due_date")
-        .annotate(count=Count("id"))
-    )
-    for row in tasks:
-        add_event(row["due_date"], "task", "Task", row["count"])
-
-    agenda_activities = (
-        AgendaItem.objects.filter(
-            owner=user,
-            due_date__range=(start, end),
-            item_type=AgendaItem.ItemType.ACTIVITY,
-            status=AgendaItem.Status.PLANNED,
-        )
-        .values("due_date")
-        .annotate(count=Count("id"))
-    )
-    for row in agenda_activities:
-        add_event(row["due_date"], "agenda_activity", "Agenda attivita", row["count"])
-
-    agenda_reminders = (
-        AgendaItem.objects.filter(
-            owner=user,
-            due_date__range=(start, end),
-            item_type=AgendaItem.ItemType.REMINDER,
-            status=AgendaItem.Status.PLANNED,
-        )
-        .values("due_date")
-        .annotate(count=Count("id"))
-    )
-    for row in agenda_reminders:
-        add_event(row["due_date"], "agenda_reminder", "Agenda reminder", row["count"])
-
-    planner = (
-        PlannerItem.objects.filter(owner=user, due_date__range=(start, end), status=PlannerItem.Status.PLANNED)
-        .values("due_date")
-        .annotate(count=Count("id"))
-    )
-    for row in planner:
-        add_event(row["due_date"], "planner", "Planner", row["count"])
-
-    subs = (
-        SubscriptionOccurrence.objects.filter(owner=user, due_date__range=(start, end))
-        .values("due_date")
-        .annotate(count=Count("id"))
-    )
-    for row in subs:
-        add_event(row["due_date"], "subscription", "Abbonamenti", row["count"])
-
-    tx = (
-        Transaction.objects.filter(owner=user, date__range=(start, end))
-        .values("date")
-        .annotate(count=Count("id"))
-    )
-    for row in tx:
-        add_event(row["date"], "transaction", "Transazioni", row["count"])
-
-    work_logs = (
-        WorkLog.objects.filter(owner=user, work_date__range=(start, end))
-        .values("work_date")
-        .annotate(total_hours=Sum("hours"))
-    )
-    for row in work_logs:
-        if row["total_hours"]:
-            add_event(row["work_date"], "worklog", "Ore lavoro", 1)
+    for day, kind, label, count in calendar_day_counts(user, start, end):
+        add_event(day, kind, label, 1 if kind == CalendarDayCount.Kind.WORKLOG else count)
 
     todo_counts = (
         TodoItem.objects.filter(owner=user, is_active=True)
         .values("weekday")
         .annotate(count=Count("id"))
     )
-    todo_map = {row["weekday"]: row["count"] for row in todo_counts}
-    if todo_map:
-        cursor = start
-        while cursor <= end:
-            count = todo_map.get(cursor.weekday())
-            if count:
-                add_event(cursor, "todo", "TodoList", count)
-            cursor += timedelta(days=1)
+    for row in todo_counts:
+        if not row["count"]:
+            continue
+        for day in weekday_occurrences(start, end, row["weekday"]):
+            add_event(day, "todo", "TodoList", row["count"])
 
     return events
 
@@ -469,6 +358,7 @@ def _mobile_create_session(user, request, device_label: str = ""):
         user_agent=(request.headers.get("User-Agent") or "")[:255],
         ip_address=_mobile_client_ip(request) or None,
     )
+    revoke_excess_sessions(user.id, now=now)
     return session, access_token, refresh_token
 
 
@@ -494,26 +384,97 @@ def _mobile_bearer_token(request) -> str:
     return header[7:].strip()
 
 
+def _mobile_session_touch_seconds() -> int:
+    return max(int(getattr(settings, "MOBILE_API_SESSION_TOUCH_SECONDS", 60) or 0), 0)
+
+
+def _mobile_token_cache_seconds() -> int:
+    return max(int(getattr(settings, "MOBILE_API_TOKEN_CACHE_SECONDS", 30) or 0), 0)
+
+
+# Cache in-process dei token verificati: hash -> (sessione, valida fino a).
+# Logout, refresh e limite di sessioni la puliscono nel processo corrente; negli altri worker una
+# sessione revocata resta accettata al massimo per MOBILE_API_TOKEN_CACHE_SECONDS.
+_MOBILE_TOKEN_CACHE = {}
+_MOBILE_TOKEN_CACHE_LOCK = threading.Lock()
+_MOBILE_TOKEN_CACHE_MAX_ENTRIES = 1024
+
+
+def _mobile_cached_session(token_hash: str, now):
+    with _MOBILE_TOKEN_CACHE_LOCK:
+        entry = _MOBILE_TOKEN_CACHE.get(token_hash)
+        if entry is None:
+            return None
+        session, valid_until = entry
+        if valid_until <= now:
+            _MOBILE_TOKEN_CACHE.pop(token_hash, None)
+            return None
+        return session
+
+
+def _mobile_cache_session(token_hash: str, session: MobileApiSession, now) -> None:
+    ttl = _mobile_token_cache_seconds()
+    if not ttl:
+        return
+    valid_until = min(now + timedelta(seconds=ttl), session.access_expires_at)
+    with _MOBILE_TOKEN_CACHE_LOCK:
+        if len(_MOBILE_TOKEN_CACHE) >= _MOBILE_TOKEN_CACHE_MAX_ENTRIES:
+            expired = [key for key, (_session, until) in _MOBILE_TOKEN_CACHE.items() if until <= now]
+            for key in expired:
+                del _MOBILE_TOKEN_CACHE[key]
+            if len(_MOBILE_TOKEN_CACHE) >= _MOBILE_TOKEN_CACHE_MAX_ENTRIES:
+                _MOBILE_TOKEN_CACHE.clear()
+        _MOBILE_TOKEN_CACHE[token_hash] = (session, valid_until)
+
+
+def _mobile_forget_session(session: MobileApiSession) -> None:
+    _mobile_forget_session_ids([session.pk])
+
+
+def _mobile_forget_session_ids(session_ids) -> None:
+    session_ids = set(session_ids)
+    if not session_ids:
+        return
+    with _MOBILE_TOKEN_CACHE_LOCK:
+        for key in [key for key, (cached, _until) in _MOBILE_TOKEN_CACHE.items() if cached.pk in session_ids]:
+            del _MOBILE_TOKEN_CACHE[key]
+
+
+def _mobile_touch_session(session: MobileApiSession, now) -> None:
+    """Aggiorna last_used_at al massimo una volta ogni MOBILE_API_SESSION_TOUCH_SECONDS."""
+    threshold = now - timedelta(seconds=_mobile_session_touch_seconds())
+    if session.last_used_at and session.last_used_at > threshold:
+        return
+    # UPDATE condizionale: tra piu worker scrive solo il primo che trova il valore vecchio.
+    MobileApiSession.objects.filter(pk=session.pk).filter(
+        Q(last_used_at__isnull=True) | Q(last_used_at__lte=threshold)
+    ).update(last_used_at=now)
+    session.last_used_at = now
+
+
 def _mobile_authenticate_request(request):
     token = _mobile_bearer_token(request)
     if not token:
         return None, _mobile_json_error("missing_bearer_token", status=401)
 
     now = timezone.now()
-    session = (
-        MobileApiSession.objects.select_related("user")
-        .filter(
-            access_token_hash=_mobile_hash_token(token),
-            revoked_at__isnull=True,
-            access_expires_at__gt=now,
+    token_hash = _mobile_hash_token(token)
+    session = _mobile_cached_session(token_hash, now)
+    if session is None:
+        session = (
+            MobileApiSession.objects.select_related("user")
+            .filter(
+                access_token_hash=token_hash,
+                revoked_at__isnull=True,
+                access_expires_at__gt=now,
+            )
+            .first()
         )
-        .first()
-    )
-    if not session:
-        return None, _mobile_json_error("invalid_or_expired_access_token", status=401)
+        if not session:
+            return None, _mobile_json_error("invalid_or_expired_access_token", status=401)
+        _mobile_cache_session(token_hash, session, now)
 
-    session.last_used_at = now
-    session.save(update_fields=["last_used_at", "updated_at"])
+    _mobile_touch_session(session, now)
     return session, None
 
 
@@ -544,6 +505,17 @@ def _mobile_todos_stats_from_items(items, check_map):
     return {"planned": planned, "done": done, "skipped": skipped}
 
 
+def _todos_week_stats(user, week_start: date):
+    """Stats settimana dai contatori incrementali: costo costante, indipendente dal numero di voci."""
+    counts = todo_week_stats(user.id, week_start)
+    total = _todos_visible_items(user).count()
+    return {
+        "planned": max(total - counts["done"] - counts["skipped"], 0),
+        "done": counts["done"],
+        "skipped": counts["skipped"],
+    }
+
+
 def _api_authenticate_request(request):
     token = _mobile_bearer_token(request)
     if token:
@@ -553,6 +525,25 @@ def _api_authenticate_request(request):
     return None, _mobile_json_error("authentication_required", status=401)
 
 
+def _api_conditional_response(request, user, resource: str, variant: str, build_response):
+    """
+    Conditional GET per le API JSON: l'ETag deriva dalla versione (utente, risorsa) e dai
+    parametri risolti della richiesta, e viene verificato prima di costruire il payload.
+    """
+    raw = f"{API_PAYLOAD_FORMAT}:{user.id}:{resource}:{resource_version(user, resource)}:{variant}"
+    etag = quote_etag(hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32])
+    client_etags = {tag.removeprefix("W/") for tag in parse_etags(request.headers.get("If-None-Match") or "")}
+    if etag in client_etags or "*" in client_etags:
+        response = HttpResponseNotModified()
+    else:
+        response = build_response()
+        if response.status_code != 200:
+            return response
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 def _dav_collection_url(base_url: str, principal: str, collection_slug: str = "") -> str:
     base = (base_url or "").strip()
     if not base:
@@ -903,16 +894,43 @@ def _dashboard_preferences_for_user(user):
     return _normalize_dashboard_preferences(config.get("dashboard_preferences"))
 
 
-def _todos_response_for_user(user, week_value: str | None):
+def _todos_response_for_user(user, week_value: str | None, since_value: str | None = None):
+    try:
+        since = decode_sync_cursor(RESOURCE_TODOS, since_value)
+    except SyncCursorError as exc:
+        return _mobile_json_error(str(exc), status=400)
+    next_cursor = next_sync_cursor(RESOURCE_TODOS)
+
     week_start = _mobile_week_start_for(week_value)
     week_end = week_start + timedelta(days=6)
-    items = (
-        TodoItem.objects.filter(owner=user, is_active=True, todo__is_active=True)
-        .select_related("todo", "category", "project")
-        .order_by("weekday", "time_start", "time_end", "title")
+    visible_items = _todos_visible_items(user)
+    items = visible_items.select_related("todo_list", "category", "project").order_by(
+        "weekday", "time_start", "time_end", "title"
     )
-    checks = TodoRecurrence.objects.filter(owner=user, week_start=week_start, item__in=items)
-    check_map = {check.item_id: check for check in checks}
+
+    deleted_ids = []
+    if since is not None:
+        changed_ids = set(
+            TodoItem.objects.filter(owner=user)
+            .filter(
+                Q(updated_at__gte=since)
+                | Q(todo_list__updated_at__gte=since)
+                | Q(category__updated_at__gte=since)
+                | Q(project__updated_at__gte=since)
+                | Q(recurrences__week_start=week_start, recurrences__updated_at__gte=since)
+            )
+            .values_list("id", flat=True)
+        )
+        items = list(items.filter(id__in=changed_ids))
+        # Righe modificate ma non piu visibili (disattivate o lista disattivata) = rimosse lato client.
+        deleted_ids = sorted((changed_ids - {item.id for item in items}) | set(
+            deleted_ids_since(user, RESOURCE_TODOS, since)
+        ))
+    else:
+        items = list(items)
+
+    checks = TodoRecurrence.objects.filter(owner=user, week_start=week_start, todo_item__in=items)
+    check_map = {check.todo_item_id: check for check in checks}
 
     payload_items = []
     for item in items:
@@ -926,8 +944,8 @@ def _todos_response_for_user(user, week_value: str | None):
                 "time_start": item.time_start.strftime("%H:%M") if item.time_start else "",
                 "time_end": item.time_end.strftime("%H:%M") if item.time_end else "",
                 "note": item.note or "",
-                "todo_id": item.todo_id,
-                "container": item.todo.name,
+                "todo_id": item.todo_list_id,
+                "container": item.todo_list.name,
                 "category_id": item.category_id or "",
                 "category": item.category.name if item.category_id else "",
                 "project": item.project.name if item.project_id else "",
@@ -935,213 +953,376 @@ def _todos_response_for_user(user, week_value: str | None):
             }
         )
 
-    stats = _mobile_todos_stats_from_items(items, check_map)
-    return JsonResponse(
-        {
-            "ok": True,
-            "synced_at": timezone.now().isoformat(),
-            "week_start": week_start.isoformat(),
-            "week_end": week_end.isoformat(),
-            "stats": stats,
-            "items": payload_items,
-            "containers": list(
-                TodoList.objects.filter(owner=user, is_active=True)
-                .order_by("name")
-                .values("id", "name")
-            ),
-            "categories": list(
-                TodoCategory.objects.filter(owner=user, is_active=True)
-                .order_by("name")
-                .values("id", "name")
-            ),
-        }
-    )
+    if since is None:
+        stats = _mobile_todos_stats_from_items(items, check_map)
+    else:
+        stats = _todos_week_stats(user, week_start)
 
+    payload = {
+        "ok": True,
+        "synced_at": timezone.now().isoformat(),
+        "delta": since is not None,
+        "next_cursor": next_cursor,
+        "week_start": week_start.isoformat(),
+        "week_end": week_end.isoformat(),
+        "stats": stats,
+        "items": payload_items,
+        "containers": list(
+            TodoList.objects.filter(owner=user, is_active=True)
+            .order_by("name")
+            .values("id", "name")
+        ),
+        "categories": list(
+            TodoCategory.objects.filter(owner=user, is_active=True)
+            .order_by("name")
+            .values("id", "name")
+        ),
+    }
+    if since is not None:
+        payload["deleted_ids"] = deleted_ids
+    return JsonResponse(payload)
 
-def _todos_check_for_user(user, payload):
-    item_id = payload.get("item_id")
-    status = (payload.get("status") or "").strip().upper()
-    week_start = _mobile_week_start_for(payload.get("week"))
 
-    allowed_statuses = {TodoRecurrence.Status.PLANNED, TodoRecurrence.Status.DONE, TodoRecurrence.Status.SKIPPED}
-    if status not in allowed_statuses:
-        return _mobile_json_error("invalid_status", status=400)
+def _todos_error_response(error: TodoListCrudError):
+    status = 404 if error.code.endswith("_not_found") else 400
+    return _mobile_json_error(error.code, status=status)
 
-    item = TodoItem.objects.filter(owner=user, id=item_id).first()
+
+def _todos_visible_items(user):
+    return TodoItem.objects.filter(owner=user, is_active=True, todo_list__is_active=True)
+
+
+def _todos_parse_time(value):
+    if value in (None, ""):
+        return None
+    try:
+        parsed = parse_time(str(value))
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise TodoListCrudError("invalid_time")
+    return parsed
+
+
+def _todos_item_fields(user, payload) -> dict:
+    todo_list = get_todo_for_owner(
+        owner=user,
+        todo_id=payload.get("todo_id"),
+        active_only=True,
+    )
+    category = None
+    if payload.get("category_id") not in (None, ""):
+        category = get_category_for_owner(
+            owner=user,
+            category_id=payload.get("category_id"),
+            active_only=True,
+        )
+    weekday = payload.get("weekday")
+    if weekday is None:
+        weekday = TodoItem.Weekday.MONDAY
+    parse_weekday(weekday)
+    return {
+        "todo_list": todo_list,
+        "category": category,
+        "title": (payload.get("title") or "").strip(),
+        "weekday": int(weekday),
+        "time_start": _todos_parse_time(payload.get("time_start")),
+        "time_end": _todos_parse_time(payload.get("time_end")),
+        "note": payload.get("note") or "",
+    }
+
+
+def _todos_item_for_user(user, payload) -> TodoItem:
+    item = TodoItem.objects.filter(owner=user, id=payload.get("item_id")).first()
     if not item:
-        return _mobile_json_error("item_not_found", status=404)
+        raise TodoListCrudError("item_not_found")
+    return item
 
-    check, _created = TodoRecurrence.objects.get_or_create(
+
+# Le operazioni sollevano TodoListCrudError e restituiscono il payload senza stats:
+# gli endpoint singoli e il batch le condividono e calcolano le stats una sola volta.
+def _todos_apply_check(user, payload) -> dict:
+    status = (payload.get("status") or "").strip().upper()
+    week_start = _mobile_week_start_for(payload.get("week"))
+    if status not in TodoRecurrence.Status.values:
+        raise TodoListCrudError("invalid_status")
+
+    item = _todos_item_for_user(user, payload)
+    TodoRecurrence.objects.update_or_create(
         owner=user,
-        item=item,
+        todo_item=item,
         week_start=week_start,
-        defaults={"status": TodoRecurrence.Status.PLANNED},
+        defaults={"status": status},
     )
-    check.status = status
-    check.save(update_fields=["status", "updated_at"])
+    return {"item_id": item.id, "status": status, "week_start": week_start.isoformat()}
 
-    active_items = list(
-        TodoItem.objects.filter(owner=user, is_active=True, todo__is_active=True).only("id")
-    )
-    active_checks = TodoRecurrence.objects.filter(owner=user, week_start=week_start, item__in=active_items)
-    active_check_map = {row.item_id: row for row in active_checks}
-    stats = _mobile_todos_stats_from_items(active_items, active_check_map)
-    return JsonResponse(
-        {
-            "ok": True,
-            "item_id": item.id,
-            "status": check.status,
-            "stats": stats,
-            "week_start": week_start.isoformat(),
-        }
+
+def _todos_apply_item_create(user, payload) -> dict:
+    item = create_todo_item(owner=user, **_todos_item_fields(user, payload))
+    return {"item_id": item.id}
+
+
+def _todos_apply_item_update(user, payload) -> dict:
+    item = _todos_item_for_user(user, payload)
+    update_todo_item(
+        item=item,
+        project=item.project,
+        is_standalone=item.is_standalone,
+        **_todos_item_fields(user, payload),
     )
+    return {"item_id": item.id}
 
 
-def _todos_item_create_for_user(user, payload):
+def _todos_apply_item_delete(user, payload) -> dict:
+    item = _todos_item_for_user(user, payload)
+    item_id = item.id
+    delete_todo_item(item=item)
+    return {"item_id": item_id}
+
+
+TODOS_BATCH_OPERATIONS = {
+    "check": _todos_apply_check,
+    "create": _todos_apply_item_create,
+    "update": _todos_apply_item_update,
+    "delete": _todos_apply_item_delete,
+}
+
+
+def _todos_batch_max_operations() -> int:
+    raw = int(getattr(settings, "MOBILE_API_BATCH_MAX_OPERATIONS", 200) or 200)
+    return max(raw, 1)
+
+
+def _todos_check_for_user(user, payload):
     try:
-        todo = get_todo_for_owner(
-            owner=user,
-            todo_id=payload.get("todo_id"),
-            active_only=True,
-        )
-        category = get_category_for_owner(
-            owner=user,
-            category_id=payload.get("category_id"),
-            active_only=True,
-        )
-        item = create_todo_item(
-            owner=user,
-            todo=todo,
-            category=category,
-            title=payload.get("title"),
-            weekday=parse_weekday(payload.get("weekday")),
-            time_start=payload.get("time_start"),
-            time_end=payload.get("time_end"),
-            note=payload.get("note"),
-            is_active=True,
-        )
+        with transaction.atomic():
+            result = _todos_apply_check(user, payload)
     except TodoListCrudError as error:
-        code = error.code
-        if code in {"todo_not_found", "category_not_found"}:
-            return _mobile_json_error(code, status=404)
-        return _mobile_json_error(code, status=400)
+        return _todos_error_response(error)
 
-    return JsonResponse({"ok": True, "item_id": item.id})
+    week_start = date.fromisoformat(result["week_start"])
+    stats = _todos_week_stats(user, week_start)
+    return JsonResponse({"ok": True, **result, "stats": stats})
 
 
-def _todos_item_update_for_user(user, payload):
-    item_id = payload.get("item_id")
-    item = TodoItem.objects.filter(owner=user, id=item_id).first()
-    if not item:
-        return _mobile_json_error("item_not_found", status=404)
-
+def _todos_item_create_for_user(user, payload):
     try:
-        todo = get_todo_for_owner(
-            owner=user,
-            todo_id=payload.get("todo_id"),
-            active_only=True,
-        )
-        category = get_category_for_owner(
-            owner=user,
-            category_id=payload.get("category_id"),
-            active_only=True,
-        )
-        update_todo_item(
-            item=item,
-            todo=todo,
-            category=category,
-            title=payload.get("title"),
-            weekday=parse_weekday(payload.get("weekday")),
-            time_start=payload.get("time_start"),
-            time_end=payload.get("time_end"),
-            note=payload.get("note"),
-        )
+        result = _todos_apply_item_create(user, payload)
     except TodoListCrudError as error:
-        code = error.code
-        if code in {"todo_not_found", "category_not_found"}:
-            return _mobile_json_error(code, status=404)
-        return _mobile_json_error(code, status=400)
+        return _todos_error_response(error)
+    return JsonResponse({"ok": True, **result})
 
-    return JsonResponse({"ok": True, "item_id": item.id})
+
+def _todos_item_update_for_user(user, payload):
+    try:
+        result = _todos_apply_item_update(user, payload)
+    except TodoListCrudError as error:
+        return _todos_error_response(error)
+    return JsonResponse({"ok": True, **result})
 
 
 def _todos_item_delete_for_user(user, payload):
-    item_id = payload.get("item_id")
-    item = TodoItem.objects.filter(owner=user, id=item_id).first()
-    if not item:
-        return _mobile_json_error("item_not_found", status=404)
+    try:
+        result = _todos_apply_item_delete(user, payload)
+    except TodoListCrudError as error:
+        return _todos_error_response(error)
+    return JsonResponse({"ok": True, **result})
+
+
+def _todos_batch_for_user(user, payload):
+    """
+    Applica in ordine una lista di operazioni (check/create/update/delete) in una sola transazione.
+    Ogni operazione gira in un savepoint: un errore annulla solo quella e viene riportato nel
+    risultato corrispondente. Le create possono dichiarare un `ref` client, riusabile dalle
+    operazioni successive come `item_ref` al posto di `item_id` (coda offline).
+    """
+    operations = payload.get("operations")
+    if not isinstance(operations, list) or not operations:
+        return _mobile_json_error("missing_operations", status=400)
+    if len(operations) > _todos_batch_max_operations():
+        return _mobile_json_error("too_many_operations", status=400)
+
+    refs = {}
+    results = []
+    with transaction.atomic():
+        for index, operation in enumerate(operations):
+            result = {"index": index}
+            try:
+                if not isinstance(operation, dict):
+                    raise TodoListCrudError("invalid_operation")
+                if operation.get("ref") is not None:
+                    result["ref"] = operation["ref"]
+                handler = TODOS_BATCH_OPERATIONS.get(operation.get("op"))
+                if handler is None:
+                    raise TodoListCrudError("invalid_operation")
+                op_payload = dict(operation)
+                if op_payload.get("item_id") in (None, "") and op_payload.get("item_ref") is not None:
+                    op_payload["item_id"] = refs.get(str(op_payload["item_ref"]))
+                    if op_payload["item_id"] is None:
+                        raise TodoListCrudError("item_not_found")
+                with transaction.atomic():
+                    data = handler(user, op_payload)
+            except TodoListCrudError as error:
+                result.update({"ok": False, "error": error.code})
+            else:
+                result.update({"ok": True, **data})
+                if operation.get("op") == "create" and operation.get("ref") is not None:
+                    refs[str(operation["ref"])] = data["item_id"]
+            results.append(result)
+
+    week_start = _mobile_week_start_for(payload.get("week"))
+    applied = sum(1 for result in results if result["ok"])
+    return JsonResponse(
+        {
+            "ok": True,
+            "applied": applied,
+            "failed": len(results) - applied,
+            "results": results,
+            "stats": _todos_week_stats(user, week_start),
+            "week_start": week_start.isoformat(),
+        }
+    )
 
-    delete_todo_item(item=item)
-    return JsonResponse({"ok": True, "item_id": item_id})
 
+PROJECTS_KEYSET_FIELDS = ("is_archived", "name", "id")
 
-def _projects_response_for_user(user):
-    projects = list(
-        Project.objects.filter(owner=user)
-        .select_related("customer", "category")
-        .order_by("is_archived", "name")
+
+def _projects_with_subproject_counts(projects_qs):
+    # Un solo GROUP BY con Count condizionali al posto di tre aggregazioni separate.
+    active_subprojects = Q(subprojects__is_archived=False)
+    return projects_qs.select_related("customer", "category").annotate(
+        subprojects_total=Count("subprojects", filter=active_subprojects),
+        subprojects_done=Count(
+            "subprojects",
+            filter=active_subprojects & Q(subprojects__status=SubProject.Status.DONE),
+        ),
+        subprojects_blocked=Count(
+            "subprojects",
+            filter=active_subprojects & Q(subprojects__status=SubProject.Status.BLOCKED),
+        ),
     )
 
-    sub_totals = {
-        row["project_id"]: row["total"]
-        for row in (
-            SubProject.objects.filter(owner=user, is_archived=False)
-            .values("project_id")
-            .annotate(total=Count("id"))
-        )
+
+def _project_payload_row(project) -> dict:
+    return {
+        "id": project.id,
+        "name": project.name,
+        "description": project.description or "",
+        "is_archived": bool(project.is_archived),
+        "customer": project.customer.name if project.customer_id else "",
+        "category": project.category.name if project.category_id else "",
+        "subprojects_total": int(project.subprojects_total),
+        "subprojects_done": int(project.subprojects_done),
+        "subprojects_blocked": int(project.subprojects_blocked),
+        "created_at": project.created_at.isoformat() if project.created_at else "",
+        "updated_at": project.updated_at.isoformat() if project.updated_at else "",
     }
-    sub_done = {
-        row["project_id"]: row["total"]
-        for row in (
-            SubProject.objects.filter(owner=user, is_archived=False, status=SubProject.Status.DONE)
-            .values("project_id")
-            .annotate(total=Count("id"))
+
+
+def _projects_stats(user) -> dict:
+    return Project.objects.filter(owner=user).aggregate(
+        total=Count("id"),
+        active=Count("id", filter=Q(is_archived=False)),
+        archived=Count("id", filter=Q(is_archived=True)),
+    )
+
+
+def _projects_response_for_user(
+    user,
+    since_value: str | None = None,
+    limit_value: str | None = None,
+    after_value: str | None = None,
+):
+    try:
+        since = decode_sync_cursor(RESOURCE_PROJECTS, since_value)
+        limit = parse_page_limit(limit_value)
+        after = decode_keyset_cursor(after_value, len(PROJECTS_KEYSET_FIELDS))
+    except (SyncCursorError, PaginationError) as exc:
+        return _mobile_json_error(str(exc), status=400)
+    next_cursor = next_sync_cursor(RESOURCE_PROJECTS)
+
+    projects_qs = Project.objects.filter(owner=user)
+    if since is not None:
+        changed_ids = set(
+            projects_qs.filter(
+                Q(updated_at__gte=since)
+                | Q(customer__updated_at__gte=since)
+                | Q(category__updated_at__gte=since)
+                | Q(subprojects__updated_at__gte=since)
+                | Q(id__in=deleted_parent_ids_since(user, RESOURCE_SUBPROJECTS, since))
+            ).values_list("id", flat=True)
         )
+        projects_qs = projects_qs.filter(id__in=changed_ids)
+    if after is not None:
+        projects_qs = projects_qs.filter(keyset_after(PROJECTS_KEYSET_FIELDS, after))
+
+    projects_qs = _projects_with_subproject_counts(projects_qs).order_by(*PROJECTS_KEYSET_FIELDS)
+    if limit is not None:
+        # Una riga in piu per sapere se esiste la pagina successiva senza COUNT.
+        projects = list(projects_qs[: limit + 1])
+        has_more = len(projects) > limit
+        projects = projects[:limit]
+    else:
+        projects = list(projects_qs)
+        has_more = False
+
+    payload_items = [_project_payload_row(project) for project in projects]
+
+    if since is None and limit is None and after is None:
+        active_count = sum(1 for row in payload_items if not row["is_archived"])
+        stats = {
+            "total": len(payload_items),
+            "active": active_count,
+            "archived": len(payload_items) - active_count,
+        }
+    else:
+        stats = _projects_stats(user)
+
+    payload = {
+        "ok": True,
+        "synced_at": timezone.now().isoformat(),
+        "delta": since is not None,
+        "next_cursor": next_cursor,
+        "stats": stats,
+        "items": payload_items,
     }
-    sub_blocked = {
-        row["project_id"]: row["total"]
-        for row in (
-            SubProject.objects.filter(owner=user, is_archived=False, status=SubProject.Status.BLOCKED)
-            .values("project_id")
-            .annotate(total=Count("id"))
+    if limit is not None:
+        last = projects[-1] if projects else None
+        payload["has_more"] = has_more
+        payload["next_after"] = (
+            encode_keyset_cursor([getattr(last, field) for field in PROJECTS_KEYSET_FIELDS])
+            if has_more and last
+            else None
         )
-    }
+    if since is not None:
+        payload["deleted_ids"] = deleted_ids_since(user, RESOURCE_PROJECTS, since)
+    return JsonResponse(payload)
 
-    payload_items = []
-    for project in projects:
-        payload_items.append(
-            {
-                "id": project.id,
-                "name": project.name,
-                "description": project.description or "",
-                "is_archived": bool(project.is_archived),
-                "customer": project.customer.name if project.customer_id else "",
-                "category": project.category.name if project.category_id else "",
-                "subprojects_total": int(sub_totals.get(project.id, 0)),
-                "subprojects_done": int(sub_done.get(project.id, 0)),
-                "subprojects_blocked": int(sub_blocked.get(project.id, 0)),
-                "created_at": project.created_at.isoformat() if project.created_at else "",
-                "updated_at": project.updated_at.isoformat() if project.updated_at else "",
-            }
-        )
 
-    active_count = sum(1 for row in payload_items if not row["is_archived"])
-    archived_count = sum(1 for row in payload_items if row["is_archived"])
-    return JsonResponse(
-        {
-            "ok": True,
-            "synced_at": timezone.now().isoformat(),
-            "stats": {
-                "total": len(payload_items),
-                "active": active_count,
-                "archived": archived_count,
-            },
-            "items": payload_items,
-        }
+def _projects_export_for_user(user):
+    """Export completo in streaming: righe lette a blocchi con iterator(), memoria costante."""
+    projects = (
+        _projects_with_subproject_counts(Project.objects.filter(owner=user))
+        .order_by(*PROJECTS_KEYSET_FIELDS)
+        .iterator(chunk_size=500)
     )
+    head = {
+        "ok": True,
+        "synced_at": timezone.now().isoformat(),
+        "delta": False,
+        "next_cursor": next_sync_cursor(RESOURCE_PROJECTS),
+        "stats": _projects_stats(user),
+    }
+    return stream_json_response(head, "items", (_project_payload_row(project) for project in projects))
 
 
-def _agenda_response_for_user(user, start_value: str | None, duration_value):
+AGENDA_DEFAULT_RANGE_DAYS = 14
+# Limite di sicurezza, non di prodotto: copre viste trimestrali/annuali con margine.
+AGENDA_MAX_RANGE_DAYS = 1096
+AGENDA_KEYSET_FIELDS = ("due_date", "due_time_key", "id")
+
+
+def _agenda_range(start_value: str | None, duration_value, end_value: str | None = None) -> tuple[date, date]:
     start_date = timezone.localdate()
     if start_value:
         try:
@@ -1149,54 +1330,114 @@ def _agenda_response_for_user(user, start_value: str | None, duration_value):
         except ValueError:
             start_date = timezone.localdate()
 
-    try:
-        duration = int(duration_value or 14)
-    except (TypeError, ValueError):
-        duration = 14
-    duration = max(1, min(duration, 31))
-    end_date = start_date + timedelta(days=duration - 1)
-
-    items = list(
-        AgendaItem.objects.filter(owner=user, due_date__range=(start_date, end_date))
-        .select_related("project")
-        .order_by("due_date", "due_time", "title")
+    duration = None
+    if end_value:
+        try:
+            duration = (date.fromisoformat(end_value) - start_date).days + 1
+        except ValueError:
+            duration = None
+    if duration is None:
+        try:
+            duration = int(duration_value or AGENDA_DEFAULT_RANGE_DAYS)
+        except (TypeError, ValueError):
+            duration = AGENDA_DEFAULT_RANGE_DAYS
+    duration = max(1, min(duration, AGENDA_MAX_RANGE_DAYS))
+    return start_date, start_date + timedelta(days=duration - 1)
+
+
+def _agenda_payload_row(item) -> dict:
+    return {
+        "id": item.id,
+        "title": item.title,
+        "item_type": item.item_type,
+        "item_type_label": item.get_item_type_display(),
+        "status": item.status,
+        "status_label": item.get_status_display(),
+        "due_date": item.due_date.isoformat() if item.due_date else "",
+        "due_time": item.due_time.strftime("%H:%M") if item.due_time else "",
+        "project": item.project.name if item.project_id else "",
+        "note": item.note or "",
+    }
+
+
+def _agenda_stats(range_qs) -> dict:
+    return range_qs.aggregate(
+        total=Count("id"),
+        activities=Count("id", filter=Q(item_type=AgendaItem.ItemType.ACTIVITY)),
+        reminders=Count("id", filter=Q(item_type=AgendaItem.ItemType.REMINDER)),
+        planned=Count("id", filter=Q(status=AgendaItem.Status.PLANNED)),
+        done=Count("id", filter=Q(status=AgendaItem.Status.DONE)),
     )
 
-    payload_items = []
-    for item in items:
-        payload_items.append(
-            {
-                "id": item.id,
-                "title": item.title,
-                "item_type": item.item_type,
-                "item_type_label": item.get_item_type_display(),
-                "status": item.status,
-                "status_label": item.get_status_display(),
-                "due_date": item.due_date.isoformat() if item.due_date else "",
-                "due_time": item.due_time.strftime("%H:%M") if item.due_time else "",
-                "project": item.project.name if item.project_id else "",
-                "note": item.note or "",
-            }
-        )
 
-    activity_total = sum(1 for row in payload_items if row["item_type"] == AgendaItem.ItemType.ACTIVITY)
-    reminder_total = sum(1 for row in payload_items if row["item_type"] == AgendaItem.ItemType.REMINDER)
-    done_total = sum(1 for row in payload_items if row["status"] == AgendaItem.Status.DONE)
-    planned_total = sum(1 for row in payload_items if row["status"] == AgendaItem.Status.PLANNED)
+def _agenda_response_for_user(
+    user,
+    start_value: str | None,
+    duration_value,
+    since_value: str | None = None,
+    end_value: str | None = None,
+    limit_value: str | None = None,
+    after_value: str | None = None,
+):
+    """
+    Senza `limit` restituisce tutta la finestra in streaming; con `limit`/`after` pagina a
+    chiave su (due_date, due_time, id). Le stats coprono sempre l'intera finestra.
+    """
+    try:
+        since = decode_sync_cursor(RESOURCE_AGENDA, since_value)
+        limit = parse_page_limit(limit_value)
+        after = decode_keyset_cursor(after_value, len(AGENDA_KEYSET_FIELDS))
+    except (SyncCursorError, PaginationError) as exc:
+        return _mobile_json_error(str(exc), status=400)
+    next_cursor = next_sync_cursor(RESOURCE_AGENDA)
+
+    start_date, end_date = _agenda_range(start_value, duration_value, end_value)
+    range_qs = AgendaItem.objects.filter(owner=user, due_date__range=(start_date, end_date))
+
+    deleted_ids = []
+    items_qs = range_qs
+    if since is not None:
+        changed_qs = AgendaItem.objects.filter(owner=user).filter(
+            Q(updated_at__gte=since) | Q(project__updated_at__gte=since)
+        )
+        items_qs = changed_qs.filter(due_date__range=(start_date, end_date))
+        # Le attivita spostate fuori dalla finestra richiesta vanno rimosse dalla cache client.
+        moved_out = changed_qs.exclude(due_date__range=(start_date, end_date)).values_list("id", flat=True)
+        deleted_ids = sorted(set(moved_out) | set(deleted_ids_since(user, RESOURCE_AGENDA, since)))
+
+    # due_time e' nullable: senza orario vale 00:00 cosi la chiave e' totale e uguale su ogni DB.
+    items_qs = (
+        items_qs.select_related("project")
+        .annotate(due_time_key=Coalesce("due_time", Value(time.min), output_field=TimeField()))
+        .order_by(*AGENDA_KEYSET_FIELDS)
+    )
+    if after is not None:
+        items_qs = items_qs.filter(keyset_after(AGENDA_KEYSET_FIELDS, after))
 
-    return JsonResponse(
-        {
-            "ok": True,
-            "synced_at": timezone.now().isoformat(),
-            "range_start": start_date.isoformat(),
-            "range_end": end_date.isoformat(),
-            "stats": {
-                "total": len(payload_items),
-                "activities": activity_total,
-                "reminders": reminder_total,
-                "planned": planned_total,
-                "done": done_total,
-            },
-            "items": payload_items,
-        }
+    payload = {
+        "ok": True,
+        "synced_at": timezone.now().isoformat(),
+        "delta": since is not None,
+        "next_cursor": next_cursor,
+        "range_start": start_date.isoformat(),
+        "range_end": end_date.isoformat(),
+        "stats": _agenda_stats(range_qs),
+    }
+    if since is not None:
+        payload["deleted_ids"] = deleted_ids
+
+    if limit is None:
+        rows = (_agenda_payload_row(item) for item in items_qs.iterator(chunk_size=500))
+        return stream_json_response(payload, "items", rows)
+
+    items = list(items_qs[: limit + 1])
+    has_more = len(items) > limit
+    items = items[:limit]
+    payload["items"] = [_agenda_payload_row(item) for item in items]
+    payload["has_more"] = has_more
+    payload["next_after"] = (
+        encode_keyset_cursor([getattr(items[-1], field) for field in AGENDA_KEYSET_FIELDS])
+        if has_more and items
+        else None
     )
+    return JsonResponse(payload)
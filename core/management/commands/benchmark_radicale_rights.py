@@ -0,0 +1,119 @@
+import configparser
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.dav import _render_rights_payload
+from core.models import DavCalendarGrant
+
+DEFAULT_SIZES = "10,1000,10000"
+SERVICE_USERNAME = "archibald"
+
+
+def radicale_rights_permissions(rights_payload: str, user: str, path: str) -> str:
+    """
+    Valutazione come `radicale.rights.from_file` (Radicale 3): file riletto a ogni richiesta,
+    sezioni in ordine, vince la prima con utente e collection che corrispondono.
+    """
+    rights = configparser.RawConfigParser()
+    rights.read_string(rights_payload)
+    sane_path = path.strip("/")
+    escaped_user = re.escape(user)
+    for section in rights.sections():
+        user_match = re.fullmatch(rights.get(section, "user").format(), user)
+        if not user_match:
+            continue
+        groups = (re.escape(group or "") for group in user_match.groups())
+        collection_pattern = rights.get(section, "collection").format(*groups, user=escaped_user)
+        if re.fullmatch(collection_pattern, sane_path):
+            return rights.get(section, "permissions")
+    return ""
+
+
+def _legacy_rights_payload(usernames: list[str], grant_rows: list[tuple]) -> str:
+    """Layout precedente (tre sezioni per account, una per grant): solo per confronto."""
+    lines = ["[allow-service-full]", f"user: ^{SERVICE_USERNAME}$", "collection: .+", "permissions: RWrw", ""]
+    for idx, username in enumerate(usernames, start=1):
+        escaped = re.escape(username)
+        lines.extend(
+            [
+                f"[allow-app-root-{idx}]", f"user: ^{escaped}$", f"collection: ^{escaped}/?$", "permissions: R", "",
+                f"[allow-app-principal-{idx}]", f"user: ^{escaped}$", f"collection: ^{escaped}/[^/]+/?$",
+                "permissions: RW", "",
+                f"[allow-app-calendars-{idx}]", f"user: ^{escaped}$",
+                f"collection: ^{escaped}/[^/]+/[^/]+(?:/.*)?$", "permissions: RWrw", "",
+            ]
+        )
+    for idx, (username, principal, slug, access_level) in enumerate(grant_rows, start=1):
+        permissions = "RWrw" if access_level == DavCalendarGrant.ACCESS_READWRITE else "Rr"
+        lines.extend(
+            [
+                f"[allow-ext-shared-calendar-{idx}]",
+                f"user: ^{re.escape(username)}$",
+                f"collection: ^{re.escape(f'{principal}/{slug}')}(?:/.*)?$",
+                f"permissions: {permissions}",
+                "",
+            ]
+        )
+    return "\n".join(lines).strip() + "\n"
+
+
+def _synthetic_accounts(size: int) -> tuple[list[str], list[tuple]]:
+    """
+    `size` account: il 10% esterni, ognuno con un grant su uno dei calendari condivisi
+    (uno ogni 100 account). Le regole compatte crescono con i calendari condivisi, non con gli account.
+    """
+    usernames = [f"user{index:05d}@example.org" for index in range(size)]
+    external_count = max(size // 10, 1)
+    shared_calendars = max(size // 100, 1)
+    grant_rows = []
+    for index in range(external_count):
+        calendar_index = index % shared_calendars
+        access_level = DavCalendarGrant.ACCESS_READWRITE if calendar_index % 2 else DavCalendarGrant.ACCESS_READONLY
+        grant_rows.append((usernames[-1 - index], usernames[calendar_index], "team-progetto", access_level))
+    return usernames, grant_rows
+
+
+def _requests_for(usernames: list[str], count: int) -> list[tuple[str, str]]:
+    step = max(len(usernames) // max(count, 1), 1)
+    # Utenti distribuiti su tutto il file: con il layout per-account i piu lontani costano di piu.
+    sample = usernames[::step][:count]
+    return [(username, f"{username}/personal_dav/event.ics") for username in sample]
+
+
+class Command(BaseCommand):
+    help = (
+        "Misura il costo di valutazione dei rights Radicale (parse + regole in sequenza, come "
+        "from_file) al crescere degli account, confrontando il layout compatto con quello per-account."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Numero di account (default: {DEFAULT_SIZES}).")
+        parser.add_argument("--requests", type=int, default=20, help="Richieste simulate per misura (default: 20).")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(value) for value in options["sizes"].split(",") if value.strip()]
+        except ValueError:
+            raise CommandError("--sizes deve essere una lista di interi separati da virgola.")
+        if not sizes or min(sizes) < 1 or options["requests"] < 1:
+            raise CommandError("--sizes e --requests devono essere >= 1.")
+
+        self.stdout.write(f"{'account':>8} {'layout':>10} {'sezioni':>8} {'byte':>10} {'us/richiesta':>13}")
+        for size in sizes:
+            usernames, grant_rows = _synthetic_accounts(size)
+            requests = _requests_for(usernames, options["requests"])
+            layouts = (
+                ("compatto", _render_rights_payload(SERVICE_USERNAME, grant_rows)),
+                ("per-account", _legacy_rights_payload(usernames, grant_rows)),
+            )
+            for label, payload in layouts:
+                started_at = time.perf_counter()
+                for user, path in requests:
+                    if radicale_rights_permissions(payload, user, path) != "RWrw":
+                        raise CommandError(f"Permessi inattesi per {user} ({label}).")
+                per_request_us = (time.perf_counter() - started_at) / len(requests) * 1_000_000
+                self.stdout.write(
+                    f"{size:>8} {label:>10} {payload.count('[allow-'):>8} {len(payload):>10} {per_request_us:>13.0f}"
+                )
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.mobile_sessions import DEFAULT_PRUNE_BATCH_SIZE, max_sessions_per_user, prune_mobile_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina a blocchi le sessioni API mobile revocate o scadute oltre il periodo di grazia "
+        "e applica il limite di sessioni vive per utente (MOBILE_API_MAX_SESSIONS_PER_USER)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-days",
+            type=int,
+            default=None,
+            help="Giorni di grazia dopo revoca/scadenza (default: MOBILE_API_SESSION_PRUNE_GRACE_DAYS).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_PRUNE_BATCH_SIZE,
+            help=f"Righe eliminate per DELETE (default: {DEFAULT_PRUNE_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Mostra cosa verrebbe revocato/eliminato senza modificare il database.",
+        )
+
+    def handle(self, *args, **options):
+        grace_days = options.get("grace_days")
+        if grace_days is not None and grace_days < 0:
+            raise CommandError("--grace-days deve essere >= 0.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size deve essere >= 1.")
+
+        report = prune_mobile_sessions(
+            grace=timedelta(days=grace_days) if grace_days is not None else None,
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+        )
+        prefix = "[dry-run] " if options["dry_run"] else ""
+        cap = max_sessions_per_user() or "nessuno"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}Sessioni mobile: eliminate={report.deleted} (batch={report.batches}), "
+                f"revocate oltre limite={report.revoked_over_cap} su utenti={report.capped_users} "
+                f"(limite per utente={cap})."
+            )
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.sync import prune_sync_tombstones, tombstone_retention
+
+
+class Command(BaseCommand):
+    help = "Elimina i tombstone di sync delta piu vecchi della retention (MOBILE_API_SYNC_TOMBSTONE_DAYS)."
+
+    def handle(self, *args, **options):
+        deleted = prune_sync_tombstones()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Tombstone sync eliminati: {deleted} (retention={tombstone_retention().days} giorni)."
+            )
+        )
@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.calendar_rollup import rebuild_calendar_rollup
+
+
+class Command(BaseCommand):
+    help = "Ricostruisce da zero i contatori giornalieri del calendario (CalendarDayCount)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username",
+            action="append",
+            dest="usernames",
+            default=[],
+            help="Username da ricostruire (ripetibile). Se omesso, ricostruisce tutti gli utenti.",
+        )
+
+    def handle(self, *args, **options):
+        usernames = [item.strip() for item in (options.get("usernames") or []) if item and item.strip()]
+
+        owner_ids = None
+        if usernames:
+            owner_ids = list(
+                get_user_model().objects.filter(username__in=usernames).values_list("id", flat=True)
+            )
+            if not owner_ids:
+                raise CommandError("Nessun utente trovato per gli username indicati.")
+
+        written = rebuild_calendar_rollup(owner_ids=owner_ids)
+        scope = f"utenti={len(owner_ids)}" if owner_ids is not None else "tutti gli utenti"
+        self.stdout.write(self.style.SUCCESS(f"Rollup calendario ricostruito ({scope}): righe={written}."))
@@ -0,0 +1,49 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.todo_stats import rebuild_todo_week_stats
+
+
+class Command(BaseCommand):
+    help = "Ricostruisce da zero i contatori settimanali dei check todo (TodoWeekStats)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username",
+            action="append",
+            dest="usernames",
+            default=[],
+            help="Username da ricostruire (ripetibile). Se omesso, ricostruisce tutti gli utenti.",
+        )
+        parser.add_argument(
+            "--week",
+            action="append",
+            dest="weeks",
+            default=[],
+            help="Data (YYYY-MM-DD) della settimana da ricostruire (ripetibile). Se omessa, tutte le settimane.",
+        )
+
+    def handle(self, *args, **options):
+        usernames = [item.strip() for item in (options.get("usernames") or []) if item and item.strip()]
+
+        owner_ids = None
+        if usernames:
+            owner_ids = list(
+                get_user_model().objects.filter(username__in=usernames).values_list("id", flat=True)
+            )
+            if not owner_ids:
+                raise CommandError("Nessun utente trovato per gli username indicati.")
+
+        week_starts = None
+        if options.get("weeks"):
+            try:
+                days = [date.fromisoformat(item.strip()) for item in options["weeks"]]
+            except ValueError as exc:
+                raise CommandError(f"Settimana non valida: {exc}") from exc
+            week_starts = {day - timedelta(days=day.weekday()) for day in days}
+
+        written = rebuild_todo_week_stats(owner_ids=owner_ids, week_starts=week_starts)
+        scope = f"utenti={len(owner_ids)}" if owner_ids is not None else "tutti gli utenti"
+        self.stdout.write(self.style.SUCCESS(f"Stats settimanali todo ricostruite ({scope}): righe={written}."))
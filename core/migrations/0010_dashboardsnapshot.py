@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-17 07:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_remove_userheroactionsconfig'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('computed_on', models.DateField(blank=True, null=True)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('tasks_dirty', models.BooleanField(default=True)),
+                ('planner_dirty', models.BooleanField(default=True)),
+                ('subscriptions_dirty', models.BooleanField(default=True)),
+                ('transactions_dirty', models.BooleanField(default=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_snapshot', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
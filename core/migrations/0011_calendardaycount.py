@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-17 07:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_dashboardsnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarDayCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('kind', models.CharField(choices=[('task', 'Task'), ('agenda_activity', 'Agenda attivita'), ('agenda_reminder', 'Agenda reminder'), ('planner', 'Planner'), ('subscription', 'Abbonamenti'), ('transaction', 'Transazioni'), ('worklog', 'Ore lavoro')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='%(class)ss', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('owner', 'day', 'kind')},
+            },
+        ),
+    ]
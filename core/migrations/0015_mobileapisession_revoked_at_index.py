@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-17 08:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_todoweekstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mobileapisession',
+            index=models.Index(fields=['revoked_at'], name='core_mobile_revoked_533e2c_idx'),
+        ),
+    ]
@@ -15,22 +15,30 @@ from core.helpers import (
     _mobile_json_error,
     _mobile_parse_json,
     _mobile_hash_token,
+    _mobile_issue_tokens,
     _mobile_access_ttl_seconds,
     _mobile_refresh_ttl_days,
     _mobile_create_session,
     _mobile_payload,
     _mobile_bearer_token,
     _mobile_authenticate_request,
+    _mobile_forget_session,
     _dashboard_snapshot_context,
     _todos_response_for_user,
     _todos_check_for_user,
     _todos_item_create_for_user,
     _todos_item_update_for_user,
     _todos_item_delete_for_user,
+    _todos_batch_for_user,
     _projects_response_for_user,
+    _projects_export_for_user,
     _agenda_response_for_user,
+    _agenda_range,
+    _api_conditional_response,
+    _mobile_week_start_for,
 )
 from core.models import MobileApiSession
+from core.resource_versions import RESOURCE_AGENDA, RESOURCE_PROJECTS, RESOURCE_TODOS
 
 logger = logging.getLogger(__name__)
 
@@ -90,6 +98,7 @@ def mobile_auth_refresh(request):
     if not session:
         return _mobile_json_error("invalid_or_expired_refresh_token", status=401)
 
+    _mobile_forget_session(session)
     access_token, new_refresh_token = _mobile_issue_tokens()
     session.access_token_hash = _mobile_hash_token(access_token)
     session.refresh_token_hash = _mobile_hash_token(new_refresh_token)
@@ -145,6 +154,7 @@ def mobile_auth_logout(request):
     if session:
         session.revoked_at = now
         session.save(update_fields=["revoked_at", "updated_at"])
+        _mobile_forget_session(session)
 
     return JsonResponse({"ok": True})
 
@@ -203,7 +213,15 @@ def mobile_todos(request):
     session, error = _mobile_authenticate_request(request)
     if error:
         return error
-    return _todos_response_for_user(session.user, request.GET.get("week"))
+    week_value = request.GET.get("week")
+    since_value = request.GET.get("since")
+    return _api_conditional_response(
+        request,
+        session.user,
+        RESOURCE_TODOS,
+        f"{_mobile_week_start_for(week_value).isoformat()}:{since_value or ''}",
+        lambda: _todos_response_for_user(session.user, week_value, since_value),
+    )
 
 
 @csrf_exempt
@@ -254,12 +272,47 @@ def mobile_todos_item_delete(request):
     return _todos_item_delete_for_user(session.user, payload)
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def mobile_todos_batch(request):
+    payload = _mobile_parse_json(request)
+    if payload is None:
+        return _mobile_json_error("invalid_json", status=400)
+    session, error = _mobile_authenticate_request(request)
+    if error:
+        return error
+    return _todos_batch_for_user(session.user, payload)
+
+
 @require_http_methods(["GET"])
 def mobile_projects(request):
     session, error = _mobile_authenticate_request(request)
     if error:
         return error
-    return _projects_response_for_user(session.user)
+    since_value = request.GET.get("since")
+    limit_value = request.GET.get("limit")
+    after_value = request.GET.get("after")
+    return _api_conditional_response(
+        request,
+        session.user,
+        RESOURCE_PROJECTS,
+        f"{since_value or ''}:{limit_value or ''}:{after_value or ''}",
+        lambda: _projects_response_for_user(session.user, since_value, limit_value, after_value),
+    )
+
+
+@require_http_methods(["GET"])
+def mobile_projects_export(request):
+    session, error = _mobile_authenticate_request(request)
+    if error:
+        return error
+    return _api_conditional_response(
+        request,
+        session.user,
+        RESOURCE_PROJECTS,
+        "export",
+        lambda: _projects_export_for_user(session.user),
+    )
 
 
 @require_http_methods(["GET"])
@@ -267,8 +320,25 @@ def mobile_agenda(request):
     session, error = _mobile_authenticate_request(request)
     if error:
         return error
-    return _agenda_response_for_user(
+    start_value = request.GET.get("start")
+    duration_value = request.GET.get("duration")
+    end_value = request.GET.get("end")
+    since_value = request.GET.get("since")
+    limit_value = request.GET.get("limit")
+    after_value = request.GET.get("after")
+    start_date, end_date = _agenda_range(start_value, duration_value, end_value)
+    return _api_conditional_response(
+        request,
         session.user,
-        request.GET.get("start"),
-        request.GET.get("duration"),
+        RESOURCE_AGENDA,
+        f"{start_date.isoformat()}:{end_date.isoformat()}:{since_value or ''}:{limit_value or ''}:{after_value or ''}",
+        lambda: _agenda_response_for_user(
+            session.user,
+            start_value,
+            duration_value,
+            since_value,
+            end_value=end_value,
+            limit_value=limit_value,
+            after_value=after_value,
+        ),
     )
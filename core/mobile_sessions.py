@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import MobileApiSession
+
+DEFAULT_PRUNE_BATCH_SIZE = 500
+
+
+@dataclass
+class SessionPruneReport:
+    capped_users: int = 0
+    revoked_over_cap: int = 0
+    deleted: int = 0
+    batches: int = 0
+
+
+def session_prune_grace() -> timedelta:
+    days = int(getattr(settings, "MOBILE_API_SESSION_PRUNE_GRACE_DAYS", 7) or 0)
+    return timedelta(days=max(days, 0))
+
+
+def max_sessions_per_user() -> int:
+    """0 = nessun limite."""
+    return max(int(getattr(settings, "MOBILE_API_MAX_SESSIONS_PER_USER", 10) or 0), 0)
+
+
+def live_sessions(now: datetime):
+    return MobileApiSession.objects.filter(revoked_at__isnull=True, refresh_expires_at__gt=now)
+
+
+def dead_sessions(now: datetime, grace: timedelta):
+    """Sessioni revocate o con refresh scaduto da piu del periodo di grazia."""
+    cutoff = now - grace
+    return MobileApiSession.objects.filter(Q(revoked_at__lt=cutoff) | Q(refresh_expires_at__lt=cutoff))
+
+
+def _excess_session_ids(user_id, now: datetime, cap: int) -> list[int]:
+    return list(
+        live_sessions(now)
+        .filter(user_id=user_id)
+        # Una sessione appena creata non ha ancora last_used_at: conta la creazione,
+        # altrimenti il login corrente verrebbe revocato al posto di quelli vecchi.
+        .order_by(Coalesce("last_used_at", "created_at").desc(), "-id")
+        .values_list("id", flat=True)[cap:]
+    )
+
+
+def revoke_excess_sessions(user_id, *, now: datetime | None = None) -> int:
+    """Revoca le sessioni vive meno recenti oltre MOBILE_API_MAX_SESSIONS_PER_USER."""
+    cap = max_sessions_per_user()
+    if not cap:
+        return 0
+    now = now or timezone.now()
+    excess_ids = _excess_session_ids(user_id, now, cap)
+    if not excess_ids:
+        return 0
+    revoked = MobileApiSession.objects.filter(id__in=excess_ids).update(revoked_at=now)
+    # Import locale: helpers importa questo modulo per la creazione delle sessioni.
+    from .helpers import _mobile_forget_session_ids
+
+    _mobile_forget_session_ids(excess_ids)
+    return revoked
+
+
+def prune_mobile_sessions(
+    *,
+    now: datetime | None = None,
+    grace: timedelta | None = None,
+    batch_size: int = DEFAULT_PRUNE_BATCH_SIZE,
+    dry_run: bool = False,
+) -> SessionPruneReport:
+    """
+    Applica il limite di sessioni vive per utente, poi elimina a blocchi di `batch_size`
+    le sessioni morte: ogni DELETE resta breve e non blocca a lungo gli indici dei token.
+    """
+    now = now or timezone.now()
+    grace = session_prune_grace() if grace is None else grace
+    batch_size = max(int(batch_size), 1)
+    report = SessionPruneReport()
+
+    cap = max_sessions_per_user()
+    if cap:
+        crowded = (
+            live_sessions(now)
+            .values("user_id")
+            .annotate(total=Count("id"))
+            .filter(total__gt=cap)
+            .values_list("user_id", "total")
+        )
+        for user_id, total in crowded:
+            report.capped_users += 1
+            if dry_run:
+                report.revoked_over_cap += total - cap
+            else:
+                report.revoked_over_cap += revoke_excess_sessions(user_id, now=now)
+
+    dead = dead_sessions(now, grace)
+    if dry_run:
+        report.deleted = dead.count()
+        report.batches = -(-report.deleted // batch_size)
+        return report
+
+    while True:
+        ids = list(dead.order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted, _details = MobileApiSession.objects.filter(id__in=ids).delete()
+        report.deleted += deleted
+        report.batches += 1
+    return report
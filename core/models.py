@@ -52,12 +52,119 @@ class MobileApiSession(TimeStampedModel):
             models.Index(fields=["user", "revoked_at"]),
             models.Index(fields=["access_expires_at"]),
             models.Index(fields=["refresh_expires_at"]),
+            models.Index(fields=["revoked_at"]),
         ]
 
     def __str__(self):
         return f"MobileApiSession(user={self.user_id}, revoked={bool(self.revoked_at)})"
 
 
+class ApiResourceVersion(models.Model):
+    """
+    Contatore di versione per (utente, risorsa API): incrementato dai signal ad ogni modifica
+    dei modelli che compongono il payload, usato per ETag / If-None-Match.
+    """
+    user = models.ForeignKey(
+        "auth.User",
+        on_delete=models.CASCADE,
+        related_name="api_resource_versions",
+    )
+    resource = models.CharField(max_length=40)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = [("user", "resource")]
+
+    def __str__(self):
+        return f"ApiResourceVersion(user={self.user_id}, resource={self.resource}, version={self.version})"
+
+
+class SyncTombstone(OwnedModel):
+    """
+    Traccia le cancellazioni per la sync delta delle API mobile (`?since=cursor`).
+    `parent_id` lega la riga cancellata al record padre del payload (es. SubProject -> Project).
+    """
+    resource = models.CharField(max_length=40)
+    object_id = models.BigIntegerField()
+    parent_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "resource", "deleted_at"]),
+            models.Index(fields=["deleted_at"]),
+        ]
+
+    def __str__(self):
+        return f"SyncTombstone(owner={self.owner_id}, resource={self.resource}, object_id={self.object_id})"
+
+
+class DashboardSnapshot(TimeStampedModel):
+    """
+    Snapshot dashboard materializzato per utente.
+    I flag *_dirty vengono alzati dai signal e ricalcolati solo alla lettura.
+    """
+    user = models.OneToOneField(
+        "auth.User",
+        on_delete=models.CASCADE,
+        related_name="dashboard_snapshot",
+    )
+    computed_on = models.DateField(null=True, blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    tasks_dirty = models.BooleanField(default=True)
+    planner_dirty = models.BooleanField(default=True)
+    subscriptions_dirty = models.BooleanField(default=True)
+    transactions_dirty = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"DashboardSnapshot(user={self.user_id}, computed_on={self.computed_on})"
+
+
+class CalendarDayCount(OwnedModel):
+    """
+    Contatori giornalieri per il calendario dashboard (owner, giorno, tipo).
+    Aggiornati in modo incrementale dai signal, ricostruibili con `rebuild_calendar_rollup`.
+    """
+
+    class Kind(models.TextChoices):
+        TASK = "task", "Task"
+        AGENDA_ACTIVITY = "agenda_activity", "Agenda attivita"
+        AGENDA_REMINDER = "agenda_reminder", "Agenda reminder"
+        PLANNER = "planner", "Planner"
+        SUBSCRIPTION = "subscription", "Abbonamenti"
+        TRANSACTION = "transaction", "Transazioni"
+        WORKLOG = "worklog", "Ore lavoro"
+
+    day = models.DateField()
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [("owner", "day", "kind")]
+
+    def __str__(self):
+        return f"CalendarDayCount(owner={self.owner_id}, day={self.day}, kind={self.kind}, count={self.count})"
+
+
+class TodoWeekStats(OwnedModel):
+    """
+    Contatori settimanali dei check todo (owner, settimana) per stato, limitati alle voci visibili
+    (voce e lista attive). Aggiornati dai signal su TodoRecurrence, riparabili con
+    `rebuild_todo_week_stats`.
+    """
+
+    week_start = models.DateField()
+    planned = models.IntegerField(default=0)
+    done = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [("owner", "week_start")]
+
+    def __str__(self):
+        return f"TodoWeekStats(owner={self.owner_id}, week={self.week_start})"
+
+
 class DavAccount(TimeStampedModel):
     user = models.OneToOneField(
         "auth.User",
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import base64
+import json
+from collections.abc import Iterable
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 500
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def parse_page_limit(value) -> int | None:
+    """None se il parametro manca (risposta completa), altrimenti un limite in [1, MAX_PAGE_LIMIT]."""
+    if value in (None, ""):
+        return None
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError("invalid_limit")
+    if limit < 1:
+        raise PaginationError("invalid_limit")
+    return min(limit, MAX_PAGE_LIMIT)
+
+
+def encode_keyset_cursor(values: Iterable) -> str:
+    raw = json.dumps(list(values), cls=DjangoJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_keyset_cursor(value: str | None, size: int) -> list | None:
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        padded = value + "=" * (-len(value) % 4)
+        decoded = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError):
+        raise PaginationError("invalid_after")
+    if not isinstance(decoded, list) or len(decoded) != size:
+        raise PaginationError("invalid_after")
+    return decoded
+
+
+def keyset_after(fields: tuple[str, ...], values: list) -> Q:
+    """
+    Filtro "dopo la chiave" per un ordinamento ascendente su `fields`:
+    (a > x) OR (a = x AND b > y) OR ...
+    """
+    condition = Q()
+    for index, field in enumerate(fields):
+        step = Q(**{f"{field}__gt": values[index]})
+        for previous_field, previous_value in zip(fields[:index], values[:index]):
+            step &= Q(**{previous_field: previous_value})
+        condition |= step
+    return condition
+
+
+def stream_json_response(head: dict, items_key: str, rows: Iterable[dict]) -> StreamingHttpResponse:
+    """
+    Serializza `head` + la lista `items_key` riga per riga: la memoria resta costante
+    anche su migliaia di righe (usare con queryset.iterator()).
+    """
+
+    def chunks():
+        encoder = DjangoJSONEncoder(separators=(",", ":"))
+        prefix = encoder.encode(head)[:-1]
+        yield f'{prefix}{"," if head else ""}{encoder.encode(items_key)}:['
+        separator = ""
+        for row in rows:
+            yield separator + encoder.encode(row)
+            separator = ","
+        yield "]}"
+
+    return StreamingHttpResponse(chunks(), content_type="application/json")
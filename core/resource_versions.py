@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from agenda.models import AgendaItem
+from common.deletion import deleted_with_owner
+from projects.models import Category, Customer, Project, SubProject
+from todos.models import TodoCategory, TodoItem, TodoList, TodoRecurrence
+
+from .models import ApiResourceVersion
+
+RESOURCE_TODOS = "todos"
+RESOURCE_PROJECTS = "projects"
+RESOURCE_AGENDA = "agenda"
+
+# Modelli owned che compongono ciascun payload API (anche solo per un nome mostrato).
+RESOURCES_BY_MODEL = {
+    TodoItem: (RESOURCE_TODOS,),
+    TodoRecurrence: (RESOURCE_TODOS,),
+    TodoList: (RESOURCE_TODOS,),
+    TodoCategory: (RESOURCE_TODOS,),
+    Project: (RESOURCE_TODOS, RESOURCE_PROJECTS, RESOURCE_AGENDA),
+    SubProject: (RESOURCE_PROJECTS,),
+    Customer: (RESOURCE_PROJECTS,),
+    Category: (RESOURCE_PROJECTS,),
+    AgendaItem: (RESOURCE_AGENDA,),
+}
+
+
+def resource_version(user, resource: str) -> int:
+    version = (
+        ApiResourceVersion.objects.filter(user=user, resource=resource)
+        .values_list("version", flat=True)
+        .first()
+    )
+    return version or 0
+
+
+def bump_resource_versions(owner_id, *resources: str) -> None:
+    if not owner_id:
+        return
+    for resource in resources:
+        rows = ApiResourceVersion.objects.filter(user_id=owner_id, resource=resource)
+        if rows.update(version=F("version") + 1):
+            continue
+        try:
+            with transaction.atomic():
+                ApiResourceVersion.objects.create(user_id=owner_id, resource=resource, version=1)
+        except IntegrityError:
+            rows.update(version=F("version") + 1)
+
+
+def bump_resource_versions_on_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Utente cancellato: la sua riga di versione sparisce con lui, crearla romperebbe la FK.
+    if deleted_with_owner(instance.owner_id, kwargs.get("origin")):
+        return
+    bump_resource_versions(instance.owner_id, *RESOURCES_BY_MODEL[sender])
@@ -2,9 +2,31 @@ import logging
 
 from django.conf import settings
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from finance_hub.models import Subscription, SubscriptionOccurrence
+from planner.models import PlannerItem
+from todos.models import TodoItem, TodoList, TodoRecurrence
+from transactions.models import Transaction
+
+from .calendar_rollup import (
+    ROLLUP_SOURCES,
+    apply_rollup_on_delete,
+    apply_rollup_on_save,
+    track_previous_rollup_key,
+)
 from .dav import DavProvisioningError, ensure_user_dav_access
+from .resource_versions import RESOURCES_BY_MODEL, bump_resource_versions_on_change
+from .snapshots import mark_dashboard_snapshot_dirty
+from .sync import TOMBSTONE_SOURCES, record_sync_tombstone
+from .todo_stats import (
+    apply_week_stats_on_delete,
+    apply_week_stats_on_save,
+    repair_week_stats_on_visibility_change,
+    track_previous_visibility,
+    track_previous_week_stats_key,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,3 +48,62 @@ def sync_dav_on_login(sender, user, request, **kwargs):
         logger.warning("DAV sync failed during login for user=%s: %s", getattr(user, "id", None), exc)
     else:
         request._dav_synced = True
+
+
+_SNAPSHOT_SECTION_BY_MODEL = {
+    TodoItem: "tasks",
+    PlannerItem: "planner",
+    Subscription: "subscriptions",
+    SubscriptionOccurrence: "subscriptions",
+    Transaction: "transactions",
+}
+
+
+@receiver(post_save, sender=TodoItem)
+@receiver(post_delete, sender=TodoItem)
+@receiver(post_save, sender=PlannerItem)
+@receiver(post_delete, sender=PlannerItem)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_save, sender=SubscriptionOccurrence)
+@receiver(post_delete, sender=SubscriptionOccurrence)
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_dashboard_snapshot(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        return
+    mark_dashboard_snapshot_dirty(instance.owner_id, _SNAPSHOT_SECTION_BY_MODEL[sender])
+
+
+for _rollup_model in ROLLUP_SOURCES:
+    _uid = f"core.calendar_rollup.{_rollup_model._meta.label_lower}"
+    pre_save.connect(track_previous_rollup_key, sender=_rollup_model, dispatch_uid=f"{_uid}.pre_save")
+    post_save.connect(apply_rollup_on_save, sender=_rollup_model, dispatch_uid=f"{_uid}.post_save")
+    post_delete.connect(apply_rollup_on_delete, sender=_rollup_model, dispatch_uid=f"{_uid}.post_delete")
+
+
+for _versioned_model in RESOURCES_BY_MODEL:
+    _uid = f"core.resource_versions.{_versioned_model._meta.label_lower}"
+    post_save.connect(bump_resource_versions_on_change, sender=_versioned_model, dispatch_uid=f"{_uid}.post_save")
+    post_delete.connect(bump_resource_versions_on_change, sender=_versioned_model, dispatch_uid=f"{_uid}.post_delete")
+
+
+for _tombstone_model in TOMBSTONE_SOURCES:
+    post_delete.connect(
+        record_sync_tombstone,
+        sender=_tombstone_model,
+        dispatch_uid=f"core.sync.{_tombstone_model._meta.label_lower}.post_delete",
+    )
+
+
+pre_save.connect(track_previous_week_stats_key, sender=TodoRecurrence, dispatch_uid="core.todo_stats.pre_save")
+post_save.connect(apply_week_stats_on_save, sender=TodoRecurrence, dispatch_uid="core.todo_stats.post_save")
+post_delete.connect(apply_week_stats_on_delete, sender=TodoRecurrence, dispatch_uid="core.todo_stats.post_delete")
+for _visibility_model in (TodoItem, TodoList):
+    _uid = f"core.todo_stats.{_visibility_model._meta.label_lower}"
+    pre_save.connect(track_previous_visibility, sender=_visibility_model, dispatch_uid=f"{_uid}.pre_save")
+    post_save.connect(
+        repair_week_stats_on_visibility_change,
+        sender=_visibility_model,
+        dispatch_uid=f"{_uid}.post_save",
+    )
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from finance_hub.models import SubscriptionOccurrence
+from planner.models import PlannerItem
+from todos.models import TodoItem
+from transactions.models import Transaction
+
+from .models import DashboardSnapshot
+
+SNAPSHOT_SECTIONS = ("tasks", "planner", "subscriptions", "transactions")
+FOCUS_ROWS_PER_SECTION = 4
+FOCUS_ROWS_LIMIT = 8
+
+
+def _focus_row(kind: str, title: str, due_date: date, url: str) -> dict:
+    return {
+        "kind": kind,
+        "title": title,
+        "due_date": due_date.isoformat() if due_date else "",
+        "url": url,
+    }
+
+
+def _tasks_section(user, today: date) -> dict:
+    open_tasks_qs = TodoItem.objects.filter(owner=user).exclude(status=TodoItem.Status.DONE)
+    counts = open_tasks_qs.aggregate(
+        open_tasks=Count("id"),
+        tasks_today=Count("id", filter=Q(due_date=today)),
+        overdue_tasks=Count("id", filter=Q(due_date__lt=today)),
+    )
+    rows = [
+        _focus_row("Task", task.title, task.due_date, "/todos/")
+        for task in open_tasks_qs.filter(due_date__isnull=False)
+        .only("title", "due_date")
+        .order_by("due_date", "title")[:FOCUS_ROWS_PER_SECTION]
+    ]
+    return {"counts": counts, "focus_rows": rows}
+
+
+def _planner_section(user, today: date) -> dict:
+    planned_qs = PlannerItem.objects.filter(owner=user, status=PlannerItem.Status.PLANNED)
+    counts = planned_qs.aggregate(
+        planner_planned=Count("id"),
+        planner_today=Count("id", filter=Q(due_date=today)),
+    )
+    rows = [
+        _focus_row("Planner", item.title, item.due_date, "/planner/")
+        for item in planned_qs.filter(due_date__isnull=False)
+        .only("title", "due_date")
+        .order_by("due_date", "title")[:FOCUS_ROWS_PER_SECTION]
+    ]
+    return {"counts": counts, "focus_rows": rows}
+
+
+def _subscriptions_section(user, today: date) -> dict:
+    due_subs_qs = SubscriptionOccurrence.objects.filter(
+        owner=user,
+        due_date__range=(today, today + timedelta(days=7)),
+        state=SubscriptionOccurrence.State.PLANNED,
+    )
+    rows = [
+        _focus_row("Abbonamento", occ.subscription.name, occ.due_date, "/subs/")
+        for occ in due_subs_qs.select_related("subscription").order_by("due_date", "subscription__name")[
+            :FOCUS_ROWS_PER_SECTION
+        ]
+    ]
+    return {"counts": {"due_subscriptions_week": due_subs_qs.count()}, "focus_rows": rows}
+
+
+def _transactions_section(user, today: date) -> dict:
+    month_start = today.replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    totals = Transaction.objects.filter(owner=user, date__range=(month_start, month_end)).aggregate(
+        month_transactions=Count("id"),
+        month_income=Coalesce(Sum("amount", filter=Q(tx_type=Transaction.Type.INCOME)), Decimal("0.00")),
+        month_expense=Coalesce(Sum("amount", filter=Q(tx_type=Transaction.Type.EXPENSE)), Decimal("0.00")),
+    )
+    # JSONField non serializza Decimal: gli importi vengono salvati come stringa.
+    counts = {
+        "month_transactions": totals["month_transactions"],
+        "month_income": str(totals["month_income"]),
+        "month_expense": str(totals["month_expense"]),
+    }
+    return {"counts": counts, "focus_rows": []}
+
+
+SECTION_BUILDERS = {
+    "tasks": _tasks_section,
+    "planner": _planner_section,
+    "subscriptions": _subscriptions_section,
+    "transactions": _transactions_section,
+}
+
+
+def mark_dashboard_snapshot_dirty(owner_id, *sections: str) -> None:
+    """Invalida le sezioni indicate con una sola UPDATE, senza ricalcolare nulla."""
+    if not owner_id or not sections:
+        return
+    DashboardSnapshot.objects.filter(user_id=owner_id).update(
+        **{f"{section}_dirty": True for section in sections}
+    )
+
+
+def _refresh_snapshot(snapshot: DashboardSnapshot, user, sections, today: date) -> None:
+    # I flag vengono azzerati prima del ricalcolo: un signal che arriva durante
+    # il calcolo li rialza e la lettura successiva ricalcola di nuovo.
+    DashboardSnapshot.objects.filter(pk=snapshot.pk).update(
+        **{f"{section}_dirty": False for section in sections}
+    )
+    data = dict(snapshot.data) if isinstance(snapshot.data, dict) else {}
+    for section in sections:
+        data[section] = SECTION_BUILDERS[section](user, today)
+    snapshot.data = data
+    snapshot.computed_on = today
+    snapshot.save(update_fields=["data", "computed_on", "updated_at"])
+
+
+def _context_from_data(data: dict, today: date) -> dict:
+    counts = {}
+    focus_rows = []
+    for section in SNAPSHOT_SECTIONS:
+        payload = data.get(section) or {}
+        counts.update(payload.get("counts") or {})
+        for row in payload.get("focus_rows") or []:
+            due_raw = row.get("due_date") or ""
+            focus_rows.append({**row, "due_date": date.fromisoformat(due_raw) if due_raw else None})
+
+    focus_rows.sort(key=lambda row: (row["due_date"] is None, row["due_date"] or today, row["kind"], row["title"]))
+
+    month_income = Decimal(counts.get("month_income") or "0.00")
+    month_expense = Decimal(counts.get("month_expense") or "0.00")
+    return {
+        "snapshot": {
+            "open_tasks": counts.get("open_tasks", 0),
+            "tasks_today": counts.get("tasks_today", 0),
+            "overdue_tasks": counts.get("overdue_tasks", 0),
+            "planner_planned": counts.get("planner_planned", 0),
+            "planner_today": counts.get("planner_today", 0),
+            "due_subscriptions_week": counts.get("due_subscriptions_week", 0),
+            "month_income": month_income,
+            "month_expense": month_expense,
+            "month_balance": month_income - month_expense,
+            "month_transactions": counts.get("month_transactions", 0),
+        },
+        "focus_rows": focus_rows[:FOCUS_ROWS_LIMIT],
+        "generated_on": today,
+    }
+
+
+def dashboard_snapshot_context(user) -> dict:
+    """
+    Restituisce il contesto snapshot dashboard con una sola lookup quando e' aggiornato.
+    Le sezioni invalidate dai signal (o tutte, al cambio giorno) vengono ricalcolate qui.
+    """
+    today = date.today()
+    snapshot, _created = DashboardSnapshot.objects.get_or_create(user=user)
+    if snapshot.computed_on != today:
+        stale = list(SNAPSHOT_SECTIONS)
+    else:
+        stale = [section for section in SNAPSHOT_SECTIONS if getattr(snapshot, f"{section}_dirty")]
+    if stale:
+        _refresh_snapshot(snapshot, user, stale, today)
+    return _context_from_data(snapshot.data, today)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from agenda.models import AgendaItem
+from common.deletion import deleted_with_owner
+from projects.models import Project, SubProject
+from todos.models import TodoItem
+
+from .models import SyncTombstone
+
+RESOURCE_SUBPROJECTS = "subprojects"
+
+# Margine sul cursore: le righe salvate in transazioni ancora aperte al momento della
+# lettura vengono ri-inviate al sync successivo invece di andare perse.
+SYNC_CURSOR_OVERLAP = timedelta(seconds=5)
+
+# modello -> (risorsa tombstone, attributo del padre)
+TOMBSTONE_SOURCES = {
+    TodoItem: ("todos", None),
+    Project: ("projects", None),
+    AgendaItem: ("agenda", None),
+    SubProject: (RESOURCE_SUBPROJECTS, "project_id"),
+}
+
+
+class SyncCursorError(ValueError):
+    pass
+
+
+def tombstone_retention() -> timedelta:
+    days = int(getattr(settings, "MOBILE_API_SYNC_TOMBSTONE_DAYS", 30) or 30)
+    return timedelta(days=max(days, 1))
+
+
+def encode_sync_cursor(resource: str, moment: datetime) -> str:
+    raw = json.dumps({"r": resource, "t": moment.isoformat()}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def next_sync_cursor(resource: str) -> str:
+    return encode_sync_cursor(resource, timezone.now() - SYNC_CURSOR_OVERLAP)
+
+
+def decode_sync_cursor(resource: str, value: str | None) -> datetime | None:
+    """
+    Restituisce il timestamp del cursore, oppure None se assente o piu vecchio della
+    retention dei tombstone (in quel caso il client riceve un sync completo).
+    """
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        padded = value + "=" * (-len(value) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        moment = datetime.fromisoformat(payload["t"])
+    except (ValueError, KeyError, TypeError, UnicodeError):
+        raise SyncCursorError("invalid_cursor")
+    if payload.get("r") != resource or timezone.is_naive(moment):
+        raise SyncCursorError("invalid_cursor")
+    if moment < timezone.now() - tombstone_retention():
+        return None
+    return moment
+
+
+def deleted_ids_since(user, resource: str, since: datetime) -> list[int]:
+    return list(
+        SyncTombstone.objects.filter(owner=user, resource=resource, deleted_at__gte=since)
+        .values_list("object_id", flat=True)
+        .distinct()
+    )
+
+
+def deleted_parent_ids_since(user, resource: str, since: datetime) -> list[int]:
+    return list(
+        SyncTombstone.objects.filter(
+            owner=user,
+            resource=resource,
+            deleted_at__gte=since,
+            parent_id__isnull=False,
+        )
+        .values_list("parent_id", flat=True)
+        .distinct()
+    )
+
+
+def record_sync_tombstone(sender, instance, **kwargs):
+    resource, parent_attr = TOMBSTONE_SOURCES[sender]
+    if not instance.owner_id or instance.pk is None:
+        return
+    # Utente cancellato: i suoi tombstone sparirebbero comunque e romperebbero la FK owner.
+    if deleted_with_owner(instance.owner_id, kwargs.get("origin")):
+        return
+    SyncTombstone.objects.create(
+        owner_id=instance.owner_id,
+        resource=resource,
+        object_id=instance.pk,
+        parent_id=getattr(instance, parent_attr) if parent_attr else None,
+    )
+
+
+def prune_sync_tombstones(*, now: datetime | None = None) -> int:
+    cutoff = (now or timezone.now()) - tombstone_retention()
+    deleted, _details = SyncTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -1,25 +1,50 @@
 import json
 import re
 import tempfile
-from datetime import timedelta
+from datetime import time, timedelta
+from io import StringIO
 from pathlib import Path
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
 from django.http import HttpResponse
 from django.test import RequestFactory, TestCase, override_settings
 from django.utils import timezone
 from passlib.hash import bcrypt
 
+from agenda.models import AgendaItem
 from planner.models import PlannerItem
 from todos.models import TodoList, TodoCategory, TodoItem, TodoRecurrence
 from todos.models import TodoItem
 from .context_processors import ui_preferences
+from .helpers import _mobile_authenticate_request
 from .middleware import DevLessCompileMiddleware
-from .models import DavAccount, DavCalendarGrant, DavExternalAccount, DavManagedCalendar, DavTeam, MobileApiSession, UserNavConfig
+from .models import (
+    ApiResourceVersion,
+    CalendarDayCount,
+    DashboardSnapshot,
+    DavAccount,
+    DavCalendarGrant,
+    DavExternalAccount,
+    DavManagedCalendar,
+    DavTeam,
+    MobileApiSession,
+    SyncTombstone,
+    TodoWeekStats,
+    UserNavConfig,
+)
+from .snapshots import dashboard_snapshot_context
 from .views import DEFAULT_DASHBOARD_WIDGET_IDS
 
 
+def _json_body(response):
+    if response.streaming:
+        return json.loads(b"".join(response.streaming_content))
+    return response.json()
+
+
 class ProfilePageTests(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(username="profile_user", password="test12345")
@@ -386,7 +411,7 @@ class DavExternalAccessTests(TestCase):
         users_content = self.users_file.read_text(encoding="utf-8")
         self.assertIn(f"{external.dav_username}:", users_content)
         rights_content = self.rights_file.read_text(encoding="utf-8")
-        self.assertIn("collection: ^owner/[^/]+/[^/]+(?:/.*)?$", rights_content)
+        self.assertIn("collection: ^{user}/[^/]+/[^/]+(?:/.*)?$", rights_content)
         self.assertIn(f"user: ^{re.escape(external.dav_username)}$", rights_content)
         self.assertIn("collection: ^owner/ops/progetto\\-test(?:/.*)?$", rights_content)
 
@@ -418,6 +443,175 @@ class DavExternalAccessTests(TestCase):
         )
 
 
+class RadicaleSyncTests(TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmpdir.cleanup)
+        self.users_file = Path(self._tmpdir.name) / "users"
+        self.rights_file = Path(self._tmpdir.name) / "rights"
+        self._override = override_settings(
+            CALDAV_ENABLED=True,
+            CALDAV_SERVICE_USERNAME="archibald",
+            CALDAV_SERVICE_PASSWORD=bcrypt.hash("archibald-service-pass"),
+            RADICALE_USERS_FILE=str(self.users_file),
+            RADICALE_USERS_LOCK_FILE=str(Path(self._tmpdir.name) / "users.lock"),
+            RADICALE_RIGHTS_FILE=str(self.rights_file),
+        )
+        self._override.enable()
+        self.addCleanup(self._override.disable)
+        self.owner = get_user_model().objects.create_user(username="sync_owner", password="OwnerPassword12345!")
+
+    def test_sync_skips_rewrite_when_payload_is_unchanged(self):
+        from core.dav import sync_radicale_users_file
+
+        self.assertTrue(sync_radicale_users_file())
+        with patch("core.dav.os.replace") as mock_replace:
+            self.assertFalse(sync_radicale_users_file())
+        mock_replace.assert_not_called()
+
+        DavAccount.objects.create(
+            user=self.owner,
+            dav_username="sync_owner",
+            password_hash=bcrypt.hash("OwnerPassword12345!"),
+            is_active=True,
+        )
+        self.assertTrue(sync_radicale_users_file())
+        self.assertIn("sync_owner:", self.users_file.read_text(encoding="utf-8"))
+
+    @override_settings(CALDAV_SERVICE_PASSWORD="archibald-plain-pass")
+    def test_service_account_hash_is_reused_across_syncs_and_restarts(self):
+        from core import dav
+
+        dav._service_hash_cache.clear()
+        self.assertTrue(dav.sync_radicale_users_file())
+        content = self.users_file.read_text(encoding="utf-8")
+        service_hash = re.search(r"^archibald:(.+)$", content, re.MULTILINE).group(1)
+        self.assertTrue(bcrypt.verify("archibald-plain-pass", service_hash))
+
+        with patch("core.dav._hash_password") as mock_hash:
+            self.assertFalse(dav.sync_radicale_users_file())
+            # Nuovo processo: la cache e vuota ma l'hash gia nel file resta valido.
+            dav._service_hash_cache.clear()
+            self.assertFalse(dav.sync_radicale_users_file())
+        mock_hash.assert_not_called()
+        self.assertEqual(self.users_file.read_text(encoding="utf-8"), content)
+
+        with override_settings(CALDAV_SERVICE_PASSWORD="archibald-rotated-pass"):
+            self.assertTrue(dav.sync_radicale_users_file())
+        rotated = re.search(r"^archibald:(.+)$", self.users_file.read_text(encoding="utf-8"), re.MULTILINE).group(1)
+        self.assertTrue(bcrypt.verify("archibald-rotated-pass", rotated))
+
+    def test_rights_stay_compact_and_isolate_accounts(self):
+        from core.dav import _build_rights_payload
+        from core.management.commands.benchmark_radicale_rights import radicale_rights_permissions
+
+        for index in range(3):
+            user = get_user_model().objects.create_user(username=f"app{index}", password="pwd12345")
+            DavAccount.objects.create(user=user, dav_username=f"app{index}", password_hash="x", is_active=True)
+        calendar = DavManagedCalendar.objects.create(owner=self.owner, principal="app0/ops", calendar_slug="progetto")
+        guests = []
+        for index in range(2):
+            guest = DavExternalAccount.objects.create(
+                owner=self.owner, dav_username=f"guest{index}", password_hash="x", is_active=True
+            )
+            DavCalendarGrant.objects.create(
+                owner=self.owner,
+                external_account=guest,
+                calendar=calendar,
+                access_level=DavCalendarGrant.ACCESS_READWRITE,
+            )
+            guests.append(guest)
+
+        rights = _build_rights_payload()
+        # Servizio + 3 regole "proprio principal" + 1 principal condiviso + 1 calendario condiviso.
+        self.assertEqual(rights.count("[allow-"), 6)
+        self.assertIn("user: ^(?:guest0|guest1)$", rights)
+
+        self.assertEqual(radicale_rights_permissions(rights, "app1", "app1/personal_dav/a.ics"), "RWrw")
+        self.assertEqual(radicale_rights_permissions(rights, "app1", "app1/personal_dav"), "RW")
+        self.assertEqual(radicale_rights_permissions(rights, "app1", "app2/personal_dav/a.ics"), "")
+        self.assertEqual(radicale_rights_permissions(rights, "guest0", "app0/ops/progetto/a.ics"), "RWrw")
+        self.assertEqual(radicale_rights_permissions(rights, "guest1", "app0/ops"), "R")
+        self.assertEqual(radicale_rights_permissions(rights, "guest1", "app0/personal_dav"), "")
+        self.assertEqual(radicale_rights_permissions(rights, "archibald", "app2/personal_dav/a.ics"), "RWrw")
+
+        out = StringIO()
+        call_command("benchmark_radicale_rights", sizes="10", requests=2, stdout=out)
+        self.assertIn("compatto", out.getvalue())
+        self.assertIn("per-account", out.getvalue())
+
+    def test_batch_coalesces_bulk_onboarding_into_one_rebuild(self):
+        from core.dav import create_external_dav_account, radicale_sync_batch
+
+        with patch("core.dav.sync_radicale_users_file") as mock_sync:
+            with radicale_sync_batch():
+                for index in range(5):
+                    create_external_dav_account(owner=self.owner, label=f"Ospite {index}")
+            self.assertEqual(mock_sync.call_count, 1)
+        self.assertEqual(DavExternalAccount.objects.filter(owner=self.owner).count(), 5)
+
+    @override_settings(RADICALE_SYNC_DEBOUNCE_SECONDS=2)
+    def test_service_username_conflict_is_rejected_before_commit(self):
+        from core.dav import (
+            DavProvisioningError,
+            _next_available_username,
+            rotate_external_dav_password,
+            set_external_dav_account_active,
+        )
+
+        self.assertEqual(_next_available_username("archibald"), "archibald-2")
+
+        legacy = DavExternalAccount.objects.create(
+            owner=self.owner, dav_username="archibald", password_hash=bcrypt.hash("legacy-pass"), is_active=False
+        )
+        original_hash = legacy.password_hash
+        with patch("core.dav._radicale_debouncer.request") as mock_request:
+            # Con il debounce il rebuild gira dopo il commit: il conflitto va rifiutato prima.
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(DavProvisioningError):
+                    set_external_dav_account_active(owner=self.owner, external_account=legacy, is_active=True)
+                with self.assertRaises(DavProvisioningError):
+                    rotate_external_dav_password(owner=self.owner, external_account=legacy)
+        mock_request.assert_not_called()
+        legacy.refresh_from_db()
+        self.assertFalse(legacy.is_active)
+        self.assertEqual(legacy.password_hash, original_hash)
+
+    def test_batch_final_sync_error_is_reported_instead_of_500(self):
+        from django.contrib.messages import get_messages
+
+        from core.dav import DavProvisioningError
+
+        self.client.login(username="sync_owner", password="OwnerPassword12345!")
+        with patch("core.dav.sync_radicale_users_file", side_effect=DavProvisioningError("file utenti non scrivibile")):
+            response = self.client.post(
+                "/profile/dav/",
+                {"action": "dav_create_external_user", "dav_external_label": "Fornitore"},
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(DavExternalAccount.objects.filter(owner=self.owner).exists())
+        errors = [str(message) for message in get_messages(response.wsgi_request) if message.level_tag == "error"]
+        self.assertTrue(any("file utenti non scrivibile" in message for message in errors))
+
+    @override_settings(RADICALE_SYNC_DEBOUNCE_SECONDS=0.05)
+    def test_debounce_runs_a_single_rebuild_after_a_burst(self):
+        import threading
+
+        from core.dav import _radicale_debouncer, request_radicale_sync
+
+        synced = threading.Event()
+        with patch("core.dav.sync_radicale_users_file", side_effect=lambda: synced.set()) as mock_sync:
+            # Il debounce parte solo al commit: il thread del rebuild vede le modifiche.
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                for _ in range(10):
+                    request_radicale_sync()
+                self.assertIsNone(_radicale_debouncer._timer)
+            self.assertEqual(len(callbacks), 10)
+            self.assertEqual(mock_sync.call_count, 0)
+            self.assertTrue(synced.wait(5))
+        self.assertEqual(mock_sync.call_count, 1)
+
+
 class NavSettingsTests(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(username="nav_user", password="test12345")
@@ -569,6 +763,167 @@ class DashboardPreferencesTests(TestCase):
         self.assertEqual(prefs["sections"], ["snapshot", "widgets"])
 
 
+class DashboardSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="snapshot_user", password="test12345")
+
+    def test_fresh_snapshot_is_served_with_single_lookup(self):
+        PlannerItem.objects.create(owner=self.user, title="Planner snapshot", status=PlannerItem.Status.PLANNED)
+        first = dashboard_snapshot_context(self.user)
+        self.assertEqual(first["snapshot"]["planner_planned"], 1)
+
+        with self.assertNumQueries(1):
+            second = dashboard_snapshot_context(self.user)
+        self.assertEqual(second["snapshot"], first["snapshot"])
+
+    def test_signals_invalidate_only_touched_section(self):
+        dashboard_snapshot_context(self.user)
+        TodoItem.objects.create(
+            owner=self.user,
+            title="Task scaduto",
+            status=TodoItem.Status.OPEN,
+            due_date=timezone.localdate() - timedelta(days=1),
+        )
+
+        snapshot = DashboardSnapshot.objects.get(user=self.user)
+        self.assertTrue(snapshot.tasks_dirty)
+        self.assertFalse(snapshot.planner_dirty)
+        self.assertFalse(snapshot.transactions_dirty)
+
+        context = dashboard_snapshot_context(self.user)
+        self.assertEqual(context["snapshot"]["open_tasks"], 1)
+        self.assertEqual(context["snapshot"]["overdue_tasks"], 1)
+        self.assertEqual(context["focus_rows"][0]["title"], "Task scaduto")
+        self.assertFalse(DashboardSnapshot.objects.get(user=self.user).tasks_dirty)
+
+        TodoItem.objects.filter(owner=self.user).get().delete()
+        self.assertEqual(dashboard_snapshot_context(self.user)["snapshot"]["open_tasks"], 0)
+
+
+class CalendarRollupTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="calendar_user", password="test12345")
+        self.day = timezone.localdate()
+
+    def _counts(self):
+        return {
+            (row.day, row.kind): row.count
+            for row in CalendarDayCount.objects.filter(owner=self.user, count__gt=0)
+        }
+
+    def test_writes_maintain_counters_incrementally(self):
+        task = TodoItem.objects.create(owner=self.user, title="Task", due_date=self.day)
+        AgendaItem.objects.create(
+            owner=self.user,
+            title="Reminder",
+            item_type=AgendaItem.ItemType.REMINDER,
+            due_date=self.day,
+        )
+        self.assertEqual(
+            self._counts(),
+            {(self.day, "task"): 1, (self.day, "agenda_reminder"): 1},
+        )
+
+        task.due_date = self.day + timedelta(days=1)
+        task.save()
+        self.assertEqual(self._counts()[(self.day + timedelta(days=1), "task")], 1)
+        self.assertNotIn((self.day, "task"), self._counts())
+
+        task.status = TodoItem.Status.DONE
+        task.save()
+        self.assertNotIn((self.day + timedelta(days=1), "task"), self._counts())
+
+        AgendaItem.objects.filter(owner=self.user).get().delete()
+        self.assertEqual(self._counts(), {})
+
+    def test_calendar_events_reads_rollup(self):
+        TodoItem.objects.create(owner=self.user, title="Task A", due_date=self.day)
+        TodoItem.objects.create(owner=self.user, title="Task B", due_date=self.day)
+        PlannerItem.objects.create(owner=self.user, title="Planner", due_date=self.day)
+
+        self.client.login(username="calendar_user", password="test12345")
+        response = self.client.get(f"/calendar/events?start={self.day.isoformat()}&end={self.day.isoformat()}")
+        self.assertEqual(response.status_code, 200)
+        events = {row["date"]: row["items"] for row in response.json()["events"]}
+        self.assertEqual(
+            events[self.day.isoformat()],
+            [
+                {"kind": "task", "label": "Task", "count": 2},
+                {"kind": "planner", "label": "Planner", "count": 1},
+            ],
+        )
+
+    def test_rebuild_command_matches_incremental_counters(self):
+        TodoItem.objects.create(owner=self.user, title="Task", due_date=self.day)
+        PlannerItem.objects.create(owner=self.user, title="Planner", due_date=self.day)
+        incremental = self._counts()
+
+        CalendarDayCount.objects.filter(owner=self.user).update(count=99)
+        call_command("rebuild_calendar_rollup", username=["calendar_user"], stdout=StringIO())
+        self.assertEqual(self._counts(), incremental)
+
+
+class TodoWeekStatsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="week_stats_user", password="test12345")
+        self.todo_list = TodoList.objects.create(owner=self.user, name="Lista stats", is_active=True)
+        self.item = TodoItem.objects.create(owner=self.user, todo_list=self.todo_list, title="Stretch", weekday=0)
+        self.week_start = timezone.localdate() - timedelta(days=timezone.localdate().weekday())
+
+    def _stats(self):
+        row = TodoWeekStats.objects.filter(owner=self.user, week_start=self.week_start).first()
+        return (row.planned, row.done, row.skipped) if row else None
+
+    def test_status_transitions_move_counters(self):
+        check = TodoRecurrence.objects.create(
+            owner=self.user,
+            todo_item=self.item,
+            week_start=self.week_start,
+            status=TodoRecurrence.Status.DONE,
+        )
+        self.assertEqual(self._stats(), (0, 1, 0))
+
+        check.status = TodoRecurrence.Status.SKIPPED
+        check.save()
+        self.assertEqual(self._stats(), (0, 0, 1))
+
+        check.delete()
+        self.assertEqual(self._stats(), (0, 0, 0))
+
+    def test_hiding_item_or_list_repairs_affected_weeks(self):
+        TodoRecurrence.objects.create(
+            owner=self.user,
+            todo_item=self.item,
+            week_start=self.week_start,
+            status=TodoRecurrence.Status.DONE,
+        )
+        self.todo_list.is_active = False
+        self.todo_list.save()
+        self.assertIsNone(self._stats())
+
+        self.todo_list.is_active = True
+        self.todo_list.save()
+        self.assertEqual(self._stats(), (0, 1, 0))
+
+        self.item.delete()
+        self.assertEqual(self._stats(), (0, 0, 0))
+
+    def test_rebuild_command_repairs_drift(self):
+        TodoRecurrence.objects.create(
+            owner=self.user,
+            todo_item=self.item,
+            week_start=self.week_start,
+            status=TodoRecurrence.Status.DONE,
+        )
+        TodoWeekStats.objects.filter(owner=self.user).update(done=7, skipped=3)
+
+        out = StringIO()
+        call_command("rebuild_todo_week_stats", "--username", "week_stats_user", stdout=out)
+
+        self.assertEqual(self._stats(), (0, 1, 0))
+        self.assertIn("righe=1", out.getvalue())
+
+
 class MobileApiAuthTests(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(
@@ -668,6 +1023,96 @@ class MobileApiAuthTests(TestCase):
         denied = self.client.get("/api/mobile/dashboard", HTTP_AUTHORIZATION=f"Bearer {access}")
         self.assertEqual(denied.status_code, 401)
 
+    def test_authenticated_requests_coalesce_session_lookups_and_touches(self):
+        access = self._login()["access_token"]
+        request = RequestFactory().get("/api/mobile/todos", HTTP_AUTHORIZATION=f"Bearer {access}")
+
+        session, error = _mobile_authenticate_request(request)
+        self.assertIsNone(error)
+        touched_at = MobileApiSession.objects.get(pk=session.pk).last_used_at
+        self.assertIsNotNone(touched_at)
+
+        with self.assertNumQueries(0):
+            cached, error = _mobile_authenticate_request(request)
+        self.assertIsNone(error)
+        self.assertEqual(cached.pk, session.pk)
+
+        with self.settings(MOBILE_API_SESSION_TOUCH_SECONDS=0):
+            with self.assertNumQueries(1):
+                _mobile_authenticate_request(request)
+        self.assertGreater(MobileApiSession.objects.get(pk=session.pk).last_used_at, touched_at)
+
+    def test_refresh_evicts_cached_access_token(self):
+        payload = self._login()
+        access = payload["access_token"]
+        self.assertEqual(
+            self.client.get("/api/mobile/dashboard", HTTP_AUTHORIZATION=f"Bearer {access}").status_code,
+            200,
+        )
+
+        self.client.post(
+            "/api/mobile/auth/refresh",
+            data=json.dumps({"refresh_token": payload["refresh_token"]}),
+            content_type="application/json",
+        )
+
+        denied = self.client.get("/api/mobile/dashboard", HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(denied.status_code, 401)
+
+    def _session(self, suffix, **fields):
+        now = timezone.now()
+        defaults = {
+            "access_token_hash": f"a-{suffix}",
+            "refresh_token_hash": f"r-{suffix}",
+            "access_expires_at": now + timedelta(minutes=15),
+            "refresh_expires_at": now + timedelta(days=14),
+        }
+        defaults.update(fields)
+        return MobileApiSession.objects.create(user=self.user, **defaults)
+
+    def test_prune_mobile_sessions_deletes_dead_rows_in_batches(self):
+        now = timezone.now()
+        live = self._session("live")
+        recent_revoked = self._session("recent", revoked_at=now - timedelta(days=1))
+        for index in range(3):
+            self._session(f"old-{index}", revoked_at=now - timedelta(days=30))
+        self._session("expired", refresh_expires_at=now - timedelta(days=30))
+
+        dry = StringIO()
+        call_command("prune_mobile_sessions", "--dry-run", "--batch-size", "2", stdout=dry)
+        self.assertIn("eliminate=4 (batch=2)", dry.getvalue())
+        self.assertEqual(MobileApiSession.objects.count(), 6)
+
+        out = StringIO()
+        call_command("prune_mobile_sessions", "--batch-size", "2", stdout=out)
+        self.assertIn("eliminate=4 (batch=2)", out.getvalue())
+        self.assertEqual(
+            set(MobileApiSession.objects.values_list("id", flat=True)),
+            {live.id, recent_revoked.id},
+        )
+
+    @override_settings(MOBILE_API_MAX_SESSIONS_PER_USER=2)
+    def test_login_caps_live_sessions_per_user(self):
+        for _index in range(3):
+            self._login()
+
+        live = MobileApiSession.objects.filter(user=self.user, revoked_at__isnull=True)
+        self.assertEqual(live.count(), 2)
+        self.assertEqual(MobileApiSession.objects.filter(user=self.user).count(), 3)
+
+    @override_settings(MOBILE_API_MAX_SESSIONS_PER_USER=1)
+    def test_session_revoked_by_cap_is_rejected_immediately(self):
+        access = self._login()["access_token"]
+        self.assertEqual(
+            self.client.get("/api/mobile/dashboard", HTTP_AUTHORIZATION=f"Bearer {access}").status_code,
+            200,
+        )
+
+        self._login()
+
+        denied = self.client.get("/api/mobile/dashboard", HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(denied.status_code, 401)
+
     def test_mobile_options_preflight_returns_cors_headers(self):
         response = self.client.options(
             "/api/mobile/auth/login",
@@ -690,7 +1135,7 @@ class MobileApiAuthTests(TestCase):
         todo = TodoList.objects.create(owner=self.user, name="TodoList Mobile", is_active=True)
         item = TodoItem.objects.create(
             owner=self.user,
-            todo=todo,
+            todo_list=todo,
             title="Stretching",
             weekday=timezone.localdate().weekday(),
             is_active=True,
@@ -698,7 +1143,7 @@ class MobileApiAuthTests(TestCase):
         week_start = timezone.localdate() - timedelta(days=timezone.localdate().weekday())
         TodoRecurrence.objects.create(
             owner=self.user,
-            item=item,
+            todo_item=item,
             week_start=week_start,
             status=TodoRecurrence.Status.DONE,
         )
@@ -724,7 +1169,7 @@ class MobileApiAuthTests(TestCase):
         todo = TodoList.objects.create(owner=self.user, name="TodoList Planned", is_active=True)
         TodoItem.objects.create(
             owner=self.user,
-            todo=todo,
+            todo_list=todo,
             title="Morning walk",
             weekday=timezone.localdate().weekday(),
             is_active=True,
@@ -747,7 +1192,7 @@ class MobileApiAuthTests(TestCase):
         todo = TodoList.objects.create(owner=self.user, name="TodoList Check", is_active=True)
         item = TodoItem.objects.create(
             owner=self.user,
-            todo=todo,
+            todo_list=todo,
             title="Hydration",
             weekday=0,
             is_active=True,
@@ -776,7 +1221,7 @@ class MobileApiAuthTests(TestCase):
         self.assertEqual(body["stats"]["done"], 0)
         self.assertEqual(body["stats"]["skipped"], 1)
 
-        check = TodoRecurrence.objects.get(owner=self.user, item=item, week_start=week_start)
+        check = TodoRecurrence.objects.get(owner=self.user, todo_item=item, week_start=week_start)
         self.assertEqual(check.status, TodoRecurrence.Status.SKIPPED)
 
     def test_mobile_todos_item_crud(self):
@@ -840,6 +1285,54 @@ class MobileApiAuthTests(TestCase):
         self.assertEqual(delete_response.status_code, 200)
         self.assertFalse(TodoItem.objects.filter(id=item.id).exists())
 
+    def test_mobile_todos_batch_applies_operations_in_order(self):
+        todo_list = TodoList.objects.create(owner=self.user, name="Lista batch", is_active=True)
+        existing = TodoItem.objects.create(owner=self.user, todo_list=todo_list, title="Esistente", weekday=0)
+        week_start = timezone.localdate() - timedelta(days=timezone.localdate().weekday())
+        access = self._login()["access_token"]
+
+        response = self.client.post(
+            "/api/mobile/todos/batch",
+            data=json.dumps(
+                {
+                    "week": week_start.isoformat(),
+                    "operations": [
+                        {"op": "create", "ref": "tmp-1", "todo_id": todo_list.id, "title": "Offline", "weekday": 4},
+                        {"op": "check", "item_ref": "tmp-1", "status": "done", "week": week_start.isoformat()},
+                        {"op": "update", "item_id": 999999, "todo_id": todo_list.id, "title": "Fantasma"},
+                        {"op": "delete", "item_id": existing.id},
+                        {"op": "rename"},
+                    ],
+                }
+            ),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {access}",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        created = TodoItem.objects.get(owner=self.user, title="Offline")
+        self.assertEqual(body["applied"], 3)
+        self.assertEqual(body["failed"], 2)
+        self.assertEqual(body["results"][0], {"index": 0, "ref": "tmp-1", "ok": True, "item_id": created.id})
+        self.assertEqual(body["results"][1]["item_id"], created.id)
+        self.assertEqual(body["results"][2]["error"], "item_not_found")
+        self.assertEqual(body["results"][4]["error"], "invalid_operation")
+        self.assertFalse(TodoItem.objects.filter(id=existing.id).exists())
+        self.assertEqual(body["stats"], {"planned": 0, "done": 1, "skipped": 0})
+
+    def test_mobile_todos_batch_rejects_oversized_payload(self):
+        access = self._login()["access_token"]
+        with self.settings(MOBILE_API_BATCH_MAX_OPERATIONS=2):
+            response = self.client.post(
+                "/api/mobile/todos/batch",
+                data=json.dumps({"operations": [{"op": "delete", "item_id": 1}] * 3}),
+                content_type="application/json",
+                HTTP_AUTHORIZATION=f"Bearer {access}",
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "too_many_operations")
+
     def test_unified_todos_api_accepts_session_auth(self):
         self.client.login(username="mobile_user", password="test12345")
         todo = TodoList.objects.create(owner=self.user, name="TodoList Session", is_active=True)
@@ -924,6 +1417,192 @@ class MobileApiAuthTests(TestCase):
         self.assertTrue(body["ok"])
         self.assertEqual(body["stats"]["total"], 1)
 
+    def test_projects_api_answers_if_none_match_with_304(self):
+        from projects.models import Project, SubProject
+
+        project = Project.objects.create(owner=self.user, name="Project ETag", is_archived=False)
+        payload = self._login()
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {payload['access_token']}"}
+
+        first = self.client.get("/api/mobile/projects", **auth)
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+        self.assertTrue(etag)
+
+        cached = self.client.get("/api/projects", HTTP_IF_NONE_MATCH=etag, **auth)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], etag)
+        self.assertEqual(cached.content, b"")
+
+        SubProject.objects.create(owner=self.user, project=project, title="Nuova milestone")
+        changed = self.client.get("/api/projects", HTTP_IF_NONE_MATCH=etag, **auth)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertEqual(changed.json()["items"][0]["subprojects_total"], 1)
+
+    def test_agenda_etag_depends_on_requested_range(self):
+        self.client.login(username="mobile_user", password="test12345")
+        today = timezone.localdate()
+        week = self.client.get(f"/api/agenda?start={today.isoformat()}&duration=7")
+        month = self.client.get(
+            f"/api/agenda?start={today.isoformat()}&duration=30",
+            HTTP_IF_NONE_MATCH=week["ETag"],
+        )
+        self.assertEqual(month.status_code, 200)
+        self.assertNotEqual(month["ETag"], week["ETag"])
+
+    def test_agenda_api_serves_year_view_with_keyset_pages(self):
+        from agenda.models import AgendaItem
+
+        start = timezone.localdate()
+        late = AgendaItem.objects.create(owner=self.user, title="Fine anno", due_date=start + timedelta(days=300))
+        timed = AgendaItem.objects.create(
+            owner=self.user,
+            title="Call",
+            due_date=start,
+            due_time=time(9, 0),
+            item_type=AgendaItem.ItemType.REMINDER,
+        )
+        all_day = AgendaItem.objects.create(owner=self.user, title="Tutto il giorno", due_date=start)
+        self.client.login(username="mobile_user", password="test12345")
+        query = f"start={start.isoformat()}&duration=365"
+
+        full = self.client.get(f"/api/agenda?{query}")
+        self.assertTrue(full.streaming)
+        body = _json_body(full)
+        self.assertEqual(body["range_end"], (start + timedelta(days=364)).isoformat())
+        self.assertEqual([row["id"] for row in body["items"]], [all_day.id, timed.id, late.id])
+
+        first = self.client.get(f"/api/agenda?{query}&limit=2").json()
+        self.assertEqual([row["id"] for row in first["items"]], [all_day.id, timed.id])
+        self.assertEqual(first["stats"]["total"], 3)
+        self.assertEqual(first["stats"]["reminders"], 1)
+        second = self.client.get(f"/api/agenda?{query}&limit=2&after={first['next_after']}").json()
+        self.assertEqual([row["id"] for row in second["items"]], [late.id])
+        self.assertFalse(second["has_more"])
+
+    def test_projects_api_paginates_with_keyset_cursor(self):
+        from projects.models import Project, SubProject
+
+        alpha = Project.objects.create(owner=self.user, name="Alpha", is_archived=False)
+        Project.objects.create(owner=self.user, name="Beta", is_archived=False)
+        Project.objects.create(owner=self.user, name="Archivio", is_archived=True)
+        SubProject.objects.create(owner=self.user, project=alpha, title="Fatto", status=SubProject.Status.DONE)
+        SubProject.objects.create(owner=self.user, project=alpha, title="Fermo", status=SubProject.Status.BLOCKED)
+        self.client.login(username="mobile_user", password="test12345")
+
+        first = self.client.get("/api/projects?limit=2").json()
+        self.assertEqual([row["name"] for row in first["items"]], ["Alpha", "Beta"])
+        self.assertTrue(first["has_more"])
+        self.assertEqual(
+            (first["items"][0]["subprojects_total"], first["items"][0]["subprojects_done"],
+             first["items"][0]["subprojects_blocked"]),
+            (2, 1, 1),
+        )
+        self.assertEqual(first["stats"], {"total": 3, "active": 2, "archived": 1})
+
+        second = self.client.get(f"/api/projects?limit=2&after={first['next_after']}").json()
+        self.assertEqual([row["name"] for row in second["items"]], ["Archivio"])
+        self.assertFalse(second["has_more"])
+        self.assertIsNone(second["next_after"])
+
+        invalid = self.client.get("/api/projects?limit=2&after=not-a-cursor")
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(invalid.json()["error"], "invalid_after")
+
+    def test_projects_export_streams_full_listing(self):
+        from projects.models import Project
+
+        for index in range(3):
+            Project.objects.create(owner=self.user, name=f"Export {index}", is_archived=index == 2)
+        access = self._login()["access_token"]
+
+        response = self.client.get("/api/mobile/projects/export", HTTP_AUTHORIZATION=f"Bearer {access}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn("ETag", response)
+        body = _json_body(response)
+        self.assertEqual([row["name"] for row in body["items"]], ["Export 0", "Export 1", "Export 2"])
+        self.assertEqual(body["stats"], {"total": 3, "active": 2, "archived": 1})
+
+    @patch("core.sync.SYNC_CURSOR_OVERLAP", timedelta(0))
+    def test_projects_delta_sync_returns_changes_and_tombstones(self):
+        from projects.models import Project, SubProject
+
+        kept = Project.objects.create(owner=self.user, name="Project kept", is_archived=False)
+        removed = Project.objects.create(owner=self.user, name="Project removed", is_archived=False)
+        self.client.login(username="mobile_user", password="test12345")
+        full = self.client.get("/api/mobile/projects", HTTP_AUTHORIZATION=f"Bearer {self._login()['access_token']}")
+        self.assertEqual(full.status_code, 200)
+        self.assertFalse(full.json()["delta"])
+        cursor = full.json()["next_cursor"]
+
+        SubProject.objects.create(owner=self.user, project=kept, title="Milestone")
+        removed_id = removed.id
+        removed.delete()
+
+        delta = self.client.get(f"/api/projects?since={cursor}")
+        self.assertEqual(delta.status_code, 200)
+        body = delta.json()
+        self.assertTrue(body["delta"])
+        self.assertEqual([row["id"] for row in body["items"]], [kept.id])
+        self.assertEqual(body["items"][0]["subprojects_total"], 1)
+        self.assertEqual(body["deleted_ids"], [removed_id])
+        self.assertEqual(body["stats"]["total"], 1)
+
+    @patch("core.sync.SYNC_CURSOR_OVERLAP", timedelta(0))
+    def test_agenda_delta_sync_reports_items_moved_out_of_range(self):
+        from agenda.models import AgendaItem
+
+        today = timezone.localdate()
+        moved = AgendaItem.objects.create(owner=self.user, title="Call", due_date=today)
+        AgendaItem.objects.create(owner=self.user, title="Untouched", due_date=today)
+        self.client.login(username="mobile_user", password="test12345")
+        query = f"start={today.isoformat()}&duration=7"
+        cursor = _json_body(self.client.get(f"/api/agenda?{query}"))["next_cursor"]
+
+        moved.due_date = today + timedelta(days=60)
+        moved.save()
+        added = AgendaItem.objects.create(owner=self.user, title="Nuova", due_date=today + timedelta(days=1))
+
+        body = _json_body(self.client.get(f"/api/agenda?{query}&since={cursor}"))
+        self.assertEqual([row["id"] for row in body["items"]], [added.id])
+        self.assertEqual(body["deleted_ids"], [moved.id])
+        self.assertEqual(body["stats"]["total"], 2)
+
+    @patch("core.sync.SYNC_CURSOR_OVERLAP", timedelta(0))
+    def test_todos_delta_sync_tracks_checks_and_deactivations(self):
+        todo_list = TodoList.objects.create(owner=self.user, name="Lista delta", is_active=True)
+        checked = TodoItem.objects.create(owner=self.user, todo_list=todo_list, title="Check", weekday=0)
+        disabled = TodoItem.objects.create(owner=self.user, todo_list=todo_list, title="Off", weekday=1)
+        TodoItem.objects.create(owner=self.user, todo_list=todo_list, title="Quiet", weekday=2)
+        week_start = timezone.localdate() - timedelta(days=timezone.localdate().weekday())
+        self.client.login(username="mobile_user", password="test12345")
+        full = self.client.get(f"/api/todos?week={week_start.isoformat()}").json()
+        self.assertEqual(len(full["items"]), 3)
+
+        TodoRecurrence.objects.create(
+            owner=self.user,
+            todo_item=checked,
+            week_start=week_start,
+            status=TodoRecurrence.Status.DONE,
+        )
+        disabled.is_active = False
+        disabled.save()
+
+        body = self.client.get(f"/api/todos?week={week_start.isoformat()}&since={full['next_cursor']}").json()
+        self.assertEqual([(row["id"], row["status"]) for row in body["items"]], [(checked.id, "DONE")])
+        self.assertEqual(body["deleted_ids"], [disabled.id])
+        self.assertEqual(body["stats"], {"planned": 1, "done": 1, "skipped": 0})
+
+    def test_delta_sync_rejects_foreign_cursor(self):
+        self.client.login(username="mobile_user", password="test12345")
+        cursor = _json_body(self.client.get("/api/agenda"))["next_cursor"]
+        response = self.client.get(f"/api/projects?since={cursor}")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "invalid_cursor")
+
     def test_unified_agenda_api_accepts_bearer_auth(self):
         from agenda.models import AgendaItem
 
@@ -942,7 +1621,7 @@ class MobileApiAuthTests(TestCase):
             HTTP_AUTHORIZATION=f"Bearer {access}",
         )
         self.assertEqual(response.status_code, 200)
-        body = response.json()
+        body = _json_body(response)
         self.assertTrue(body["ok"])
         self.assertEqual(body["stats"]["total"], 1)
         self.assertEqual(body["stats"]["reminders"], 1)
@@ -961,7 +1640,30 @@ class MobileApiAuthTests(TestCase):
         self.client.login(username="mobile_user", password="test12345")
         response = self.client.get("/api/agenda")
         self.assertEqual(response.status_code, 200)
-        body = response.json()
+        body = _json_body(response)
         self.assertTrue(body["ok"])
         self.assertEqual(body["stats"]["total"], 1)
         self.assertEqual(body["stats"]["activities"], 1)
+
+
+class UserDeletionTests(TestCase):
+    def setUp(self):
+        from projects.models import Project, SubProject
+
+        self.user = get_user_model().objects.create_user(username="leaving_user", password="test12345")
+        todo_list = TodoList.objects.create(owner=self.user, name="Lista", is_active=True)
+        TodoItem.objects.create(owner=self.user, todo_list=todo_list, title="Voce", weekday=1)
+        TodoItem.objects.create(owner=self.user, title="Attivita", is_standalone=True)
+        project = Project.objects.create(owner=self.user, name="Progetto")
+        SubProject.objects.create(owner=self.user, project=project, title="Milestone")
+        AgendaItem.objects.create(owner=self.user, title="Call", due_date=timezone.localdate())
+
+    def test_deleting_user_with_owned_data_keeps_foreign_keys_valid(self):
+        user_id = self.user.id
+        with transaction.atomic():
+            self.user.delete()
+            # Come al commit: nessuna riga creata dai signal deve puntare all'utente cancellato.
+            connection.check_constraints()
+
+        self.assertFalse(SyncTombstone.objects.filter(owner_id=user_id).exists())
+        self.assertFalse(ApiResourceVersion.objects.filter(user_id=user_id).exists())
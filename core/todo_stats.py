@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from todos.models import TodoItem, TodoList, TodoRecurrence
+
+from .models import TodoWeekStats
+
+STATUS_FIELDS = {
+    TodoRecurrence.Status.PLANNED: "planned",
+    TodoRecurrence.Status.DONE: "done",
+    TodoRecurrence.Status.SKIPPED: "skipped",
+}
+VISIBLE_RECURRENCES = Q(todo_item__is_active=True, todo_item__todo_list__is_active=True)
+
+
+def bump_todo_week_stats(owner_id, week_start, status, delta: int = 1) -> None:
+    field = STATUS_FIELDS.get(status)
+    if not owner_id or not week_start or not field or not delta:
+        return
+    rows = TodoWeekStats.objects.filter(owner_id=owner_id, week_start=week_start)
+    if rows.update(**{field: F(field) + delta}) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            TodoWeekStats.objects.create(owner_id=owner_id, week_start=week_start, **{field: delta})
+    except IntegrityError:
+        rows.update(**{field: F(field) + delta})
+
+
+def todo_week_stats(owner_id, week_start: date) -> dict:
+    """Contatori per stato dei check della settimana: una sola lookup su (owner, week_start)."""
+    row = (
+        TodoWeekStats.objects.filter(owner_id=owner_id, week_start=week_start)
+        .values("planned", "done", "skipped")
+        .first()
+    )
+    return row or {"planned": 0, "done": 0, "skipped": 0}
+
+
+def _item_visible(todo_item_id) -> bool:
+    row = TodoItem.objects.filter(pk=todo_item_id).values_list("is_active", "todo_list__is_active").first()
+    return bool(row and row[0] and row[1])
+
+
+def _recurrence_key(owner_id, week_start, status):
+    week_start = TodoRecurrence._meta.get_field("week_start").to_python(week_start)
+    return owner_id, week_start, status
+
+
+def track_previous_week_stats_key(sender, instance, raw=False, **kwargs):
+    instance._todo_week_stats_previous = None
+    instance._todo_week_stats_visible = False
+    if raw:
+        return
+    previous = None
+    if not instance._state.adding and instance.pk is not None:
+        previous = (
+            TodoRecurrence.objects.filter(pk=instance.pk)
+            .values(
+                "owner_id",
+                "week_start",
+                "status",
+                "todo_item_id",
+                "todo_item__is_active",
+                "todo_item__todo_list__is_active",
+            )
+            .first()
+        )
+    if previous is None:
+        instance._todo_week_stats_visible = _item_visible(instance.todo_item_id)
+        return
+    # Una sola SELECT: stato precedente e visibilita della voce (invariata se la voce non cambia).
+    visible = bool(previous["todo_item__is_active"] and previous["todo_item__todo_list__is_active"])
+    if visible:
+        instance._todo_week_stats_previous = _recurrence_key(
+            previous["owner_id"], previous["week_start"], previous["status"]
+        )
+    if previous["todo_item_id"] != instance.todo_item_id:
+        visible = _item_visible(instance.todo_item_id)
+    instance._todo_week_stats_visible = visible
+
+
+def apply_week_stats_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_todo_week_stats_previous", None)
+    current = None
+    if getattr(instance, "_todo_week_stats_visible", False):
+        current = _recurrence_key(instance.owner_id, instance.week_start, instance.status)
+    if previous != current:
+        if previous:
+            bump_todo_week_stats(*previous, delta=-1)
+        if current:
+            bump_todo_week_stats(*current, delta=1)
+
+
+def apply_week_stats_on_delete(sender, instance, **kwargs):
+    # Nelle cancellazioni a cascata la voce e' ancora presente quando parte questo signal.
+    if _item_visible(instance.todo_item_id):
+        bump_todo_week_stats(instance.owner_id, instance.week_start, instance.status, delta=-1)
+
+
+def track_previous_visibility(sender, instance, raw=False, **kwargs):
+    instance._todo_week_stats_visibility = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if sender is TodoItem:
+        instance._todo_week_stats_visibility = (
+            TodoItem.objects.filter(pk=instance.pk).values_list("is_active", "todo_list_id").first()
+        )
+    else:
+        instance._todo_week_stats_visibility = (
+            TodoList.objects.filter(pk=instance.pk).values_list("is_active", flat=True).first()
+        )
+
+
+def repair_week_stats_on_visibility_change(sender, instance, raw=False, created=False, **kwargs):
+    previous = getattr(instance, "_todo_week_stats_visibility", None)
+    if raw or created or previous is None:
+        return
+    if sender is TodoItem:
+        if previous == (instance.is_active, instance.todo_list_id):
+            return
+        recurrences = TodoRecurrence.objects.filter(todo_item=instance)
+    else:
+        if previous == instance.is_active:
+            return
+        recurrences = TodoRecurrence.objects.filter(todo_item__todo_list=instance)
+    # Evento raro: si ricalcolano solo le settimane che contengono check della voce/lista.
+    week_starts = set(recurrences.values_list("week_start", flat=True))
+    if week_starts:
+        rebuild_todo_week_stats(owner_ids=[instance.owner_id], week_starts=week_starts)
+
+
+def rebuild_todo_week_stats(*, owner_ids=None, week_starts=None) -> int:
+    """Ricalcola da zero i contatori (tutti o filtrati per owner/settimane). Restituisce le righe scritte."""
+    with transaction.atomic():
+        existing = TodoWeekStats.objects.all()
+        recurrences = TodoRecurrence.objects.filter(VISIBLE_RECURRENCES)
+        if owner_ids is not None:
+            existing = existing.filter(owner_id__in=owner_ids)
+            recurrences = recurrences.filter(owner_id__in=owner_ids)
+        if week_starts is not None:
+            existing = existing.filter(week_start__in=week_starts)
+            recurrences = recurrences.filter(week_start__in=week_starts)
+        existing.delete()
+
+        totals = {}
+        for row in recurrences.values("owner_id", "week_start", "status").annotate(total=Count("id")).order_by():
+            field = STATUS_FIELDS.get(row["status"])
+            if field:
+                totals.setdefault((row["owner_id"], row["week_start"]), {})[field] = row["total"]
+        rows = [
+            TodoWeekStats(owner_id=owner_id, week_start=week_start, **counts)
+            for (owner_id, week_start), counts in totals.items()
+        ]
+        TodoWeekStats.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
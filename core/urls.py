@@ -1,26 +1,30 @@
 from django.urls import include, path
 
-from . import views
+from . import api_views, mobile_api_views, views
 
 urlpatterns = [
-    path("api/mobile/auth/login", views.mobile_auth_login, name="mobile-auth-login"),
-    path("api/mobile/auth/refresh", views.mobile_auth_refresh, name="mobile-auth-refresh"),
-    path("api/mobile/auth/logout", views.mobile_auth_logout, name="mobile-auth-logout"),
-    path("api/mobile/dashboard", views.mobile_dashboard, name="mobile-dashboard"),
-    path("api/mobile/todos", views.mobile_todos, name="mobile-todos"),
-    path("api/mobile/todos/check", views.mobile_todos_check, name="mobile-todos-check"),
-    path("api/mobile/todos/items/create", views.mobile_todos_item_create, name="mobile-todos-item-create"),
-    path("api/mobile/todos/items/update", views.mobile_todos_item_update, name="mobile-todos-item-update"),
-    path("api/mobile/todos/items/delete", views.mobile_todos_item_delete, name="mobile-todos-item-delete"),
-    path("api/todos", views.api_todos, name="api-todos"),
-    path("api/todos/check", views.api_todos_check, name="api-todos-check"),
-    path("api/todos/items/create", views.api_todos_item_create, name="api-todos-item-create"),
-    path("api/todos/items/update", views.api_todos_item_update, name="api-todos-item-update"),
-    path("api/todos/items/delete", views.api_todos_item_delete, name="api-todos-item-delete"),
-    path("api/projects", views.api_projects, name="api-projects"),
-    path("api/mobile/projects", views.mobile_projects, name="mobile-projects"),
-    path("api/agenda", views.api_agenda, name="api-agenda"),
-    path("api/mobile/agenda", views.mobile_agenda, name="mobile-agenda"),
+    path("api/mobile/auth/login", mobile_api_views.mobile_auth_login, name="mobile-auth-login"),
+    path("api/mobile/auth/refresh", mobile_api_views.mobile_auth_refresh, name="mobile-auth-refresh"),
+    path("api/mobile/auth/logout", mobile_api_views.mobile_auth_logout, name="mobile-auth-logout"),
+    path("api/mobile/dashboard", mobile_api_views.mobile_dashboard, name="mobile-dashboard"),
+    path("api/mobile/todos", mobile_api_views.mobile_todos, name="mobile-todos"),
+    path("api/mobile/todos/check", mobile_api_views.mobile_todos_check, name="mobile-todos-check"),
+    path("api/mobile/todos/items/create", mobile_api_views.mobile_todos_item_create, name="mobile-todos-item-create"),
+    path("api/mobile/todos/items/update", mobile_api_views.mobile_todos_item_update, name="mobile-todos-item-update"),
+    path("api/mobile/todos/items/delete", mobile_api_views.mobile_todos_item_delete, name="mobile-todos-item-delete"),
+    path("api/mobile/todos/batch", mobile_api_views.mobile_todos_batch, name="mobile-todos-batch"),
+    path("api/todos", api_views.api_todos, name="api-todos"),
+    path("api/todos/check", api_views.api_todos_check, name="api-todos-check"),
+    path("api/todos/items/create", api_views.api_todos_item_create, name="api-todos-item-create"),
+    path("api/todos/items/update", api_views.api_todos_item_update, name="api-todos-item-update"),
+    path("api/todos/items/delete", api_views.api_todos_item_delete, name="api-todos-item-delete"),
+    path("api/todos/batch", api_views.api_todos_batch, name="api-todos-batch"),
+    path("api/projects", api_views.api_projects, name="api-projects"),
+    path("api/projects/export", api_views.api_projects_export, name="api-projects-export"),
+    path("api/mobile/projects", mobile_api_views.mobile_projects, name="mobile-projects"),
+    path("api/mobile/projects/export", mobile_api_views.mobile_projects_export, name="mobile-projects-export"),
+    path("api/agenda", api_views.api_agenda, name="api-agenda"),
+    path("api/mobile/agenda", mobile_api_views.mobile_agenda, name="mobile-agenda"),
     path('', views.dashboard, name='core-dashboard'),
     path('dashboard/widgets', views.dashboard_widgets, name='core-dashboard-widgets'),
     path('dashboard/preferences', views.dashboard_preferences, name='core-dashboard-preferences'),
@@ -1,29 +1,20 @@
 from datetime import date, timedelta
-from decimal import Decimal
-import hashlib
 import json
 import logging
 import mimetypes
 import posixpath
 import re
-import secrets
-from types import SimpleNamespace
 from urllib.parse import quote, urljoin
 
 from django.conf import settings
 from django.contrib import messages as django_messages
-from django.contrib.auth import authenticate, get_user_model, login, logout as auth_logout
+from django.contrib.auth import login, logout as auth_logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView, PasswordChangeView
-from django.db.models import Count, Sum
-from django.db.models.functions import Coalesce
 from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.utils import timezone
-from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-from agenda.models import AgendaItem, WorkLog
 from .dav import (
     DavProvisioningError,
     caldav_base_url,
@@ -31,36 +22,24 @@ from .dav import (
     create_managed_calendar,
     ensure_user_dav_access,
     grant_external_access_to_calendar,
+    radicale_sync_batch,
     rotate_external_dav_password,
     set_calendar_grant_active,
     set_external_dav_account_active,
     set_managed_calendar_active,
 )
 from .forms import AccountForm, SignUpForm
+from .helpers import _calendar_events_for_range, _dashboard_snapshot_context
 from .models import (
     DavAccount,
     DavCalendarGrant,
     DavExternalAccount,
     DavManagedCalendar,
     DavTeam,
-    MobileApiSession,
     UserNavConfig,
 )
-from .navigation import DEFAULT_APP_OPTIONS, app_options_for_user, normalize_nav_config, parse_widgets_json
-from planner.models import PlannerItem
-from projects.models import Project, SubProject
-from todos.models import TodoList, TodoCategory, TodoRecurrence, TodoItem
-from todos.services import (
-    TodoListCrudError,
-    create_todo_item,
-    delete_todo_item,
-    get_category_for_owner,
-    get_todo_for_owner,
-    parse_weekday,
-    update_todo_item,
-)
+from .navigation import app_options_for_user, normalize_nav_config, parse_widgets_json
 from finance_hub.models import Account
-from finance_hub.models import SubscriptionOccurrence
 from transactions.models import Transaction
 
 logger = logging.getLogger(__name__)
@@ -311,176 +290,6 @@ def _dashboard_preferences_for_user(user):
     return _normalize_dashboard_preferences(raw.get("dashboard_preferences", {}))
 
 
-def _dashboard_snapshot_context(user):
-    today = date.today()
-    week_end = today + timedelta(days=7)
-    month_start = today.replace(day=1)
-    month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-
-    open_tasks_qs = TodoItem.objects.filter(owner=user).exclude(status=TodoItem.Status.DONE)
-    planned_planner_qs = PlannerItem.objects.filter(owner=user, status=PlannerItem.Status.PLANNED)
-    due_subs_qs = SubscriptionOccurrence.objects.filter(
-        owner=user,
-        due_date__range=(today, week_end),
-        state=SubscriptionOccurrence.State.PLANNED,
-    )
-
-    month_tx_qs = Transaction.objects.filter(owner=user, date__range=(month_start, month_end))
-    month_income = month_tx_qs.filter(tx_type=Transaction.Type.INCOME).aggregate(
-        total=Coalesce(Sum("amount"), Decimal("0.00"))
-    )["total"]
-    month_expense = month_tx_qs.filter(tx_type=Transaction.Type.EXPENSE).aggregate(
-        total=Coalesce(Sum("amount"), Decimal("0.00"))
-    )["total"]
-
-    focus_rows = []
-
-    for task in open_tasks_qs.filter(due_date__isnull=False).order_by("due_date", "title")[:4]:
-        focus_rows.append(
-            {
-                "kind": "Task",
-                "title": task.title,
-                "due_date": task.due_date,
-                "url": "/todos/",
-            }
-        )
-
-    for item in planned_planner_qs.filter(due_date__isnull=False).order_by("due_date", "title")[:4]:
-        focus_rows.append(
-            {
-                "kind": "Planner",
-                "title": item.title,
-                "due_date": item.due_date,
-                "url": "/planner/",
-            }
-        )
-
-    for occ in due_subs_qs.select_related("subscription").order_by("due_date", "subscription__name")[:4]:
-        focus_rows.append(
-            {
-                "kind": "Abbonamento",
-                "title": occ.subscription.name,
-                "due_date": occ.due_date,
-                "url": "/subs/",
-            }
-        )
-
-    focus_rows.sort(key=lambda row: (row["due_date"] is None, row["due_date"] or today, row["kind"], row["title"]))
-    focus_rows = focus_rows[:8]
-
-    return {
-        "snapshot": {
-            "open_tasks": open_tasks_qs.count(),
-            "tasks_today": open_tasks_qs.filter(due_date=today).count(),
-            "overdue_tasks": open_tasks_qs.filter(due_date__lt=today).count(),
-            "planner_planned": planned_planner_qs.count(),
-            "planner_today": planned_planner_qs.filter(due_date=today).count(),
-            "due_subscriptions_week": due_subs_qs.count(),
-            "month_income": month_income,
-            "month_expense": month_expense,
-            "month_balance": month_income - month_expense,
-            "month_transactions": month_tx_qs.count(),
-        },
-        "focus_rows": focus_rows,
-        "generated_on": today,
-    }
-
-
-def _calendar_events_for_range(user, start: date, end: date):
-    events = {}
-
-    def add_event(day, kind, label, count=None):
-        key = day.isoformat()
-        payload = {"kind": kind, "label": label}
-        if count is not None:
-            payload["count"] = count
-        events.setdefault(key, []).append(payload)
-
-    tasks = (
-        TodoItem.objects.filter(owner=user, due_date__range=(start, end))
-        .exclude(status=TodoItem.Status.DONE)
-        .values("due_date")
-        .annotate(count=Count("id"))
-    )
-    for row in tasks:
-        add_event(row["due_date"], "task", "Task", row["count"])
-
-    agenda_activities = (
-        AgendaItem.objects.filter(
-            owner=user,
-            due_date__range=(start, end),
-            item_type=AgendaItem.ItemType.ACTIVITY,
-            status=AgendaItem.Status.PLANNED,
-        )
-        .values("due_date")
-        .annotate(count=Count("id"))
-    )
-    for row in agenda_activities:
-        add_event(row["due_date"], "agenda_activity", "Agenda attivita", row["count"])
-
-    agenda_reminders = (
-        AgendaItem.objects.filter(
-            owner=user,
-            due_date__range=(start, end),
-            item_type=AgendaItem.ItemType.REMINDER,
-            status=AgendaItem.Status.PLANNED,
-        )
-        .values("due_date")
-        .annotate(count=Count("id"))
-    )
-    for row in agenda_reminders:
-        add_event(row["due_date"], "agenda_reminder", "Agenda reminder", row["count"])
-
-    planner = (
-        PlannerItem.objects.filter(owner=user, due_date__range=(start, end), status=PlannerItem.Status.PLANNED)
-        .values("due_date")
-        .annotate(count=Count("id"))
-    )
-    for row in planner:
-        add_event(row["due_date"], "planner", "Planner", row["count"])
-
-    subs = (
-        SubscriptionOccurrence.objects.filter(owner=user, due_date__range=(start, end))
-        .values("due_date")
-        .annotate(count=Count("id"))
-    )
-    for row in subs:
-        add_event(row["due_date"], "subscription", "Abbonamenti", row["count"])
-
-    tx = (
-        Transaction.objects.filter(owner=user, date__range=(start, end))
-        .values("date")
-        .annotate(count=Count("id"))
-    )
-    for row in tx:
-        add_event(row["date"], "transaction", "Transazioni", row["count"])
-
-    work_logs = (
-        WorkLog.objects.filter(owner=user, work_date__range=(start, end))
-        .values("work_date")
-        .annotate(total_hours=Sum("hours"))
-    )
-    for row in work_logs:
-        if row["total_hours"]:
-            add_event(row["work_date"], "worklog", "Ore lavoro", 1)
-
-    todo_counts = (
-        TodoItem.objects.filter(owner=user, is_active=True)
-        .values("weekday")
-        .annotate(count=Count("id"))
-    )
-    todo_map = {row["weekday"]: row["count"] for row in todo_counts}
-    if todo_map:
-        cursor = start
-        while cursor <= end:
-            count = todo_map.get(cursor.weekday())
-            if count:
-                add_event(cursor, "todo", "TodoList", count)
-            cursor += timedelta(days=1)
-
-    return events
-
-
 @login_required
 def dashboard(request):
     context = {
@@ -966,13 +775,24 @@ def _handle_dav_actions(request, action: str, *, redirect_base: str):
     return None
 
 
+def _handle_dav_actions_batched(request, action: str, *, redirect_base: str):
+    # Il rebuild Radicale di fine batch gira dopo il commit delle azioni: un suo errore va
+    # riportato all'utente come gli altri errori DAV, non come 500.
+    try:
+        with radicale_sync_batch():
+            return _handle_dav_actions(request, action, redirect_base=redirect_base)
+    except DavProvisioningError as exc:
+        django_messages.error(request, f"Sincronizzazione Radicale fallita: {exc}")
+        return redirect(f"{redirect_base}#dav-access")
+
+
 @login_required
 def profile(request):
     if request.method == "POST":
         action = (request.POST.get("action") or "").strip()
 
         if action == "rotate_dav_password" or action.startswith("dav_"):
-            dav_response = _handle_dav_actions(request, action, redirect_base="/profile/dav/")
+            dav_response = _handle_dav_actions_batched(request, action, redirect_base="/profile/dav/")
             if dav_response is not None:
                 return dav_response
 
@@ -990,7 +810,7 @@ def profile(request):
 def dav_management(request):
     if request.method == "POST":
         action = (request.POST.get("action") or "").strip()
-        dav_response = _handle_dav_actions(request, action, redirect_base="/profile/dav/")
+        dav_response = _handle_dav_actions_batched(request, action, redirect_base="/profile/dav/")
         if dav_response is not None:
             return dav_response
 
@@ -1160,751 +980,3 @@ def remove_account(request):
             return redirect("/core/accounts/")
     accounts_list = Account.objects.filter(owner=request.user).order_by("name")[:20]
     return render(request, "core/remove_account.html", {"account": account, "accounts": accounts_list})
-
-
-def _mobile_json_error(error: str, status: int = 400):
-    return JsonResponse({"ok": False, "error": error}, status=status)
-
-
-def _mobile_parse_json(request):
-    try:
-        payload = json.loads((request.body or b"{}").decode("utf-8"))
-    except (json.JSONDecodeError, UnicodeDecodeError):
-        return None
-    return payload if isinstance(payload, dict) else None
-
-
-def _mobile_hash_token(token: str) -> str:
-    return hashlib.sha256(token.encode("utf-8")).hexdigest()
-
-
-def _mobile_access_ttl_seconds() -> int:
-    raw = int(getattr(settings, "MOBILE_API_ACCESS_TTL_SECONDS", 900) or 900)
-    return max(raw, 60)
-
-
-def _mobile_refresh_ttl_days() -> int:
-    raw = int(getattr(settings, "MOBILE_API_REFRESH_TTL_DAYS", 14) or 14)
-    return max(raw, 1)
-
-
-def _mobile_client_ip(request) -> str:
-    forwarded = (request.headers.get("X-Forwarded-For") or "").split(",")[0].strip()
-    if forwarded:
-        return forwarded
-    return (request.META.get("REMOTE_ADDR") or "").strip()
-
-
-def _mobile_issue_tokens():
-    return secrets.token_urlsafe(32), secrets.token_urlsafe(48)
-
-
-def _mobile_create_session(user, request, device_label: str = ""):
-    access_token, refresh_token = _mobile_issue_tokens()
-    now = timezone.now()
-    session = MobileApiSession.objects.create(
-        user=user,
-        access_token_hash=_mobile_hash_token(access_token),
-        refresh_token_hash=_mobile_hash_token(refresh_token),
-        access_expires_at=now + timedelta(seconds=_mobile_access_ttl_seconds()),
-        refresh_expires_at=now + timedelta(days=_mobile_refresh_ttl_days()),
-        device_label=(device_label or "")[:120],
-        user_agent=(request.headers.get("User-Agent") or "")[:255],
-        ip_address=_mobile_client_ip(request) or None,
-    )
-    return session, access_token, refresh_token
-
-
-def _mobile_payload(user, access_token: str, refresh_token: str, session: MobileApiSession):
-    return {
-        "ok": True,
-        "access_token": access_token,
-        "access_expires_at": session.access_expires_at.isoformat(),
-        "refresh_token": refresh_token,
-        "refresh_expires_at": session.refresh_expires_at.isoformat(),
-        "user": {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-        },
-    }
-
-
-def _mobile_bearer_token(request) -> str:
-    header = (request.headers.get("Authorization") or "").strip()
-    if not header.lower().startswith("bearer "):
-        return ""
-    return header[7:].strip()
-
-
-def _mobile_authenticate_request(request):
-    token = _mobile_bearer_token(request)
-    if not token:
-        return None, _mobile_json_error("missing_bearer_token", status=401)
-
-    now = timezone.now()
-    session = (
-        MobileApiSession.objects.select_related("user")
-        .filter(
-            access_token_hash=_mobile_hash_token(token),
-            revoked_at__isnull=True,
-            access_expires_at__gt=now,
-        )
-        .first()
-    )
-    if not session:
-        return None, _mobile_json_error("invalid_or_expired_access_token", status=401)
-
-    session.last_used_at = now
-    session.save(update_fields=["last_used_at", "updated_at"])
-    return session, None
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def mobile_auth_login(request):
-    payload = _mobile_parse_json(request)
-    if payload is None:
-        return _mobile_json_error("invalid_json", status=400)
-
-    identity = (payload.get("identity") or payload.get("email") or payload.get("username") or "").strip()
-    password = (payload.get("password") or "").strip()
-    device_label = (payload.get("device_label") or "").strip()
-
-    if not identity or not password:
-        return _mobile_json_error("missing_credentials", status=400)
-
-    user_model = get_user_model()
-    user_by_email = user_model.objects.filter(email__iexact=identity).first()
-    auth_username = user_by_email.username if user_by_email else identity
-    user = authenticate(request, username=auth_username, password=password)
-    if not user or not user.is_active:
-        return _mobile_json_error("invalid_credentials", status=401)
-
-    if settings.CALDAV_ENABLED:
-        try:
-            ensure_user_dav_access(user, raw_password=password)
-        except DavProvisioningError as exc:
-            logger.warning("DAV sync failed during mobile login for user=%s: %s", user.id, exc)
-
-    session, access_token, refresh_token = _mobile_create_session(user, request, device_label=device_label)
-    return JsonResponse(_mobile_payload(user, access_token, refresh_token, session))
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def mobile_auth_refresh(request):
-    payload = _mobile_parse_json(request)
-    if payload is None:
-        return _mobile_json_error("invalid_json", status=400)
-
-    refresh_token = (payload.get("refresh_token") or "").strip()
-    if not refresh_token:
-        return _mobile_json_error("missing_refresh_token", status=400)
-
-    now = timezone.now()
-    session = (
-        MobileApiSession.objects.select_related("user")
-        .filter(
-            refresh_token_hash=_mobile_hash_token(refresh_token),
-            revoked_at__isnull=True,
-            refresh_expires_at__gt=now,
-        )
-        .first()
-    )
-    if not session:
-        return _mobile_json_error("invalid_or_expired_refresh_token", status=401)
-
-    access_token, new_refresh_token = _mobile_issue_tokens()
-    session.access_token_hash = _mobile_hash_token(access_token)
-    session.refresh_token_hash = _mobile_hash_token(new_refresh_token)
-    session.access_expires_at = now + timedelta(seconds=_mobile_access_ttl_seconds())
-    session.refresh_expires_at = now + timedelta(days=_mobile_refresh_ttl_days())
-    session.last_used_at = now
-    session.save(
-        update_fields=[
-            "access_token_hash",
-            "refresh_token_hash",
-            "access_expires_at",
-            "refresh_expires_at",
-            "last_used_at",
-            "updated_at",
-        ]
-    )
-
-    return JsonResponse(_mobile_payload(session.user, access_token, new_refresh_token, session))
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def mobile_auth_logout(request):
-    payload = _mobile_parse_json(request)
-    if payload is None:
-        payload = {}
-
-    now = timezone.now()
-    session = None
-    access_token = _mobile_bearer_token(request)
-    if access_token:
-        session = (
-            MobileApiSession.objects.filter(
-                access_token_hash=_mobile_hash_token(access_token),
-                revoked_at__isnull=True,
-            )
-            .order_by("-id")
-            .first()
-        )
-
-    if not session:
-        refresh_token = (payload.get("refresh_token") or "").strip()
-        if refresh_token:
-            session = (
-                MobileApiSession.objects.filter(
-                    refresh_token_hash=_mobile_hash_token(refresh_token),
-                    revoked_at__isnull=True,
-                )
-                .order_by("-id")
-                .first()
-            )
-
-    if session:
-        session.revoked_at = now
-        session.save(update_fields=["revoked_at", "updated_at"])
-
-    return JsonResponse({"ok": True})
-
-
-@require_http_methods(["GET"])
-def mobile_dashboard(request):
-    session, error = _mobile_authenticate_request(request)
-    if error:
-        return error
-
-    snapshot_context = _dashboard_snapshot_context(session.user)
-    snapshot = snapshot_context["snapshot"]
-    today = date.today()
-    events = []
-    for row in snapshot_context["focus_rows"][:8]:
-        due_date = row.get("due_date")
-        events.append(
-            {
-                "kind": row.get("kind"),
-                "title": row.get("title"),
-                "due_date": due_date.isoformat() if due_date else "",
-                "url": row.get("url", ""),
-                "warn": bool(due_date and due_date < today),
-            }
-        )
-
-    return JsonResponse(
-        {
-            "ok": True,
-            "synced_at": timezone.now().isoformat(),
-            "metrics": {
-                "open_tasks": snapshot["open_tasks"],
-                "planner_queue": snapshot["planner_planned"],
-                "alerts_open": snapshot["overdue_tasks"],
-                "due_subscriptions_week": snapshot["due_subscriptions_week"],
-            },
-            "snapshot": {
-                "tasks_today": snapshot["tasks_today"],
-                "month_transactions": snapshot["month_transactions"],
-                "month_income": snapshot["month_income"],
-                "month_expense": snapshot["month_expense"],
-                "month_balance": snapshot["month_balance"],
-            },
-            "events": events,
-            "user": {
-                "id": session.user.id,
-                "username": session.user.username,
-                "email": session.user.email,
-            },
-        }
-    )
-
-
-def _mobile_week_start_for(value: str | None) -> date:
-    today = date.today()
-    if value:
-        try:
-            parsed = date.fromisoformat(value)
-            return parsed - timedelta(days=parsed.weekday())
-        except ValueError:
-            pass
-    return today - timedelta(days=today.weekday())
-
-
-def _mobile_todos_stats_from_items(items, check_map):
-    planned = 0
-    done = 0
-    skipped = 0
-    for item in items:
-        check = check_map.get(item.id)
-        status = check.status if check else TodoRecurrence.Status.PLANNED
-        if status == TodoRecurrence.Status.DONE:
-            done += 1
-        elif status == TodoRecurrence.Status.SKIPPED:
-            skipped += 1
-        else:
-            planned += 1
-    return {"planned": planned, "done": done, "skipped": skipped}
-
-
-def _api_authenticate_request(request):
-    token = _mobile_bearer_token(request)
-    if token:
-        return _mobile_authenticate_request(request)
-    if request.user.is_authenticated:
-        return SimpleNamespace(user=request.user), None
-    return None, _mobile_json_error("authentication_required", status=401)
-
-
-def _todos_response_for_user(user, week_value: str | None):
-    week_start = _mobile_week_start_for(week_value)
-    week_end = week_start + timedelta(days=6)
-    items = (
-        TodoItem.objects.filter(owner=user, is_active=True, todo__is_active=True)
-        .select_related("todo", "category", "project")
-        .order_by("weekday", "time_start", "time_end", "title")
-    )
-    checks = TodoRecurrence.objects.filter(owner=user, week_start=week_start, item__in=items)
-    check_map = {check.item_id: check for check in checks}
-
-    payload_items = []
-    for item in items:
-        check = check_map.get(item.id)
-        payload_items.append(
-            {
-                "id": item.id,
-                "title": item.title,
-                "weekday": item.weekday,
-                "weekday_label": item.get_weekday_display(),
-                "time_start": item.time_start.strftime("%H:%M") if item.time_start else "",
-                "time_end": item.time_end.strftime("%H:%M") if item.time_end else "",
-                "note": item.note or "",
-                "todo_id": item.todo_id,
-                "container": item.todo.name,
-                "category_id": item.category_id or "",
-                "category": item.category.name if item.category_id else "",
-                "project": item.project.name if item.project_id else "",
-                "status": check.status if check else TodoRecurrence.Status.PLANNED,
-            }
-        )
-
-    stats = _mobile_todos_stats_from_items(items, check_map)
-    return JsonResponse(
-        {
-            "ok": True,
-            "synced_at": timezone.now().isoformat(),
-            "week_start": week_start.isoformat(),
-            "week_end": week_end.isoformat(),
-            "stats": stats,
-            "items": payload_items,
-            "containers": list(
-                TodoList.objects.filter(owner=user, is_active=True)
-                .order_by("name")
-                .values("id", "name")
-            ),
-            "categories": list(
-                TodoCategory.objects.filter(owner=user, is_active=True)
-                .order_by("name")
-                .values("id", "name")
-            ),
-        }
-    )
-
-
-def _todos_check_for_user(user, payload):
-    item_id = payload.get("item_id")
-    status = (payload.get("status") or "").strip().upper()
-    week_start = _mobile_week_start_for(payload.get("week"))
-
-    allowed_statuses = {TodoRecurrence.Status.PLANNED, TodoRecurrence.Status.DONE, TodoRecurrence.Status.SKIPPED}
-    if status not in allowed_statuses:
-        return _mobile_json_error("invalid_status", status=400)
-
-    item = TodoItem.objects.filter(owner=user, id=item_id).first()
-    if not item:
-        return _mobile_json_error("item_not_found", status=404)
-
-    check, _created = TodoRecurrence.objects.get_or_create(
-        owner=user,
-        item=item,
-        week_start=week_start,
-        defaults={"status": TodoRecurrence.Status.PLANNED},
-    )
-    check.status = status
-    check.save(update_fields=["status", "updated_at"])
-
-    active_items = list(
-        TodoItem.objects.filter(owner=user, is_active=True, todo__is_active=True).only("id")
-    )
-    active_checks = TodoRecurrence.objects.filter(owner=user, week_start=week_start, item__in=active_items)
-    active_check_map = {row.item_id: row for row in active_checks}
-    stats = _mobile_todos_stats_from_items(active_items, active_check_map)
-    return JsonResponse(
-        {
-            "ok": True,
-            "item_id": item.id,
-            "status": check.status,
-            "stats": stats,
-            "week_start": week_start.isoformat(),
-        }
-    )
-
-
-def _todos_item_create_for_user(user, payload):
-    try:
-        todo = get_todo_for_owner(
-            owner=user,
-            todo_id=payload.get("todo_id"),
-            active_only=True,
-        )
-        category = get_category_for_owner(
-            owner=user,
-            category_id=payload.get("category_id"),
-            active_only=True,
-        )
-        item = create_todo_item(
-            owner=user,
-            todo=todo,
-            category=category,
-            title=payload.get("title"),
-            weekday=parse_weekday(payload.get("weekday")),
-            time_start=payload.get("time_start"),
-            time_end=payload.get("time_end"),
-            note=payload.get("note"),
-            is_active=True,
-        )
-    except TodoListCrudError as error:
-        code = error.code
-        if code in {"todo_not_found", "category_not_found"}:
-            return _mobile_json_error(code, status=404)
-        return _mobile_json_error(code, status=400)
-
-    return JsonResponse({"ok": True, "item_id": item.id})
-
-
-def _todos_item_update_for_user(user, payload):
-    item_id = payload.get("item_id")
-    item = TodoItem.objects.filter(owner=user, id=item_id).first()
-    if not item:
-        return _mobile_json_error("item_not_found", status=404)
-
-    try:
-        todo = get_todo_for_owner(
-            owner=user,
-            todo_id=payload.get("todo_id"),
-            active_only=True,
-        )
-        category = get_category_for_owner(
-            owner=user,
-            category_id=payload.get("category_id"),
-            active_only=True,
-        )
-        update_todo_item(
-            item=item,
-            todo=todo,
-            category=category,
-            title=payload.get("title"),
-            weekday=parse_weekday(payload.get("weekday")),
-            time_start=payload.get("time_start"),
-            time_end=payload.get("time_end"),
-            note=payload.get("note"),
-        )
-    except TodoListCrudError as error:
-        code = error.code
-        if code in {"todo_not_found", "category_not_found"}:
-            return _mobile_json_error(code, status=404)
-        return _mobile_json_error(code, status=400)
-
-    return JsonResponse({"ok": True, "item_id": item.id})
-
-
-def _todos_item_delete_for_user(user, payload):
-    item_id = payload.get("item_id")
-    item = TodoItem.objects.filter(owner=user, id=item_id).first()
-    if not item:
-        return _mobile_json_error("item_not_found", status=404)
-
-    delete_todo_item(item=item)
-    return JsonResponse({"ok": True, "item_id": item_id})
-
-
-def _projects_response_for_user(user):
-    projects = list(
-        Project.objects.filter(owner=user)
-        .select_related("customer", "category")
-        .order_by("is_archived", "name")
-    )
-
-    sub_totals = {
-        row["project_id"]: row["total"]
-        for row in (
-            SubProject.objects.filter(owner=user, is_archived=False)
-            .values("project_id")
-            .annotate(total=Count("id"))
-        )
-    }
-    sub_done = {
-        row["project_id"]: row["total"]
-        for row in (
-            SubProject.objects.filter(owner=user, is_archived=False, status=SubProject.Status.DONE)
-            .values("project_id")
-            .annotate(total=Count("id"))
-        )
-    }
-    sub_blocked = {
-        row["project_id"]: row["total"]
-        for row in (
-            SubProject.objects.filter(owner=user, is_archived=False, status=SubProject.Status.BLOCKED)
-            .values("project_id")
-            .annotate(total=Count("id"))
-        )
-    }
-
-    payload_items = []
-    for project in projects:
-        payload_items.append(
-            {
-                "id": project.id,
-                "name": project.name,
-                "description": project.description or "",
-                "is_archived": bool(project.is_archived),
-                "customer": project.customer.name if project.customer_id else "",
-                "category": project.category.name if project.category_id else "",
-                "subprojects_total": int(sub_totals.get(project.id, 0)),
-                "subprojects_done": int(sub_done.get(project.id, 0)),
-                "subprojects_blocked": int(sub_blocked.get(project.id, 0)),
-                "created_at": project.created_at.isoformat() if project.created_at else "",
-                "updated_at": project.updated_at.isoformat() if project.updated_at else "",
-            }
-        )
-
-    active_count = sum(1 for row in payload_items if not row["is_archived"])
-    archived_count = sum(1 for row in payload_items if row["is_archived"])
-    return JsonResponse(
-        {
-            "ok": True,
-            "synced_at": timezone.now().isoformat(),
-            "stats": {
-                "total": len(payload_items),
-                "active": active_count,
-                "archived": archived_count,
-            },
-            "items": payload_items,
-        }
-    )
-
-
-def _agenda_response_for_user(user, start_value: str | None, duration_value):
-    start_date = timezone.localdate()
-    if start_value:
-        try:
-            start_date = date.fromisoformat(start_value)
-        except ValueError:
-            start_date = timezone.localdate()
-
-    try:
-        duration = int(duration_value or 14)
-    except (TypeError, ValueError):
-        duration = 14
-    duration = max(1, min(duration, 31))
-    end_date = start_date + timedelta(days=duration - 1)
-
-    items = list(
-        AgendaItem.objects.filter(owner=user, due_date__range=(start_date, end_date))
-        .select_related("project")
-        .order_by("due_date", "due_time", "title")
-    )
-
-    payload_items = []
-    for item in items:
-        payload_items.append(
-            {
-                "id": item.id,
-                "title": item.title,
-                "item_type": item.item_type,
-                "item_type_label": item.get_item_type_display(),
-                "status": item.status,
-                "status_label": item.get_status_display(),
-                "due_date": item.due_date.isoformat() if item.due_date else "",
-                "due_time": item.due_time.strftime("%H:%M") if item.due_time else "",
-                "project": item.project.name if item.project_id else "",
-                "note": item.note or "",
-            }
-        )
-
-    activity_total = sum(1 for row in payload_items if row["item_type"] == AgendaItem.ItemType.ACTIVITY)
-    reminder_total = sum(1 for row in payload_items if row["item_type"] == AgendaItem.ItemType.REMINDER)
-    done_total = sum(1 for row in payload_items if row["status"] == AgendaItem.Status.DONE)
-    planned_total = sum(1 for row in payload_items if row["status"] == AgendaItem.Status.PLANNED)
-
-    return JsonResponse(
-        {
-            "ok": True,
-            "synced_at": timezone.now().isoformat(),
-            "range_start": start_date.isoformat(),
-            "range_end": end_date.isoformat(),
-            "stats": {
-                "total": len(payload_items),
-                "activities": activity_total,
-                "reminders": reminder_total,
-                "planned": planned_total,
-                "done": done_total,
-            },
-            "items": payload_items,
-        }
-    )
-
-
-@require_http_methods(["GET"])
-def mobile_todos(request):
-    session, error = _mobile_authenticate_request(request)
-    if error:
-        return error
-    return _todos_response_for_user(session.user, request.GET.get("week"))
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def mobile_todos_check(request):
-    payload = _mobile_parse_json(request)
-    if payload is None:
-        return _mobile_json_error("invalid_json", status=400)
-    session, error = _mobile_authenticate_request(request)
-    if error:
-        return error
-    return _todos_check_for_user(session.user, payload)
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def mobile_todos_item_create(request):
-    payload = _mobile_parse_json(request)
-    if payload is None:
-        return _mobile_json_error("invalid_json", status=400)
-    session, error = _mobile_authenticate_request(request)
-    if error:
-        return error
-    return _todos_item_create_for_user(session.user, payload)
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def mobile_todos_item_update(request):
-    payload = _mobile_parse_json(request)
-    if payload is None:
-        return _mobile_json_error("invalid_json", status=400)
-    session, error = _mobile_authenticate_request(request)
-    if error:
-        return error
-    return _todos_item_update_for_user(session.user, payload)
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def mobile_todos_item_delete(request):
-    payload = _mobile_parse_json(request)
-    if payload is None:
-        return _mobile_json_error("invalid_json", status=400)
-    session, error = _mobile_authenticate_request(request)
-    if error:
-        return error
-    return _todos_item_delete_for_user(session.user, payload)
-
-
-@require_http_methods(["GET"])
-def api_todos(request):
-    session, error = _api_authenticate_request(request)
-    if error:
-        return error
-    return _todos_response_for_user(session.user, request.GET.get("week"))
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def api_todos_check(request):
-    payload = _mobile_parse_json(request)
-    if payload is None:
-        return _mobile_json_error("invalid_json", status=400)
-    session, error = _api_authenticate_request(request)
-    if error:
-        return error
-    return _todos_check_for_user(session.user, payload)
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def api_todos_item_create(request):
-    payload = _mobile_parse_json(request)
-    if payload is None:
-        return _mobile_json_error("invalid_json", status=400)
-    session, error = _api_authenticate_request(request)
-    if error:
-        return error
-    return _todos_item_create_for_user(session.user, payload)
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def api_todos_item_update(request):
-    payload = _mobile_parse_json(request)
-    if payload is None:
-        return _mobile_json_error("invalid_json", status=400)
-    session, error = _api_authenticate_request(request)
-    if error:
-        return error
-    return _todos_item_update_for_user(session.user, payload)
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def api_todos_item_delete(request):
-    payload = _mobile_parse_json(request)
-    if payload is None:
-        return _mobile_json_error("invalid_json", status=400)
-    session, error = _api_authenticate_request(request)
-    if error:
-        return error
-    return _todos_item_delete_for_user(session.user, payload)
-
-
-@require_http_methods(["GET"])
-def api_projects(request):
-    session, error = _api_authenticate_request(request)
-    if error:
-        return error
-    return _projects_response_for_user(session.user)
-
-
-@require_http_methods(["GET"])
-def mobile_projects(request):
-    session, error = _mobile_authenticate_request(request)
-    if error:
-        return error
-    return _projects_response_for_user(session.user)
-
-
-@require_http_methods(["GET"])
-def api_agenda(request):
-    session, error = _api_authenticate_request(request)
-    if error:
-        return error
-    return _agenda_response_for_user(
-        session.user,
-        request.GET.get("start"),
-        request.GET.get("duration"),
-    )
-
-
-@require_http_methods(["GET"])
-def mobile_agenda(request):
-    session, error = _mobile_authenticate_request(request)
-    if error:
-        return error
-    return _agenda_response_for_user(
-        session.user,
-        request.GET.get("start"),
-        request.GET.get("duration"),
-    )
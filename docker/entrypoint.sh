@@ -3,6 +3,8 @@ set -e
 
 python manage.py migrate --noinput
 python manage.py sync_radicale_users
+python manage.py rebuild_calendar_rollup
+python manage.py rebuild_todo_week_stats
 
 STYLE_MODE="${UI_STYLE_MODE:-}"
 if [ -z "$STYLE_MODE" ]; then
@@ -86,6 +86,12 @@ if not MOBILE_API_ALLOWED_ORIGINS:
 
 MOBILE_API_ACCESS_TTL_SECONDS = int(os.getenv("MOBILE_API_ACCESS_TTL_SECONDS", "900"))
 MOBILE_API_REFRESH_TTL_DAYS = int(os.getenv("MOBILE_API_REFRESH_TTL_DAYS", "14"))
+MOBILE_API_SYNC_TOMBSTONE_DAYS = int(os.getenv("MOBILE_API_SYNC_TOMBSTONE_DAYS", "30"))
+MOBILE_API_BATCH_MAX_OPERATIONS = int(os.getenv("MOBILE_API_BATCH_MAX_OPERATIONS", "200"))
+MOBILE_API_SESSION_TOUCH_SECONDS = int(os.getenv("MOBILE_API_SESSION_TOUCH_SECONDS", "60"))
+MOBILE_API_TOKEN_CACHE_SECONDS = int(os.getenv("MOBILE_API_TOKEN_CACHE_SECONDS", "30"))
+MOBILE_API_SESSION_PRUNE_GRACE_DAYS = int(os.getenv("MOBILE_API_SESSION_PRUNE_GRACE_DAYS", "7"))
+MOBILE_API_MAX_SESSIONS_PER_USER = int(os.getenv("MOBILE_API_MAX_SESSIONS_PER_USER", "10"))
 CALDAV_ENABLED = os.getenv("CALDAV_ENABLED", "false").lower() in {"1", "true", "yes", "on"}
 CALDAV_BASE_URL = os.getenv("CALDAV_BASE_URL", "").strip()
 CALDAV_SERVICE_USERNAME = os.getenv("CALDAV_SERVICE_USERNAME", "").strip()
@@ -102,6 +108,8 @@ CALDAV_TODO_COLLECTION = (os.getenv("CALDAV_TODO_COLLECTION", CALDAV_DEFAULT_USE
 RADICALE_USERS_FILE = os.getenv("RADICALE_USERS_FILE", str(BASE_DIR / "runtime" / "radicale" / "users")).strip()
 RADICALE_USERS_LOCK_FILE = os.getenv("RADICALE_USERS_LOCK_FILE", "").strip()
 RADICALE_RIGHTS_FILE = os.getenv("RADICALE_RIGHTS_FILE", str(BASE_DIR / "runtime" / "radicale" / "rights")).strip()
+# Modifiche DAV ravvicinate accorpate in un solo rebuild di users/rights; 0 = rebuild sincrono.
+RADICALE_SYNC_DEBOUNCE_SECONDS = int(os.getenv("RADICALE_SYNC_DEBOUNCE_SECONDS", "2"))
 
 
 # Application definition
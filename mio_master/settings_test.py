@@ -12,3 +12,6 @@ DATABASES = {
 }
 
 MIGRATION_MODULES = {app.split(".")[-1]: None for app in INSTALLED_APPS}
+
+# I test leggono users/rights subito dopo la modifica: rebuild sincrono.
+RADICALE_SYNC_DEBOUNCE_SECONDS = 0
@@ -0,0 +1,659 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import http.client
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlsplit
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import DavAccount
+
+from .models import TodoDavOutbox, TodoDavSyncState, TodoItem
+
+logger = logging.getLogger(__name__)
+
+DAV_TIMEOUT_SECONDS = 8
+DAV_BULK_CONCURRENCY = 8
+DAV_OUTBOX_BATCH_SIZE = 50
+DAV_OUTBOX_MAX_ATTEMPTS = 6
+DAV_OUTBOX_RETRY_BASE_SECONDS = 30
+DAV_OUTBOX_RETRY_MAX_SECONDS = 3600
+# Breve attesa prima del primo invio: salvataggi ravvicinati della stessa attivita diventano un solo PUT.
+DAV_OUTBOX_COLLAPSE_SECONDS = 2
+# Se il worker muore a meta invio, le righe reclamate tornano disponibili dopo il lease.
+DAV_OUTBOX_CLAIM_LEASE_SECONDS = 300
+# Errori tipici di una connessione keep-alive chiusa dal server mentre era ferma nel pool.
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+@dataclass
+class DavSyncOutcome:
+    ok: bool
+    message: str = ""
+
+
+@dataclass
+class TaskPushResult:
+    task_id: int
+    status: str  # "pushed" | "skipped" | "failed"
+    message: str = ""
+    etag: str = ""
+
+
+class DavConnectionPool:
+    """
+    Connessioni HTTP/1.1 keep-alive per host, riusate tra le richieste (niente TCP/TLS
+    nuovo per ogni task). Thread-safe: ogni richiesta prende una connessione libera.
+    """
+
+    def __init__(self, *, max_idle: int = DAV_BULK_CONCURRENCY, timeout: float = DAV_TIMEOUT_SECONDS):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle: dict[tuple[str, str, int], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _acquire(self, key: tuple[str, str, int]) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+            self.opened += 1
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return connection_class(host, port, timeout=self.timeout), False
+
+    def _release(self, key: tuple[str, str, int], connection: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, method: str, url: str, *, body: bytes | None, headers: dict[str, str]) -> tuple[int, dict, str]:
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        key = (scheme, parts.hostname or "", parts.port or (443 if scheme == "https" else 80))
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        while True:
+            connection, reused = self._acquire(key)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response_body = response.read().decode("utf-8", errors="replace")
+            except _STALE_CONNECTION_ERRORS as exc:
+                connection.close()
+                if reused:
+                    continue
+                raise RuntimeError(f"DAV network error: {exc}") from exc
+            except (OSError, http.client.HTTPException) as exc:
+                connection.close()
+                raise RuntimeError(f"DAV network error: {exc}") from exc
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(key, connection)
+            return int(response.status), dict(response.getheaders()), response_body
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle_lists, self._idle = list(self._idle.values()), {}
+        for idle in idle_lists:
+            for connection in idle:
+                connection.close()
+
+
+def vtodo_tasks(user):
+    """Attivita sincronizzate come VTODO: solo gli item standalone attivi (tab "Attivita")."""
+    return TodoItem.objects.filter(owner=user, is_standalone=True, is_active=True)
+
+
+def todo_collection_slug() -> str:
+    raw = (
+        getattr(settings, "CALDAV_DEFAULT_USER_COLLECTION", "")
+        or getattr(settings, "CALDAV_TODO_COLLECTION", "")
+        or "personal_dav"
+    )
+    return (raw or "").strip().strip("/") or "personal_dav"
+
+
+def todo_collection_path_for_user(user) -> str:
+    account = DavAccount.objects.filter(user=user, is_active=True).first()
+    if not account:
+        return ""
+    return f"{account.dav_username}/{todo_collection_slug()}"
+
+
+def todo_collection_url_for_user(user) -> str:
+    if not getattr(settings, "CALDAV_ENABLED", False):
+        return ""
+    base_url = (getattr(settings, "CALDAV_BASE_URL", "") or "").strip()
+    if not base_url:
+        return ""
+    account = DavAccount.objects.filter(user=user, is_active=True).first()
+    if not account:
+        return ""
+    if not base_url.endswith("/"):
+        base_url = f"{base_url}/"
+    principal = quote(account.dav_username, safe="@._+-")
+    collection = quote(todo_collection_slug(), safe="@._+-")
+    return f"{base_url}{principal}/{collection}/"
+
+
+def _service_auth_header() -> str:
+    username = (getattr(settings, "CALDAV_SERVICE_USERNAME", "") or "").strip()
+    password = (getattr(settings, "CALDAV_SERVICE_PASSWORD", "") or "").strip()
+    if not username or not password:
+        return ""
+    raw = f"{username}:{password}".encode("utf-8")
+    return f"Basic {base64.b64encode(raw).decode('ascii')}"
+
+
+def _dav_request(
+    method: str,
+    url: str,
+    *,
+    body: str = "",
+    headers: dict[str, str] | None = None,
+    pool: DavConnectionPool | None = None,
+) -> tuple[int, dict, str]:
+    request_headers = {
+        "User-Agent": "mio-todos-vtodo-sync/1.0",
+    }
+    auth_header = _service_auth_header()
+    if auth_header:
+        request_headers["Authorization"] = auth_header
+    if headers:
+        request_headers.update(headers)
+
+    payload = body.encode("utf-8") if body else None
+    if pool is not None:
+        return pool.request(method, url, body=payload, headers=request_headers)
+    request = Request(url, data=payload, method=method, headers=request_headers)
+
+    try:
+        with urlopen(request, timeout=DAV_TIMEOUT_SECONDS) as response:
+            response_body = response.read().decode("utf-8", errors="replace")
+            return int(response.status), dict(response.headers.items()), response_body
+    except HTTPError as exc:
+        response_body = exc.read().decode("utf-8", errors="replace") if hasattr(exc, "read") else str(exc)
+        response_headers = dict(exc.headers.items()) if getattr(exc, "headers", None) else {}
+        return int(exc.code), response_headers, response_body
+    except URLError as exc:
+        raise RuntimeError(f"DAV network error: {exc.reason}") from exc
+
+
+def _ensure_collection(collection_url: str, *, pool: DavConnectionPool | None = None) -> DavSyncOutcome:
+    body = (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<C:mkcalendar xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">'
+        "<D:set><D:prop><D:displayname>MIO Todo</D:displayname></D:prop></D:set>"
+        "</C:mkcalendar>"
+    )
+    status, _headers, response_body = _dav_request(
+        "MKCALENDAR",
+        collection_url,
+        body=body,
+        headers={"Content-Type": "application/xml; charset=utf-8"},
+        pool=pool,
+    )
+    if status in {200, 201, 204, 405, 409}:
+        return DavSyncOutcome(ok=True)
+    return DavSyncOutcome(ok=False, message=f"MKCALENDAR {status}: {response_body[:180]}")
+
+
+def _ics_escape(value: str) -> str:
+    return (
+        (value or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\n")
+        .replace("\r", "\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _ical_utc(dt: datetime) -> str:
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, timezone.get_current_timezone())
+    return dt.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _task_uid(task: TodoItem) -> str:
+    return f"mio-todos-item-{task.owner_id}-{task.id}@miorganizzo"
+
+
+def _task_href(task_id: int) -> str:
+    return f"todos-item-{task_id}.ics"
+
+
+def _task_status(task: TodoItem) -> str:
+    mapping = {
+        TodoItem.Status.OPEN: "NEEDS-ACTION",
+        TodoItem.Status.IN_PROGRESS: "IN-PROCESS",
+        TodoItem.Status.DONE: "COMPLETED",
+    }
+    return mapping.get(task.status, "NEEDS-ACTION")
+
+
+def _task_priority(task: TodoItem) -> int:
+    mapping = {
+        TodoItem.Priority.HIGH: 1,
+        TodoItem.Priority.MEDIUM: 5,
+        TodoItem.Priority.LOW: 9,
+    }
+    return mapping.get(task.priority, 5)
+
+
+def _task_to_vtodo(task: TodoItem, *, now: datetime | None = None) -> str:
+    now_utc = now or timezone.now()
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//MIO//Todos Sync//IT",
+        "BEGIN:VTODO",
+        f"UID:{_task_uid(task)}",
+        f"DTSTAMP:{_ical_utc(now_utc)}",
+        f"CREATED:{_ical_utc(task.created_at)}",
+        f"LAST-MODIFIED:{_ical_utc(task.updated_at)}",
+        f"SUMMARY:{_ics_escape(task.title)}",
+        f"STATUS:{_task_status(task)}",
+        f"PRIORITY:{_task_priority(task)}",
+        f"X-MIO-TASK-ID:{task.id}",
+        f"X-MIO-ITEM-TYPE:{task.item_type}",
+    ]
+    if task.note:
+        lines.append(f"DESCRIPTION:{_ics_escape(task.note)}")
+    if task.project_id:
+        lines.append(f"X-MIO-PROJECT-ID:{task.project_id}")
+    if task.category_id:
+        lines.append(f"X-MIO-CATEGORY-ID:{task.category_id}")
+    if task.due_date:
+        if task.due_time:
+            due_dt = datetime.combine(task.due_date, task.due_time)
+            lines.append(f"DUE:{due_dt.strftime('%Y%m%dT%H%M%S')}")
+        else:
+            lines.append(f"DUE;VALUE=DATE:{task.due_date.strftime('%Y%m%d')}")
+    if task.status == TodoItem.Status.DONE:
+        lines.append(f"COMPLETED:{_ical_utc(now_utc)}")
+    lines.extend(["END:VTODO", "END:VCALENDAR"])
+    return "\r\n".join(lines) + "\r\n"
+
+
+def _is_sync_configured() -> bool:
+    return bool(
+        getattr(settings, "CALDAV_ENABLED", False)
+        and (getattr(settings, "CALDAV_BASE_URL", "") or "").strip()
+        and _service_auth_header()
+    )
+
+
+def _vtodo_content_hash(task: TodoItem) -> str:
+    # DTSTAMP/COMPLETED usano l'ora corrente: l'hash si calcola su un render con orario fisso.
+    return hashlib.sha256(_task_to_vtodo(task, now=task.updated_at).encode("utf-8")).hexdigest()
+
+
+def _task_resource_url(collection_url: str, task_id: int) -> str:
+    return f"{collection_url}{quote(_task_href(task_id), safe='._-')}"
+
+
+def _put_vtodo(resource_url: str, body: str, *, pool: DavConnectionPool | None = None) -> tuple[DavSyncOutcome, str]:
+    status, headers, response_body = _dav_request(
+        "PUT",
+        resource_url,
+        body=body,
+        headers={"Content-Type": "text/calendar; charset=utf-8"},
+        pool=pool,
+    )
+    if status in {200, 201, 204}:
+        etag = next((value for name, value in headers.items() if name.lower() == "etag"), "")
+        return DavSyncOutcome(ok=True), etag
+    return DavSyncOutcome(ok=False, message=f"PUT {status}: {response_body[:180]}"), ""
+
+
+def push_task_to_vtodo(
+    task: TodoItem,
+    *,
+    ensure_collection: bool = True,
+    force: bool = False,
+    pool: DavConnectionPool | None = None,
+) -> DavSyncOutcome:
+    if not _is_sync_configured():
+        return DavSyncOutcome(ok=False, message="CalDAV/VTODO sync non configurata.")
+
+    collection_url = todo_collection_url_for_user(task.owner)
+    if not collection_url:
+        return DavSyncOutcome(ok=False, message="Account DAV utente non disponibile.")
+
+    content_hash = _vtodo_content_hash(task)
+    if not force and TodoDavSyncState.objects.filter(task_id=task.id, content_hash=content_hash).exists():
+        return DavSyncOutcome(ok=True, message="VTODO invariato.")
+
+    if ensure_collection:
+        ensure_result = _ensure_collection(collection_url, pool=pool)
+        if not ensure_result.ok:
+            return ensure_result
+
+    result, etag = _put_vtodo(_task_resource_url(collection_url, task.id), _task_to_vtodo(task), pool=pool)
+    if result.ok:
+        TodoDavSyncState.objects.update_or_create(
+            task_id=task.id,
+            defaults={"owner_id": task.owner_id, "content_hash": content_hash, "etag": etag, "pushed_at": timezone.now()},
+        )
+    return result
+
+
+def _delete_vtodo(collection_url: str, task_id: int, *, pool: DavConnectionPool | None = None) -> DavSyncOutcome:
+    status, _headers, response_body = _dav_request("DELETE", _task_resource_url(collection_url, task_id), pool=pool)
+    if status in {200, 202, 204, 404}:
+        TodoDavSyncState.objects.filter(task_id=task_id).delete()
+        return DavSyncOutcome(ok=True)
+    return DavSyncOutcome(ok=False, message=f"DELETE {status}: {response_body[:180]}")
+
+
+def delete_task_from_vtodo(task: TodoItem) -> DavSyncOutcome:
+    if not _is_sync_configured():
+        return DavSyncOutcome(ok=False, message="CalDAV/VTODO sync non configurata.")
+
+    collection_url = todo_collection_url_for_user(task.owner)
+    if not collection_url:
+        return DavSyncOutcome(ok=False, message="Account DAV utente non disponibile.")
+
+    return _delete_vtodo(collection_url, task.id)
+
+
+def sync_all_tasks_to_vtodo(
+    user,
+    *,
+    force: bool = False,
+    concurrency: int = DAV_BULK_CONCURRENCY,
+    pool: DavConnectionPool | None = None,
+) -> dict:
+    """
+    Resync completo: salta i task il cui VTODO non e cambiato dall'ultimo push (`force` li
+    rimanda tutti) e invia gli altri con `concurrency` richieste parallele su connessioni
+    keep-alive. Le scritture DB restano sul thread chiamante. `results` ha l'esito per task.
+    """
+    tasks = list(vtodo_tasks(user).order_by("id"))
+    if not tasks:
+        return {"total": 0, "synced": 0, "pushed": 0, "skipped": 0, "failed": 0, "error": "", "results": []}
+
+    def _all_failed(error: str) -> dict:
+        return {
+            "total": len(tasks),
+            "synced": 0,
+            "pushed": 0,
+            "skipped": 0,
+            "failed": len(tasks),
+            "error": error,
+            "results": [TaskPushResult(task_id=task.id, status="failed", message=error) for task in tasks],
+        }
+
+    if not _is_sync_configured():
+        return _all_failed("CalDAV/VTODO sync non configurata.")
+
+    collection_url = todo_collection_url_for_user(user)
+    if not collection_url:
+        return _all_failed("Account DAV utente non disponibile.")
+
+    own_pool = pool is None
+    pool = pool or DavConnectionPool(max_idle=max(concurrency, 1))
+    try:
+        ensure_result = _ensure_collection(collection_url, pool=pool)
+        if not ensure_result.ok:
+            return _all_failed(ensure_result.message)
+
+        pushed_hashes = dict(
+            TodoDavSyncState.objects.filter(owner=user).values_list("task_id", "content_hash")
+        )
+        results: dict[int, TaskPushResult] = {}
+        pending = []
+        for task in tasks:
+            content_hash = _vtodo_content_hash(task)
+            if not force and pushed_hashes.get(task.id) == content_hash:
+                results[task.id] = TaskPushResult(task_id=task.id, status="skipped")
+                continue
+            pending.append((task, content_hash, _task_resource_url(collection_url, task.id), _task_to_vtodo(task)))
+
+        def _push(item) -> TaskPushResult:
+            task, _content_hash, resource_url, body = item
+            try:
+                outcome, etag = _put_vtodo(resource_url, body, pool=pool)
+            except RuntimeError as exc:
+                return TaskPushResult(task_id=task.id, status="failed", message=str(exc))
+            if outcome.ok:
+                return TaskPushResult(task_id=task.id, status="pushed", etag=etag)
+            return TaskPushResult(task_id=task.id, status="failed", message=outcome.message)
+
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="vtodo-push") as executor:
+            for result in executor.map(_push, pending):
+                results[result.task_id] = result
+    finally:
+        if own_pool:
+            pool.close_all()
+
+    now = timezone.now()
+    states = []
+    for task, content_hash, _resource_url, _body in pending:
+        result = results[task.id]
+        if result.status == "pushed":
+            states.append(
+                TodoDavSyncState(
+                    owner=user, task_id=task.id, content_hash=content_hash, etag=result.etag, pushed_at=now
+                )
+            )
+        else:
+            logger.warning("Todo DAV sync failed for task=%s user=%s: %s", task.id, user.id, result.message)
+    if states:
+        TodoDavSyncState.objects.bulk_create(
+            states,
+            update_conflicts=True,
+            unique_fields=["task_id"],
+            update_fields=["owner", "content_hash", "etag", "pushed_at"],
+        )
+
+    ordered = [results[task.id] for task in tasks]
+    pushed = sum(1 for result in ordered if result.status == "pushed")
+    skipped = sum(1 for result in ordered if result.status == "skipped")
+    failed = [result for result in ordered if result.status == "failed"]
+    return {
+        "total": len(tasks),
+        "synced": pushed + skipped,
+        "pushed": pushed,
+        "skipped": skipped,
+        "failed": len(failed),
+        "error": failed[0].message if failed else "",
+        "results": ordered,
+    }
+
+@dataclass
+class DavOutboxDrainReport:
+    pushed: int = 0
+    deleted: int = 0
+    retried: int = 0
+    failed: int = 0
+    pending: int = 0
+    errors: list[str] = field(default_factory=list)
+
+
+def dav_outbox_retry_delay(attempts: int) -> timedelta:
+    seconds = DAV_OUTBOX_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(seconds, DAV_OUTBOX_RETRY_MAX_SECONDS))
+
+
+def _enqueue_task_operation(task: TodoItem, operation: str) -> None:
+    if not task.id or not _is_sync_configured():
+        return
+    now = timezone.now()
+    values = {
+        "operation": operation,
+        "status": TodoDavOutbox.Status.PENDING,
+        "attempts": 0,
+        "next_attempt_at": now + timedelta(seconds=DAV_OUTBOX_COLLAPSE_SECONDS),
+        "claim_token": "",
+        "last_error": "",
+    }
+    for _attempt in range(2):
+        # Riga gia in coda (anche reclamata da un worker): vince l'ultima operazione, `revision`
+        # cambia e il worker non la rimuove a fine invio, cosi lo stato nuovo viene rimandato.
+        if TodoDavOutbox.objects.filter(task_id=task.id).update(revision=F("revision") + 1, updated_at=now, **values):
+            return
+        try:
+            with transaction.atomic():
+                TodoDavOutbox.objects.create(owner_id=task.owner_id, task_id=task.id, **values)
+            return
+        except IntegrityError:
+            continue
+
+
+def enqueue_task_push(task: TodoItem) -> None:
+    """Accoda il PUT del VTODO: nessuna chiamata DAV nel ciclo della richiesta."""
+    _enqueue_task_operation(task, TodoDavOutbox.Operation.PUT)
+
+
+def enqueue_task_delete(task: TodoItem) -> None:
+    """Accoda il DELETE del VTODO (anche da `post_delete`: basta che `task.id` sia valorizzato)."""
+    _enqueue_task_operation(task, TodoDavOutbox.Operation.DELETE)
+
+
+def enqueue_task_delete_if_tracked(task: TodoItem) -> None:
+    """
+    Item fuori scope (non piu standalone): accoda il DELETE solo se il VTODO e' gia stato inviato
+    o ha un'operazione in coda, cosi i salvataggi dei todo settimanali non toccano la coda.
+    """
+    if not task.id or not _is_sync_configured():
+        return
+    if (
+        TodoDavSyncState.objects.filter(task_id=task.id).exists()
+        or TodoDavOutbox.objects.filter(task_id=task.id).exists()
+    ):
+        _enqueue_task_operation(task, TodoDavOutbox.Operation.DELETE)
+
+
+def _claim_dav_outbox_batch(*, now, batch_size: int) -> list[TodoDavOutbox]:
+    """Reclama un blocco di righe scadute con un token: due worker non inviano la stessa riga."""
+    due = TodoDavOutbox.objects.filter(status=TodoDavOutbox.Status.PENDING, next_attempt_at__lte=now)
+    ids = list(due.order_by("next_attempt_at", "id").values_list("id", flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    due.filter(id__in=ids).update(
+        claim_token=token,
+        next_attempt_at=now + timedelta(seconds=DAV_OUTBOX_CLAIM_LEASE_SECONDS),
+    )
+    return list(TodoDavOutbox.objects.filter(claim_token=token).select_related("owner").order_by("owner_id", "id"))
+
+
+def _dav_outbox_failed(item: TodoDavOutbox, now, error_message: str) -> bool:
+    """Registra il tentativo fallito; True se l'operazione e' stata abbandonata (FAILED)."""
+    attempts = item.attempts + 1
+    values = {"attempts": attempts, "last_error": error_message[:3000], "updated_at": now}
+    if attempts < DAV_OUTBOX_MAX_ATTEMPTS:
+        values["next_attempt_at"] = now + dav_outbox_retry_delay(attempts)
+    else:
+        values["status"] = TodoDavOutbox.Status.FAILED
+    # Se l'attivita e' stata modificata durante l'invio la riga e' gia riaccodata da zero.
+    TodoDavOutbox.objects.filter(pk=item.pk, revision=item.revision).update(**values)
+    return attempts >= DAV_OUTBOX_MAX_ATTEMPTS
+
+
+def _send_outbox_item(
+    item: TodoDavOutbox,
+    *,
+    pool: DavConnectionPool,
+    collections: dict[int, str],
+    ensured: set[int],
+) -> tuple[DavSyncOutcome, str]:
+    if item.owner_id not in collections:
+        collections[item.owner_id] = todo_collection_url_for_user(item.owner)
+    collection_url = collections[item.owner_id]
+    if not collection_url:
+        return DavSyncOutcome(ok=False, message="Account DAV utente non disponibile."), ""
+
+    if item.operation == TodoDavOutbox.Operation.PUT:
+        task = vtodo_tasks(item.owner_id).filter(pk=item.task_id).select_related("owner").first()
+        if task is not None:
+            if item.owner_id not in ensured:
+                ensure_result = _ensure_collection(collection_url, pool=pool)
+                if not ensure_result.ok:
+                    return ensure_result, ""
+                ensured.add(item.owner_id)
+            return push_task_to_vtodo(task, ensure_collection=False, pool=pool), "pushed"
+        # Attivita cancellata o uscita dallo scope (non standalone/inattiva): il PUT diventa un DELETE.
+    return _delete_vtodo(collection_url, item.task_id, pool=pool), "deleted"
+
+
+def drain_dav_outbox(
+    *,
+    pool: DavConnectionPool | None = None,
+    batch_size: int = DAV_OUTBOX_BATCH_SIZE,
+    now=None,
+) -> DavOutboxDrainReport:
+    """
+    Invia le operazioni DAV in coda scadute, a blocchi e su connessioni keep-alive. Gli errori
+    pianificano un nuovo tentativo con backoff esponenziale fino a DAV_OUTBOX_MAX_ATTEMPTS, poi
+    la riga passa a FAILED. Con la sync non configurata la coda resta intatta.
+    """
+    report = DavOutboxDrainReport()
+    if _is_sync_configured():
+        owns_pool = pool is None
+        if owns_pool:
+            pool = DavConnectionPool()
+        collections: dict[int, str] = {}
+        ensured: set[int] = set()
+        try:
+            while True:
+                now_value = now or timezone.now()
+                items = _claim_dav_outbox_batch(now=now_value, batch_size=batch_size)
+                if not items:
+                    break
+                server_down = False
+                for item in items:
+                    if server_down:
+                        # Server DAV irraggiungibile in questo blocco: si rimanda senza consumare tentativi.
+                        TodoDavOutbox.objects.filter(pk=item.pk, revision=item.revision).update(
+                            next_attempt_at=now_value + dav_outbox_retry_delay(1),
+                            updated_at=now_value,
+                        )
+                        report.retried += 1
+                        continue
+                    try:
+                        outcome, kind = _send_outbox_item(item, pool=pool, collections=collections, ensured=ensured)
+                    except Exception as exc:
+                        server_down = True
+                        outcome, kind = DavSyncOutcome(ok=False, message=str(exc)), ""
+                    if outcome.ok:
+                        TodoDavOutbox.objects.filter(pk=item.pk, revision=item.revision).delete()
+                        if kind == "pushed":
+                            report.pushed += 1
+                        else:
+                            report.deleted += 1
+                        continue
+                    if _dav_outbox_failed(item, now_value, outcome.message):
+                        report.failed += 1
+                    else:
+                        report.retried += 1
+                    report.errors.append(f"task={item.task_id}: {outcome.message[:240]}")
+        finally:
+            if owns_pool:
+                pool.close_all()
+
+    report.pending = TodoDavOutbox.objects.filter(status=TodoDavOutbox.Status.PENDING).count()
+    return report
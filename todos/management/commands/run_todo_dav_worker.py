@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from todos.dav_sync import DAV_OUTBOX_BATCH_SIZE, DavConnectionPool, drain_dav_outbox
+
+DEFAULT_INTERVAL_SECONDS = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker coda DAV delle attivita todos: invia PUT/DELETE VTODO accodati dalle richieste web "
+        f"(default ogni {DEFAULT_INTERVAL_SECONDS}s), con retry e backoff."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval-seconds", type=int, default=DEFAULT_INTERVAL_SECONDS)
+        parser.add_argument("--batch-size", type=int, default=DAV_OUTBOX_BATCH_SIZE, help="Righe reclamate per blocco.")
+        parser.add_argument("--run-once", action="store_true", help="Svuota la coda una volta e termina.")
+
+    def _drain(self, pool: DavConnectionPool) -> None:
+        close_old_connections()
+        cycle_start = timezone.now()
+        report = drain_dav_outbox(pool=pool, batch_size=self.batch_size)
+        if report.pushed or report.deleted or report.retried or report.failed:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"[dav outbox {cycle_start.isoformat()}] pushed={report.pushed} deleted={report.deleted} "
+                    f"retried={report.retried} failed={report.failed} pending={report.pending}"
+                )
+            )
+        for error in report.errors[:20]:
+            self.stdout.write(self.style.WARNING(f"  {error}"))
+
+    def handle(self, *args, **options):
+        interval = options["interval_seconds"]
+        self.batch_size = options["batch_size"]
+        if interval < 1 or self.batch_size < 1:
+            raise CommandError("--interval-seconds e --batch-size devono essere >= 1.")
+
+        # Connessioni keep-alive verso Radicale riusate tra i cicli.
+        pool = DavConnectionPool()
+        try:
+            if options["run_once"]:
+                self._drain(pool)
+                return
+            while True:
+                self._drain(pool)
+                time.sleep(interval)
+        finally:
+            pool.close_all()
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 from common.models import OwnedModel, TimeStampedModel
 
@@ -152,3 +153,53 @@ class TodoRecurrence(OwnedModel, TimeStampedModel):
 
     def __str__(self):
         return f"{self.todo_item.title} ({self.week_start})"
+
+
+class TodoDavSyncState(OwnedModel):
+    """
+    Ultimo VTODO inviato a Radicale per attivita: se l'hash del contenuto non cambia il push
+    viene saltato. `task_id` non e una FK: lo stato sopravvive alla cancellazione dell'item.
+    """
+
+    task_id = models.BigIntegerField(unique=True)
+    content_hash = models.CharField(max_length=64)
+    etag = models.CharField(max_length=255, blank=True)
+    pushed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.task_id}:{self.content_hash[:12]}"
+
+
+class TodoDavOutbox(OwnedModel, TimeStampedModel):
+    """
+    Operazione DAV in coda per attivita (una riga per `task_id`): modifiche ripetute aggiornano la
+    stessa riga e `revision`, cosi il worker invia un solo PUT/DELETE con lo stato piu recente.
+    La riga viene rimossa dopo l'invio; resta FAILED solo dopo l'ultimo tentativo.
+    """
+
+    class Operation(models.TextChoices):
+        PUT = "PUT", "Put"
+        DELETE = "DELETE", "Delete"
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        FAILED = "FAILED", "Failed"
+
+    task_id = models.BigIntegerField(unique=True)
+    operation = models.CharField(max_length=8, choices=Operation.choices, default=Operation.PUT)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    revision = models.PositiveIntegerField(default=1)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["claim_token"]),
+        ]
+
+    def __str__(self):
+        return f"DAV {self.operation} {self.status} task={self.task_id} ({self.owner_id})"
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from common.deletion import deleted_with_owner
+
+from .dav_sync import enqueue_task_delete, enqueue_task_delete_if_tracked, enqueue_task_push
+from .models import TodoItem
+
+
+# Tutti i percorsi di scrittura (view, API mobile, azioni email) passano da qui: la richiesta
+# accoda soltanto, l'invio a Radicale lo fa `run_todo_dav_worker`.
+@receiver(post_save, sender=TodoItem)
+def enqueue_vtodo_push_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.is_standalone:
+        enqueue_task_push(instance)
+    else:
+        enqueue_task_delete_if_tracked(instance)
+
+
+@receiver(post_delete, sender=TodoItem)
+def enqueue_vtodo_delete_on_delete(sender, instance, **kwargs):
+    # Utente cancellato: la riga in coda romperebbe la FK owner e il suo account DAV sparisce con lui.
+    if deleted_with_owner(instance.owner_id, kwargs.get("origin")):
+        return
+    if instance.is_standalone:
+        enqueue_task_delete(instance)
+    else:
+        enqueue_task_delete_if_tracked(instance)
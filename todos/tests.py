@@ -1,9 +1,23 @@
+import threading
 from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
 from django.test import TestCase
+from django.utils import timezone
 
-from todos.models import TodoList, TodoCategory, TodoRecurrence, TodoItem
+from core.models import DavAccount
+from todos.dav_sync import (
+    DavSyncOutcome,
+    drain_dav_outbox,
+    push_task_to_vtodo,
+    sync_all_tasks_to_vtodo,
+)
+from todos.models import TodoList, TodoCategory, TodoDavOutbox, TodoDavSyncState, TodoRecurrence, TodoItem
 
 
 class TodoRecurrenceHTMXTests(TestCase):
@@ -351,3 +365,289 @@ class TodoListStatsPageTests(TestCase):
         todo_stats = response.context["todo_stats"]
         self.assertEqual(len(todo_stats), 1)
         self.assertEqual(todo_stats[0]["name"], "TodoList A")
+
+
+DAV_TEST_SETTINGS = {
+    "CALDAV_ENABLED": True,
+    "CALDAV_BASE_URL": "https://example.com/dav/",
+    "CALDAV_SERVICE_USERNAME": "archibald",
+    "CALDAV_SERVICE_PASSWORD": "secret",
+    "CALDAV_DEFAULT_USER_COLLECTION": "personal_dav",
+}
+
+
+class TodoDavSyncTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="todo_dav_user", password="test1234")
+        self.task = TodoItem.objects.create(
+            owner=self.user,
+            title="Attivita DAV",
+            is_standalone=True,
+        )
+
+    @patch("todos.dav_sync._dav_request")
+    @patch("todos.dav_sync._ensure_collection")
+    def test_push_task_to_vtodo_skips_unchanged_content(self, mock_ensure, mock_request):
+        DavAccount.objects.create(user=self.user, dav_username="todo_dav_user", password_hash="x", is_active=True)
+        mock_ensure.return_value = DavSyncOutcome(ok=True)
+        mock_request.return_value = (201, {"ETag": '"1"'}, "")
+
+        with self.settings(**DAV_TEST_SETTINGS):
+            first = push_task_to_vtodo(self.task)
+            second = push_task_to_vtodo(self.task)
+
+        self.assertTrue(first.ok)
+        self.assertEqual(second.message, "VTODO invariato.")
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual(TodoDavSyncState.objects.get(task_id=self.task.id).etag, '"1"')
+
+    def test_sync_all_tasks_to_vtodo_fails_without_dav_account(self):
+        TodoItem.objects.create(owner=self.user, title="Todo settimanale", weekday=0)
+
+        with self.settings(**DAV_TEST_SETTINGS):
+            stats = sync_all_tasks_to_vtodo(self.user)
+
+        self.assertEqual((stats["total"], stats["synced"], stats["failed"]), (1, 0, 1))
+
+    @patch("todos.views.sync_all_tasks_to_vtodo")
+    def test_sync_vtodo_endpoint_redirects_to_tasks_tab(self, mock_sync):
+        mock_sync.return_value = {"total": 2, "synced": 2, "pushed": 1, "skipped": 1, "failed": 0, "error": ""}
+        self.client.login(username="todo_dav_user", password="test1234")
+
+        response = self.client.post("/todos/api/sync-vtodo")
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, "/todos/?tab=tasks")
+        mock_sync.assert_called_once()
+
+
+class _StubDavHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        return
+
+    def _reply(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_MKCALENDAR(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.record(self, "MKCALENDAR")
+        self._reply(405)
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.record(self, "PUT")
+        if self.path.endswith(self.server.failing_href):
+            self._reply(500)
+            return
+        self.server.items[self.path] = body
+        self._reply(201, {"ETag": f'"{len(self.server.items)}"'})
+
+    def do_DELETE(self):
+        self.server.record(self, "DELETE")
+        self._reply(204 if self.server.items.pop(self.path, None) is not None else 404)
+
+
+class _StubDavServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StubDavHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.client_ports = set()
+        self.items = {}
+        self.failing_href = "/never"
+
+    def record(self, handler, method):
+        with self.lock:
+            self.requests.append((method, handler.path))
+            self.client_ports.add(handler.client_address[1])
+
+
+class TodoDavBulkSyncTests(TestCase):
+    def setUp(self):
+        self.server = _StubDavServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.user = get_user_model().objects.create_user(username="bulk_dav_user", password="test1234")
+        DavAccount.objects.create(user=self.user, dav_username="bulk_dav_user", password_hash="x", is_active=True)
+        self.tasks = [
+            TodoItem.objects.create(
+                owner=self.user,
+                title=f"Attivita {index}",
+                note="nota, con; caratteri",
+                is_standalone=True,
+            )
+            for index in range(30)
+        ]
+        self._settings = self.settings(
+            **{**DAV_TEST_SETTINGS, "CALDAV_BASE_URL": f"http://127.0.0.1:{self.server.server_address[1]}/dav/"}
+        )
+        self._settings.enable()
+        self.addCleanup(self._settings.disable)
+
+    def _puts(self):
+        return [path for method, path in self.server.requests if method == "PUT"]
+
+    def test_bulk_sync_reuses_connections_and_skips_unchanged_tasks(self):
+        stats = sync_all_tasks_to_vtodo(self.user, concurrency=4)
+
+        self.assertEqual((stats["total"], stats["pushed"], stats["skipped"], stats["failed"]), (30, 30, 0, 0))
+        self.assertEqual(len(self._puts()), 30)
+        self.assertEqual(len(self.server.items), 30)
+        # Keep-alive: al massimo una connessione per worker, non una per attivita.
+        self.assertLessEqual(len(self.server.client_ports), 4)
+        self.assertEqual(TodoDavSyncState.objects.filter(owner=self.user).count(), 30)
+
+        changed = self.tasks[3]
+        changed.title = "Attivita 3 aggiornata"
+        changed.save()
+        stats = sync_all_tasks_to_vtodo(self.user, concurrency=4)
+
+        self.assertEqual((stats["pushed"], stats["skipped"], stats["synced"]), (1, 29, 30))
+        self.assertEqual(self._puts()[-1], f"/dav/bulk_dav_user/personal_dav/todos-item-{changed.id}.ics")
+        self.assertEqual(len(self._puts()), 31)
+
+    def test_bulk_sync_reports_per_task_failures(self):
+        failing = self.tasks[7]
+        self.server.failing_href = f"todos-item-{failing.id}.ics"
+
+        stats = sync_all_tasks_to_vtodo(self.user, concurrency=4)
+
+        self.assertEqual((stats["pushed"], stats["failed"]), (29, 1))
+        self.assertIn("PUT 500", stats["error"])
+        by_task = {result.task_id: result for result in stats["results"]}
+        self.assertEqual(by_task[failing.id].status, "failed")
+        self.assertEqual(by_task[self.tasks[0].id].status, "pushed")
+        self.assertFalse(TodoDavSyncState.objects.filter(task_id=failing.id).exists())
+
+        # L'attivita fallita viene ritentata, quelle gia allineate no.
+        self.server.failing_href = "/never"
+        stats = sync_all_tasks_to_vtodo(self.user, concurrency=4)
+        self.assertEqual((stats["pushed"], stats["skipped"]), (1, 29))
+
+
+class TodoDavOutboxTests(TestCase):
+    def setUp(self):
+        self.server = _StubDavServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.user = get_user_model().objects.create_user(username="outbox_dav_user", password="test1234")
+        DavAccount.objects.create(user=self.user, dav_username="outbox_dav_user", password_hash="x", is_active=True)
+        self.task = TodoItem.objects.create(owner=self.user, title="Attivita in coda", is_standalone=True)
+        self._settings = self.settings(
+            **{**DAV_TEST_SETTINGS, "CALDAV_BASE_URL": f"http://127.0.0.1:{self.server.server_address[1]}/dav/"}
+        )
+        self._settings.enable()
+        self.addCleanup(self._settings.disable)
+
+    def _methods(self):
+        return [method for method, _path in self.server.requests]
+
+    def test_request_only_enqueues_and_repeated_edits_collapse(self):
+        self.client.login(username="outbox_dav_user", password="test1234")
+        for status in (TodoItem.Status.IN_PROGRESS, TodoItem.Status.DONE):
+            response = self.client.post("/todos/api/task/status", {"id": self.task.id, "status": status})
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.server.requests, [])
+        row = TodoDavOutbox.objects.get(task_id=self.task.id)
+        self.assertEqual((row.operation, row.revision), (TodoDavOutbox.Operation.PUT, 2))
+
+        report = drain_dav_outbox(now=timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual((report.pushed, report.failed, report.pending), (1, 0, 0))
+        self.assertEqual(self._methods(), ["MKCALENDAR", "PUT"])
+        resource = f"/dav/outbox_dav_user/personal_dav/todos-item-{self.task.id}.ics"
+        self.assertIn(b"STATUS:COMPLETED", self.server.items[resource])
+        self.assertFalse(TodoDavOutbox.objects.exists())
+
+    def test_failed_push_backs_off_and_deleted_task_becomes_delete(self):
+        self.server.failing_href = f"todos-item-{self.task.id}.ics"
+        self.task.save()
+        now = timezone.now() + timedelta(minutes=1)
+
+        report = drain_dav_outbox(now=now)
+
+        self.assertEqual((report.pushed, report.retried), (0, 1))
+        row = TodoDavOutbox.objects.get(task_id=self.task.id)
+        self.assertEqual(row.attempts, 1)
+        self.assertIn("PUT 500", row.last_error)
+        self.assertGreater(row.next_attempt_at, now)
+        self.assertEqual(drain_dav_outbox(now=now).retried, 0)
+
+        self.server.failing_href = "/never"
+        report = drain_dav_outbox(now=now + timedelta(hours=1))
+        self.assertEqual((report.pushed, report.pending), (1, 0))
+        self.assertTrue(TodoDavSyncState.objects.filter(task_id=self.task.id).exists())
+
+        # Attivita disattivata con il PUT ancora in coda: esce dallo scope e il worker invia il DELETE.
+        task_id = self.task.id
+        self.task.is_active = False
+        self.task.save()
+        report = drain_dav_outbox(now=now + timedelta(hours=2))
+
+        self.assertEqual((report.deleted, report.pending), (1, 0))
+        self.assertEqual(self._methods()[-1], "DELETE")
+        self.assertEqual(self.server.items, {})
+        self.assertFalse(TodoDavSyncState.objects.filter(task_id=task_id).exists())
+
+    def test_remove_enqueues_delete_and_weekly_items_are_ignored(self):
+        self.client.login(username="outbox_dav_user", password="test1234")
+        task_id = self.task.id
+        TodoItem.objects.create(owner=self.user, title="Todo settimanale", weekday=2)
+
+        response = self.client.post("/todos/api/task/remove", {"id": task_id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(TodoItem.objects.filter(pk=task_id).exists())
+        self.assertEqual(
+            list(TodoDavOutbox.objects.values_list("task_id", "operation")),
+            [(task_id, TodoDavOutbox.Operation.DELETE)],
+        )
+        self.assertEqual(self.server.requests, [])
+
+    def test_worker_command_drains_queue_once(self):
+        self.task.save()
+        TodoDavOutbox.objects.update(next_attempt_at=timezone.now())
+
+        out = StringIO()
+        call_command("run_todo_dav_worker", "--run-once", stdout=out)
+
+        self.assertIn("pushed=1", out.getvalue())
+        self.assertFalse(TodoDavOutbox.objects.exists())
+
+    def test_item_no_longer_standalone_is_deleted_from_dav(self):
+        self.task.save()
+        drain_dav_outbox(now=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(len(self.server.items), 1)
+
+        self.task.is_standalone = False
+        self.task.save()
+        self.assertEqual(TodoDavOutbox.objects.get(task_id=self.task.id).operation, TodoDavOutbox.Operation.DELETE)
+        report = drain_dav_outbox(now=timezone.now() + timedelta(minutes=2))
+
+        self.assertEqual(report.deleted, 1)
+        self.assertEqual(self.server.items, {})
+        # Ormai fuori da DAV: i salvataggi successivi non accodano piu nulla.
+        self.task.save()
+        self.assertFalse(TodoDavOutbox.objects.exists())
+
+    def test_deleting_user_does_not_enqueue_rows_for_the_deleted_owner(self):
+        user_id = self.user.id
+        with transaction.atomic():
+            self.user.delete()
+            connection.check_constraints()
+
+        self.assertFalse(TodoDavOutbox.objects.filter(owner_id=user_id).exists())
+        self.assertEqual(self.server.requests, [])
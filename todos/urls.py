@@ -18,4 +18,5 @@ urlpatterns = [
     path("api/task/update", views.api_update_task, name="todos-api-task-update"),
     path("api/task/remove", views.api_remove_task, name="todos-api-task-remove"),
     path("api/task/status", views.api_set_task_status, name="todos-api-task-status"),
+    path("api/sync-vtodo", views.sync_vtodo, name="todos-sync-vtodo"),
 ]
@@ -1,12 +1,16 @@
 import json
 from datetime import date, timedelta
 
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 
+from core.resource_versions import RESOURCE_TODOS, bump_resource_versions
+from core.todo_stats import bump_todo_week_stats, todo_week_stats
+from .dav_sync import sync_all_tasks_to_vtodo, todo_collection_path_for_user, todo_collection_url_for_user
 from .forms import (
     TodoListForm,
     TodoItemForm,
@@ -41,12 +45,7 @@ def _build_data_rows(fields, data):
 
 
 def _week_stats(user, week_start):
-    checks = TodoRecurrence.objects.filter(owner=user, week_start=week_start)
-    return {
-        "planned": checks.filter(status=TodoRecurrence.Status.PLANNED).count(),
-        "done": checks.filter(status=TodoRecurrence.Status.DONE).count(),
-        "skipped": checks.filter(status=TodoRecurrence.Status.SKIPPED).count(),
-    }
+    return todo_week_stats(user.id, week_start)
 
 
 @login_required
@@ -134,6 +133,9 @@ def dashboard(request):
                     for item in missing
                 ]
             )
+            # bulk_create non emette post_save: versione API e contatori settimana vanno aggiornati a mano.
+            bump_resource_versions(user.id, RESOURCE_TODOS)
+            bump_todo_week_stats(user.id, week_start, TodoRecurrence.Status.SKIPPED, delta=len(missing))
             recurrences = TodoRecurrence.objects.filter(owner=user, week_start=week_start, todo_item__in=recurring_items)
             recurrence_map = {rec.todo_item_id: rec for rec in recurrences}
 
@@ -215,9 +217,35 @@ def dashboard(request):
         "task_counts": task_counts,
         "standalone_entries": standalone_entries,
     }
+    if tab == "tasks":
+        context["dav_vtodo_collection_path"] = todo_collection_path_for_user(user)
+        context["dav_vtodo_collection_url"] = todo_collection_url_for_user(user)
     return render(request, "todos/dashboard.html", context)
 
 
+@login_required
+def sync_vtodo(request):
+    if request.method != "POST":
+        return redirect("/todos/?tab=tasks")
+
+    stats = sync_all_tasks_to_vtodo(request.user)
+    if stats["failed"]:
+        messages.warning(
+            request,
+            (
+                f"Sincronizzazione parziale: {stats['synced']}/{stats['total']} attivita "
+                f"({stats['pushed']} inviate, {stats['skipped']} invariate)."
+                + (f" Errore: {stats['error']}" if stats["error"] else "")
+            ),
+        )
+    else:
+        messages.success(
+            request,
+            f"Sync VTODO completata: {stats['pushed']} inviate, {stats['skipped']} invariate.",
+        )
+    return redirect("/todos/?tab=tasks")
+
+
 @login_required
 def stats(request):
     user = request.user
@@ -390,7 +390,7 @@ def db_schema(request):
 @login_required
 def radicale_debug(request):
     from core.models import DavAccount
-    from core.dav import DavProvisioningError, sync_radicale_users_file
+    from core.dav import DavProvisioningError, radicale_sync_batch, sync_radicale_users_file
 
     base_url = _normalize_caldav_url(getattr(settings, "CALDAV_BASE_URL", ""))
     service_username = (getattr(settings, "CALDAV_SERVICE_USERNAME", "") or "").strip()
@@ -402,37 +402,39 @@ def radicale_debug(request):
 
     if request.method == "POST":
         action = (request.POST.get("action") or "").strip()
+        # Provisioning dell'azione accorpato in un solo rebuild di users/rights.
         try:
-            if action == "sync_users_file":
-                sync_radicale_users_file()
-                messages.success(request, "File utenti Radicale sincronizzato.")
-            elif action == "create_user_calendar":
-                principal = _normalize_dav_principal(request.POST.get("principal") or "")
-                calendar_slug = _normalize_collection_slug(request.POST.get("calendar_slug") or "")
-                display_name = (request.POST.get("display_name") or "").strip()
-                account = DavAccount.objects.filter(dav_username=principal).first()
-                if not account:
-                    messages.error(request, f"Principal DAV non trovato: {principal}")
-                    return redirect("/workbench/debug/radicale")
-                _ensure_calendar_collection(
-                    users_path=users_path,
-                    principal=principal,
-                    calendar_slug=calendar_slug,
-                    display_name=display_name,
-                )
-                messages.success(request, f"Calendario '{calendar_slug}' creato per {principal}.")
-            elif action == "create_team_calendar":
-                calendar_slug = _normalize_collection_slug(request.POST.get("calendar_slug") or "")
-                display_name = (request.POST.get("display_name") or "").strip()
-                _ensure_calendar_collection(
-                    users_path=users_path,
-                    principal="team",
-                    calendar_slug=calendar_slug,
-                    display_name=display_name,
-                )
-                messages.success(request, f"Calendario team '{calendar_slug}' creato.")
-            else:
-                messages.error(request, "Azione DAV non supportata.")
+            with radicale_sync_batch():
+                if action == "sync_users_file":
+                    sync_radicale_users_file()
+                    messages.success(request, "File utenti Radicale sincronizzato.")
+                elif action == "create_user_calendar":
+                    principal = _normalize_dav_principal(request.POST.get("principal") or "")
+                    calendar_slug = _normalize_collection_slug(request.POST.get("calendar_slug") or "")
+                    display_name = (request.POST.get("display_name") or "").strip()
+                    account = DavAccount.objects.filter(dav_username=principal).first()
+                    if not account:
+                        messages.error(request, f"Principal DAV non trovato: {principal}")
+                        return redirect("/workbench/debug/radicale")
+                    _ensure_calendar_collection(
+                        users_path=users_path,
+                        principal=principal,
+                        calendar_slug=calendar_slug,
+                        display_name=display_name,
+                    )
+                    messages.success(request, f"Calendario '{calendar_slug}' creato per {principal}.")
+                elif action == "create_team_calendar":
+                    calendar_slug = _normalize_collection_slug(request.POST.get("calendar_slug") or "")
+                    display_name = (request.POST.get("display_name") or "").strip()
+                    _ensure_calendar_collection(
+                        users_path=users_path,
+                        principal="team",
+                        calendar_slug=calendar_slug,
+                        display_name=display_name,
+                    )
+                    messages.success(request, f"Calendario team '{calendar_slug}' creato.")
+                else:
+                    messages.error(request, "Azione DAV non supportata.")
         except (DavProvisioningError, ValueError) as exc:
             messages.error(request, f"Operazione DAV fallita: {exc}")
         except Exception as exc: